@@ -0,0 +1,39 @@
+"""
+Synthetic left/right dataset pairs for the benchmarks, generated without network access.
+
+The pairs are written by generate_datasets of data/create_test_datasets.py, the load test generator, so the
+benchmarks and the load tests compare the same trade datasets keyed by trade_id. Pairs are named after their
+settings and reused across runs, next to the manifest generate_datasets writes for them.
+"""
+import json
+import os
+from data.create_test_datasets import generate_datasets
+
+def generate_pair(output_dir: str, rows: int, extra_columns: int = 3, mismatch_rate: float = 0.01,
+                  left_only_rate: float = 0.001, right_only_rate: float = 0.001, format: str = 'csv'):
+    """
+    Write a left/right dataset pair, reusing files generated earlier with the same settings.
+
+    Args:
+        output_dir (str): Directory the files are written to
+        rows (int): Rows of the left side
+        extra_columns (int, optional): attr_<n> columns added to the 5 trade columns. Defaults to 3.
+        mismatch_rate (float, optional): Share of keys with one changed value on the right side. Defaults to 0.01.
+        left_only_rate (float, optional): Share of keys missing on the right side. Defaults to 0.001.
+        right_only_rate (float, optional): Rows only on the right side, relative to rows. Defaults to 0.001.
+        format (str, optional): 'csv' or 'parquet'. Defaults to 'csv'.
+    Returns:
+        tuple: Paths of the left and right files
+    """
+    name = f"{rows}r_{extra_columns}c_{mismatch_rate}m_{left_only_rate}l_{right_only_rate}r"
+    manifest_path = os.path.join(output_dir, f"left_{name}.manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            files = json.load(f)['files']
+        if os.path.exists(files['left']) and os.path.exists(files['right']):
+            return files['left'], files['right']
+
+    manifest = generate_datasets(output_dir, rows, extra_columns, format, mismatch_rate=mismatch_rate,
+                                 left_only_rate=left_only_rate, right_only_rate=right_only_rate,
+                                 left_name=f"left_{name}", right_name=f"right_{name}")
+    return manifest['files']['left'], manifest['files']['right']
@@ -0,0 +1,216 @@
+"""
+DeltaLens benchmark harness - measures the throughput of the compare and export paths offline.
+
+For every scenario a synthetic left/right dataset pair is generated (see benchmarks.datasets) and compared
+by DeltaLens in a fresh process, so the peak RSS of each scenario is measured on its own. Stages are timed
+separately:
+- ingest: parsing both input files (parse_left, parse_right in entity_stage_timings)
+- compare: key validation and the full outer join (validate, join)
+- summary: entity statistics and the field summary (summary)
+- export_sqlite, export_csv, export_parquet: every exporter writing the full compare table
+rows/sec is the number of input rows of both sides divided by the stage time. Each scenario runs
+--repeat times and the fastest time of each stage is kept.
+
+Results can be saved as a baseline and compared against later: a stage (or the peak RSS) regresses when
+it exceeds its baseline by more than --threshold. Stages faster than --min-seconds in the baseline are
+ignored as noise. The harness exits with status 1 when a regression is found.
+
+Example:
+    python -m benchmarks.run_benchmarks --scenarios small,small_wide --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --scenarios small,small_wide --baseline benchmarks/baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import duckdb
+from delta_lens.config import Config, Entity, Side
+from delta_lens.deltaLens import DeltaLens
+from delta_lens.sqliteExport import SqliteExporter
+from delta_lens.csvExport import CsvArchiveExporter
+from delta_lens.parquetExport import ParquetExporter
+from benchmarks.datasets import generate_pair
+
+SCENARIOS = {
+    'small': {'rows': 100_000, 'extra_columns': 3, 'mismatch_rate': 0.01, 'format': 'csv'},
+    'small_wide': {'rows': 100_000, 'extra_columns': 59, 'mismatch_rate': 0.01, 'format': 'csv'},
+    'small_parquet': {'rows': 100_000, 'extra_columns': 3, 'mismatch_rate': 0.01, 'format': 'parquet'},
+    'medium': {'rows': 1_000_000, 'extra_columns': 3, 'mismatch_rate': 0.01, 'format': 'csv'},
+    'medium_mismatched': {'rows': 1_000_000, 'extra_columns': 3, 'mismatch_rate': 0.5, 'format': 'csv'},
+    'medium_wide': {'rows': 1_000_000, 'extra_columns': 59, 'mismatch_rate': 0.01, 'format': 'parquet'},
+    'large': {'rows': 10_000_000, 'extra_columns': 3, 'mismatch_rate': 0.01, 'format': 'parquet'},
+}
+
+DEFAULT_SCENARIOS = 'small,small_wide,small_parquet'
+
+STAGE_GROUPS = {
+    'ingest': ('parse_left', 'parse_right'),
+    'compare': ('validate', 'join'),
+    'summary': ('summary',),
+}
+
+EXPORTERS = {
+    'export_sqlite': lambda work_dir: SqliteExporter(os.path.join(work_dir, "bench.sqlite"), sample_threshold=0, mismatches_only=False),
+    'export_csv': lambda work_dir: CsvArchiveExporter(os.path.join(work_dir, "bench.tar.gz"), mismatches_only=False),
+    'export_parquet': lambda work_dir: ParquetExporter(os.path.join(work_dir, "parquet"), mismatches_only=False),
+}
+
+def run_scenario(name: str, left_file: str, right_file: str) -> dict:
+    """
+    Compare and export one dataset pair, meant to run in a fresh process.
+
+    Returns:
+        dict: input_rows, peak_rss_bytes and the seconds of every stage
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        config = Config(entities=[Entity(
+            entityName="bench",
+            leftSide=Side(title="left", inputFile=left_file),
+            rightSide=Side(title="right", inputFile=right_file),
+            primaryKeys=["trade_id"]
+        )])
+        lens = DeltaLens(f"bench_{name}", config)
+        lens.execute(continue_on_error=False)
+
+        stage_seconds = dict(lens.con.execute("SELECT stage, SUM(elapsed_seconds) FROM entity_stage_timings GROUP BY stage").fetchall())
+        seconds = {group: sum(stage_seconds.get(stage, 0) for stage in stages) for group, stages in STAGE_GROUPS.items()}
+        input_rows = sum(lens.con.execute("SELECT rows_left, rows_right FROM entity_compare_results").fetchone())
+
+        tables = ["bench_compare", "bench_compare_field_summary", "entity_compare_results"]
+        for exporter_name, create_exporter in EXPORTERS.items():
+            start = time.perf_counter()
+            exporter = create_exporter(work_dir)
+            exporter.export_tables(lens.con, tables)
+            exporter.close()
+            seconds[exporter_name] = time.perf_counter() - start
+        lens.con.close()
+
+    # ru_maxrss is reported in kilobytes on Linux
+    return {'input_rows': input_rows, 'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, 'seconds': seconds}
+
+def benchmark(scenarios: dict, data_dir: str, repeat: int = 3) -> dict:
+    """
+    Run the given scenarios, keeping the fastest time of each stage over repeat runs.
+
+    Args:
+        scenarios (dict): Scenario name to generate_pair settings, see SCENARIOS
+        data_dir (str): Directory the generated datasets are kept in, reused across runs
+        repeat (int, optional): Runs per scenario. Defaults to 3.
+    Returns:
+        dict: Results with the environment and, per scenario, its settings, input rows, peak RSS and stages
+    """
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'duckdb': duckdb.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'scenarios': {}
+    }
+    for name, settings in scenarios.items():
+        left_file, right_file = generate_pair(data_dir, **settings)
+        runs = []
+        for _ in range(repeat):
+            # a fresh process per run so peak RSS covers this scenario only
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                runs.append(pool.submit(run_scenario, name, left_file, right_file).result())
+        input_rows = runs[0]['input_rows']
+        stages = {}
+        for stage in runs[0]['seconds']:
+            seconds = min(run['seconds'][stage] for run in runs)
+            stages[stage] = {'seconds': round(seconds, 4), 'rows_per_second': round(input_rows / seconds) if seconds > 0 else None}
+        results['scenarios'][name] = {
+            'settings': settings,
+            'input_rows': input_rows,
+            'peak_rss_bytes': max(run['peak_rss_bytes'] for run in runs),
+            'stages': stages,
+        }
+    return results
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float = 0.2, min_seconds: float = 0.05) -> list:
+    """
+    Find stages and peak RSS values exceeding their baseline by more than threshold.
+
+    Args:
+        results (dict): Output of benchmark()
+        baseline (dict): Earlier output of benchmark()
+        threshold (float, optional): Allowed relative slowdown, 0.2 allows 20%. Defaults to 0.2.
+        min_seconds (float, optional): Baseline stages faster than this are ignored as noise. Defaults to 0.05.
+    Returns:
+        list: Description of each regression, empty when there is none
+    """
+    regressions = []
+    for name, scenario in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        for stage, timing in scenario['stages'].items():
+            base_timing = base['stages'].get(stage)
+            if base_timing is None or base_timing['seconds'] < min_seconds:
+                continue
+            if timing['seconds'] > base_timing['seconds'] * (1 + threshold):
+                regressions.append(f"{name}/{stage}: {timing['seconds']:.3f}s vs baseline {base_timing['seconds']:.3f}s "
+                                   f"(+{timing['seconds'] / base_timing['seconds'] - 1:.0%})")
+        if scenario['peak_rss_bytes'] > base['peak_rss_bytes'] * (1 + threshold):
+            regressions.append(f"{name}/peak_rss: {scenario['peak_rss_bytes'] / 1024**2:.0f}MB vs baseline "
+                               f"{base['peak_rss_bytes'] / 1024**2:.0f}MB (+{scenario['peak_rss_bytes'] / base['peak_rss_bytes'] - 1:.0%})")
+    return regressions
+
+def format_results(results: dict) -> str:
+    lines = [f"{'scenario':<20} {'stage':<16} {'seconds':>9} {'rows/s':>14} {'peak RSS MB':>12}"]
+    for name, scenario in results['scenarios'].items():
+        for stage, timing in scenario['stages'].items():
+            rate = f"{timing['rows_per_second']:,}" if timing['rows_per_second'] is not None else ""
+            lines.append(f"{name:<20} {stage:<16} {timing['seconds']:>9.3f} {rate:>14} {scenario['peak_rss_bytes'] / 1024**2:>12.0f}")
+    return "\n".join(lines)
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description='DeltaLens benchmarks - throughput of the compare and export paths')
+    parser.add_argument('--scenarios', type=str, default=DEFAULT_SCENARIOS,
+                        help=f"Comma separated scenarios or 'all', available: {', '.join(SCENARIOS)} (default: {DEFAULT_SCENARIOS})")
+    parser.add_argument('--data-dir', type=str, default=os.path.join(tempfile.gettempdir(), 'deltalens_benchmarks'),
+                        help='Directory generated datasets are kept in and reused from')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario, the fastest time of each stage is kept')
+    parser.add_argument('--output', type=str, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', type=str, help='Baseline JSON file to compare the results against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative slowdown against the baseline (default: 0.2)')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='Baseline stages faster than this are ignored as noise')
+    parser.add_argument('--save-baseline', type=str, help='Write the results as the new baseline JSON file')
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    args = parse_args(argv)
+    names = list(SCENARIOS) if args.scenarios == 'all' else [name.strip() for name in args.scenarios.split(',')]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {unknown}, available: {list(SCENARIOS)}")
+
+    results = benchmark({name: SCENARIOS[name] for name in names}, args.data_dir, args.repeat)
+    print(format_results(results))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import os
+import duckdb
+import pytest
+from benchmarks.datasets import generate_pair
+from benchmarks.run_benchmarks import run_scenario, compare_to_baseline, format_results
+
+def test_generate_pair(tmp_path):
+    left_file, right_file = generate_pair(str(tmp_path), rows=1000, extra_columns=1, mismatch_rate=0.1, left_only_rate=0.01, right_only_rate=0.02)
+    con = duckdb.connect()
+    left = f"read_csv('{left_file}')"
+    right = f"read_csv('{right_file}')"
+    assert con.execute(f"SELECT COUNT(*) FROM {left}").fetchone()[0] == 1000
+    assert [c[0] for c in con.execute(f"DESCRIBE SELECT * FROM {right}").fetchall()] == \
+        ["trade_id", "timestamp", "symbol", "trade_type", "price", "quantity", "attr_0"]
+    left_only = con.execute(f"SELECT COUNT(*) FROM {left} WHERE trade_id NOT IN (SELECT trade_id FROM {right})").fetchone()[0]
+    right_only = con.execute(f"SELECT COUNT(*) FROM {right} WHERE trade_id NOT IN (SELECT trade_id FROM {left})").fetchone()[0]
+    differing = con.execute(f"SELECT COUNT(*) FROM (SELECT * FROM {right} EXCEPT SELECT * FROM {left})").fetchone()[0]
+    assert (left_only, right_only, differing - right_only) == (10, 20, 100)
+    # files are reused for the same settings
+    modified = os.path.getmtime(left_file)
+    assert generate_pair(str(tmp_path), rows=1000, extra_columns=1, mismatch_rate=0.1, left_only_rate=0.01, right_only_rate=0.02) == (left_file, right_file)
+    assert os.path.getmtime(left_file) == modified
+
+def test_run_scenario(tmp_path):
+    left_file, right_file = generate_pair(str(tmp_path), rows=2000, format='parquet')
+    result = run_scenario("test", left_file, right_file)
+    assert result['input_rows'] == 4000
+    assert result['peak_rss_bytes'] > 0
+    assert list(result['seconds']) == ["ingest", "compare", "summary", "export_sqlite", "export_csv", "export_parquet"]
+
+def scenario_results(seconds, peak_rss = 100 * 1024**2):
+    return {'scenarios': {'small': {'input_rows': 1000, 'peak_rss_bytes': peak_rss,
+                                    'stages': {stage: {'seconds': value, 'rows_per_second': 1000 / value} for stage, value in seconds.items()}}}}
+
+def test_compare_to_baseline():
+    baseline = scenario_results({'ingest': 1.0, 'compare': 2.0, 'summary': 0.01})
+    assert compare_to_baseline(scenario_results({'ingest': 1.1, 'compare': 2.0, 'summary': 0.05}), baseline, 0.2) == []
+    regressions = compare_to_baseline(scenario_results({'ingest': 1.5, 'compare': 2.0, 'summary': 0.05}, 200 * 1024**2), baseline, 0.2)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("small/ingest")
+    assert regressions[1].startswith("small/peak_rss")
+    # scenarios missing from the baseline are not compared
+    assert compare_to_baseline(scenario_results({'ingest': 5.0}), {'scenarios': {}}) == []
+    assert len(format_results(baseline).splitlines()) == 4
@@ -1,5 +1,5 @@
 import pytest
-from delta_lens.config import Config, Entity, Side, Transform, Defaults, ReferenceDataset, load_config
+from delta_lens.config import Config, Entity, Side, Transform, Defaults, ReferenceDataset, CompareRule, load_config
 import json
 import os
 import tempfile
@@ -102,6 +102,46 @@ def test_validate_duplicate_entity_names(valid_side):
     with pytest.raises(ValueError, match="Duplicate entity names found"):
         Config._validate_unique_entity_names(entities)
 
+def test_validate_dependencies(valid_side):
+    entities = [
+        Entity(entityName="trade", leftSide=valid_side, rightSide=valid_side, primaryKeys=["id"]),
+        Entity(entityName="position", leftSide=valid_side, rightSide=valid_side, primaryKeys=["id"], dependencies=["trade"])
+    ]
+    Config._validate_dependencies(entities)
+
+def test_validate_unknown_dependency(valid_side):
+    entities = [
+        Entity(entityName="position", leftSide=valid_side, rightSide=valid_side, primaryKeys=["id"], dependencies=["trade"])
+    ]
+    with pytest.raises(ValueError, match="depends on unknown entities"):
+        Config._validate_dependencies(entities)
+
+def test_validate_circular_dependencies(valid_side):
+    entities = [
+        Entity(entityName="trade", leftSide=valid_side, rightSide=valid_side, primaryKeys=["id"], dependencies=["position"]),
+        Entity(entityName="position", leftSide=valid_side, rightSide=valid_side, primaryKeys=["id"], dependencies=["trade"])
+    ]
+    with pytest.raises(ValueError, match="Circular entity dependency found"):
+        Config._validate_dependencies(entities)
+
+def test_validate_compare_rule_negative_tolerance():
+    with pytest.raises(ValueError, match="Tolerances must not be negative"):
+        Config._validate_compare_rule("trade", "price", CompareRule(absoluteTolerance=-0.1))
+
+@pytest.mark.parametrize("buckets", [0, True, "many"])
+def test_validate_invalid_buckets(valid_side, buckets):
+    config = Config(entities=[Entity(entityName="trade", leftSide=valid_side, rightSide=valid_side, primaryKeys=["id"], buckets=buckets)])
+    with pytest.raises(ValueError, match="Invalid buckets"):
+        Config.Validate(config)
+
+def test_load_config_compare_rules(valid_config_dict, config_file):
+    valid_config_dict["entities"][0]["compareRules"] = {"price": {"absoluteTolerance": 0.01, "trimWhitespace": True}}
+    with open(config_file, 'w') as f:
+        json.dump(valid_config_dict, f)
+    config = load_config(config_file)
+    assert config.entities[0].compareRules == {"price": CompareRule(absoluteTolerance=0.01, trimWhitespace=True)}
+    os.unlink(config_file)
+
 def test_load_config_valid(config_file):
     config = load_config(config_file)
     assert isinstance(config, Config)
@@ -0,0 +1,41 @@
+import duckdb
+import pytest
+from delta_lens.config import Config, Entity, Side
+
+@pytest.fixture
+def trade_files(tmp_path, trade_data):
+    """
+    Write the left and right trade files of a test module, from the module's trade_data fixture
+    mapping each side to a file name and its content. The content of a .parquet file is the query
+    whose result is written.
+    """
+    con = duckdb.connect()
+    files = {}
+    for side, (name, content) in trade_data.items():
+        path = tmp_path / name
+        if name.endswith(".parquet"):
+            con.execute(f"COPY ({content}) TO '{path}' (FORMAT PARQUET)")
+        else:
+            path.write_text(content)
+        files[side] = str(path)
+    return files
+
+@pytest.fixture
+def trade_entity():
+    """Factory of the trade entity comparing the left and right trade files, keyed by trade_id"""
+    def create(trade_files, **settings):
+        return Entity(**{
+            'entityName': "trade",
+            'leftSide': Side(title="legacy", inputFile=trade_files['left']),
+            'rightSide': Side(title="new", inputFile=trade_files['right']),
+            'primaryKeys': ["trade_id"],
+            **settings
+        })
+    return create
+
+@pytest.fixture
+def trade_config(trade_entity):
+    """Factory of a configuration holding only the trade entity"""
+    def create(trade_files, **settings):
+        return Config(entities=[trade_entity(trade_files, **settings)])
+    return create
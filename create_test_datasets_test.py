@@ -0,0 +1,58 @@
+import json
+import os
+import duckdb
+import pytest
+from data.create_test_datasets import generate_datasets, verify_results
+from delta_lens.config import Config, Entity, Side
+from delta_lens.deltaLens import DeltaLens
+
+def compare(manifest, name):
+    config = Config(entities=[Entity(
+        entityName="trade",
+        leftSide=Side(title="legacy", inputFile=manifest['files']['left']),
+        rightSide=Side(title="new", inputFile=manifest['files']['right']),
+        primaryKeys=manifest['primary_keys']
+    )])
+    lens = DeltaLens(name, config)
+    lens.execute()
+    return lens.con
+
+def test_exact_injection_rates(tmp_path):
+    manifest = generate_datasets(str(tmp_path), rows=5000, extra_columns=3, mismatch_rate=0.01, null_rate=0.004,
+                                 left_only_rate=0.002, right_only_rate=0.003, seed=7)
+    expected = manifest['expected']
+    assert (expected['rows_left'], expected['rows_right'], expected['rows_mismatched'], expected['rows_left_only'],
+            expected['rows_right_only'], expected['rows_fully_matched']) == (5000, 5005, 70, 10, 15, 4920)
+    # mismatches and nulls are spread over the columns in turn
+    assert sum(field['mismatches'] for field in expected['fields'].values()) == 70
+    assert sum(field['right_null_mismatches'] for field in expected['fields'].values()) == 20
+    with open(tmp_path / "legacy_system_trades.manifest.json") as f:
+        assert json.load(f) == manifest
+
+    con = compare(manifest, "test_exact_rates")
+    assert verify_results(con, manifest, "trade") == []
+
+def test_duplicate_keys_and_chunks(tmp_path):
+    manifest = generate_datasets(str(tmp_path), rows=4000, format='parquet', duplicate_key_rate=0.005,
+                                 chunk_rows=1500, max_workers=2)
+    assert sorted(os.listdir(tmp_path / "legacy_system_trades")) == ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+    con = duckdb.connect()
+    left = f"read_parquet('{manifest['files']['left']}')"
+    right = f"read_parquet('{manifest['files']['right']}')"
+    assert con.execute(f"SELECT COUNT(*) FROM {left}").fetchone()[0] == 4000 + 20
+    assert con.execute(f"SELECT COUNT(*) FROM (SELECT trade_id FROM {left} GROUP BY ALL HAVING COUNT(*) > 1)").fetchone()[0] == 20
+    assert con.execute(f"SELECT COUNT(*) FROM {right}").fetchone()[0] == manifest['expected']['rows_right']
+    assert manifest['expected']['success'] is False
+
+def test_verify_reports_differences(tmp_path):
+    manifest = generate_datasets(str(tmp_path), rows=1000, mismatch_rate=0.01, duplicate_key_rate=0.002)
+    con = compare(manifest, "test_verify_duplicates")
+    assert verify_results(con, manifest, "trade") == []
+
+    manifest['expected']['duplicate_keys_left'] = 3
+    assert verify_results(con, manifest, "trade") == ["duplicate_keys_left: expected 3, got 2"]
+    assert verify_results(con, manifest, "other") == ["no results for entity [other]"]
+
+def test_rates_exceeding_keys(tmp_path):
+    with pytest.raises(ValueError, match="add up to more than"):
+        generate_datasets(str(tmp_path), rows=10, mismatch_rate=0.6, left_only_rate=0.6)
@@ -4,7 +4,7 @@ import duckdb
 import tarfile
 import gzip
 import os
-from delta_lens.csvExport import export_to_csv_archive
+from delta_lens.csvExport import export_to_csv_archive, CsvArchiveExporter
 
 class TestCsvExport(unittest.TestCase):
     def setUp(self):
@@ -83,6 +83,37 @@ class TestCsvExport(unittest.TestCase):
             self.assertEqual(len(files), 1)
             self.assertIn('test_compare.csv', files)
 
+    def test_concurrent_export_of_many_tables(self):
+        archive_path = 'test_export_many.tar.gz'
+        for i in range(6):
+            self.conn.execute(f"CREATE TABLE entity{i}_compare AS SELECT range AS id, range % 2 AS _full_match FROM range({i * 10})")
+
+        export_to_csv_archive(self.conn, archive_path, mismatches_only=True, max_workers=3)
+
+        with tarfile.open(archive_path, 'r:gz') as tar:
+            for i in range(6):
+                lines = tar.extractfile(f'entity{i}_compare.csv').read().decode().splitlines()
+                self.assertEqual(len(lines), 1 + i * 5)  # Header + even ids
+
+    def test_csv_files_on_disk_bounded_by_max_workers(self):
+        archive_path = 'test_export_bounded.tar.gz'
+        tables = [f"entity{i}_compare" for i in range(6)]
+        for table in tables:
+            self.conn.execute(f"CREATE TABLE {table} AS SELECT range AS id, 0 AS _full_match FROM range(10)")
+
+        exporter = CsvArchiveExporter(archive_path, max_workers=2)
+        files_on_disk = []
+        add = exporter.tar.add
+        def counting_add(name, arcname):
+            files_on_disk.append(len(os.listdir(exporter.temp_dir.name)))
+            add(name, arcname=arcname)
+        exporter.tar.add = counting_add
+        exporter.export_tables(self.conn, tables)
+        exporter.close()
+
+        self.assertEqual(len(files_on_disk), 6)
+        self.assertLessEqual(max(files_on_disk), 2)
+
     def test_file_exists_error(self):
         archive_path = 'test_export_exists.tar.gz'
         # Create empty file
@@ -1,195 +1,299 @@
-
 """
-A script for generating and manipulating test datasets of trade data.
-This module creates large CSV files containing randomized trade data and provides
-functionality to modify or delete random entries, simulating differences between
-legacy and new systems for testing purposes.
-Global Variables:
-    trade_id (int): A global counter for generating unique trade IDs.
-Functions:
-    generate_random_trade() -> list:
-        Generates a single random trade record with realistic market data.
-        Returns a list containing: [trade_id, timestamp, symbol, trade_type, price, quantity]
-    create_large_trade_file(filename: str, target_size_gb: int = 20) -> None:
-        Creates a CSV file with random trade data up to the specified size.
-        Args:
-            filename: Name of the output CSV file
-            target_size_gb: Desired file size in gigabytes (default: 20)
-    estimate_total_records(filename: str) -> int:
-        Estimates the total number of records in a CSV file based on sampling.
-        Args:
-            filename: Path to the CSV file
-        Returns:
-            Estimated number of records in the file
-    modify_random_prices(filename: str, num_modifications: int) -> None:
-        Modifies random price values in the specified CSV file.
-        Args:
-            filename: Path to the CSV file
-            num_modifications: Number of random prices to modify
-    delete_random_rows(filename: str, num_deletions: int) -> None:
-        Deletes random rows from the specified CSV file.
-        Args:
-            filename: Path to the CSV file
-            num_deletions: Number of rows to delete randomly
-The script creates two files when run:
-    - legacy_system_trades.csv: Original trade data with modifications
-    - new_system_trades.csv: Copy of original trade data before modifications
-The generated data includes:
-    - Trade ID
-    - Timestamp (within last 365 days)
-    - Symbol (from major tech and financial companies)
-    - Trade Type (BUY/SELL)
-    - Price (between 10 and 1000)
-    - Quantity (between 1 and 10000)
+A script for generating large pairs of trade datasets with a known set of differences, for load tests of DeltaLens.
+
+Rows are generated by DuckDB from key ranges, so no row is ever built or rewritten in Python. Every value is a
+hash of the trade_id and the seed, which makes the output reproducible and lets each chunk be written
+independently: with --chunk-rows each side is split into part files written concurrently.
+
+Differences are injected at exact rates. Keys are ranked by a seeded permutation of the key range, and
+consecutive rank ranges select the keys of each injection, so the categories never overlap and are spread
+over the whole file:
+    - mismatches: one column per key is changed on the right side, columns taken in turn
+    - nulls: one column per key is NULL on the right side, columns taken in turn
+    - left-only: the key is missing on the right side
+    - duplicate keys: the key appears twice on the left side (DeltaLens fails the entity on them)
+    - right-only: keys past the end of the left key range only exist on the right side
+Rates are relative to --rows, the number of distinct keys on the left side.
+
+Next to the data a manifest, '<left name>.manifest.json', records the settings, the files and the expected
+entity_compare_results and field summary counts. verify_results() checks a DeltaLens run against it:
+    python create_test_datasets.py --verify run.duckdb --entity trade
+
+Columns: trade_id, timestamp, symbol, trade_type, price, quantity and --extra-columns attr_<n> columns
+alternating DECIMAL and VARCHAR.
+
+The script creates two datasets when run:
+    - legacy_system_trades.csv: left side
+    - new_system_trades.csv: right side
+or directories of part files with --chunk-rows, and Parquet files with --format parquet.
 """
-import random
-from datetime import datetime, timedelta
-import csv
+import argparse
+import json
+import math
 import os
-import shutil
-import random
-import csv
-import os
-import tempfile
-from itertools import islice
-
-
-trade_id = 1
-
-def generate_random_trade():
-    symbols = ['AAPL', 'GOOGL', 'MSFT', 'AMZN', 'META', 'TSLA', 'NVDA', 'JPM', 'BAC', 'WMT']
-    trade_types = ['BUY', 'SELL']
-    
-    symbol = random.choice(symbols)
-    price = round(random.uniform(10, 1000), 2)
-    quantity = random.randint(1, 10000)
-    trade_type = random.choice(trade_types)
-    timestamp = datetime.now() - timedelta(days=random.randint(0, 365))
-    global trade_id
-    trade_id=trade_id+1
-    return [
-        trade_id,
-        timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-        symbol,
-        trade_type,
-        str(price),
-        str(quantity)
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import duckdb
+
+SYMBOLS = ['AAPL', 'GOOGL', 'MSFT', 'AMZN', 'META', 'TSLA', 'NVDA', 'JPM', 'BAC', 'WMT']
+
+# multiplier of the key permutation, adjusted until it is coprime with the key count. It is kept small so that
+# key * multiplier fits a BIGINT for up to 9 trillion keys, HUGEINT arithmetic is an order of magnitude slower
+_PERMUTATION_MULTIPLIER = 1000003
+
+def _columns(extra_columns: int):
+    # (name, value expression of key k, changed value of the same type), decimals are written much faster than doubles
+    symbols = "[" + ", ".join(f"'{s}'" for s in SYMBOLS) + "]"
+    columns = [
+        ('timestamp', "TIMESTAMP '2024-01-01' + to_seconds((hash(k, {seed}, 1) % 31536000)::BIGINT)", "{value} + INTERVAL 1 SECOND"),
+        ('symbol', f"{symbols}[(hash(k, {{seed}}, 2) % {len(SYMBOLS)})::BIGINT + 1]", "{value} || '_X'"),
+        ('trade_type', "CASE WHEN hash(k, {seed}, 3) % 2 = 0 THEN 'BUY' ELSE 'SELL' END", "CASE WHEN {value} = 'BUY' THEN 'SELL' ELSE 'BUY' END"),
+        ('price', "((1000 + hash(k, {seed}, 4) % 99000)::BIGINT / 100)::DECIMAL(12, 2)", "({value} + 1)::DECIMAL(12, 2)"),
+        ('quantity', "(hash(k, {seed}, 5) % 10000 + 1)::BIGINT", "{value} + 1"),
     ]
+    for i in range(extra_columns):
+        if i % 2 == 0:
+            columns.append((f"attr_{i}", f"((hash(k, {{seed}}, {i + 6}) % 1000000)::BIGINT / 100)::DECIMAL(12, 2)", "({value} + 1)::DECIMAL(12, 2)"))
+        else:
+            columns.append((f"attr_{i}", f"'a' || (hash(k, {{seed}}, {i + 6}) % 100000)::VARCHAR", "{value} || '_X'"))
+    return columns
 
-def create_large_trade_file(filename, target_size_gb=20):
-    target_size_bytes = target_size_gb * 1024 * 1024 * 1024
-    current_size = 0
-    chunk_size = 1000000  # Number of trades per chunk
-    
-    with open(filename, 'w', newline='') as f:
-        writer = csv.writer(f)
-        # Write header
-        writer.writerow(['trade_id','timestamp', 'symbol', 'trade_type', 'price', 'quantity'])
-        
-        while current_size < target_size_bytes:
-            # Generate chunk of trades
-            trades = [generate_random_trade() for _ in range(chunk_size)]
-            writer.writerows(trades)
-            
-            # Update current file size
-            current_size = os.path.getsize(filename)
-            
-            # Print progress
-            progress_gb = current_size / (1024 * 1024 * 1024)
-            print(f"Generated {progress_gb:.2f} GB of data...")
-            
-            if current_size >= target_size_bytes:
-                break
-def estimate_total_records(filename):
-    # Sample first 1000 records to get average record size
-    sample_size = 1000
-    total_size = os.path.getsize(filename)
-    
-    with open(filename, 'r') as f:
-        header = next(f)
-        sample = list(islice(f, sample_size))
-        avg_record_size = sum(len(line) for line in sample) / len(sample)
-        
-    estimated_records = (total_size - len(header)) / avg_record_size
-    return int(estimated_records)
-
-def modify_random_prices(filename, num_modifications):
-    # Get estimated total records and generate random positions
-    total_records = estimate_total_records(filename)
-    modifications = set(random.sample(range(1, total_records), num_modifications))
-    
-    temp_filename = tempfile.mktemp()
-    chunk_size = 100000  # Process 100K records at a time
-    
-    with open(filename, 'r', newline='') as infile, open(temp_filename, 'w', newline='') as outfile:
-        reader = csv.reader(infile)
-        writer = csv.writer(outfile)
-        
-        # Write header
-        header = next(reader)
-        writer.writerow(header)
-        
-        current_line = 1
-        while True:
-            # Read and process chunk
-            chunk = list(islice(reader, chunk_size))
-            if not chunk:
-                break
-                
-            # Modify records in chunk if needed
-            for row in chunk:
-                if current_line in modifications:
-                    row[4] = str(round(random.uniform(10, 1000), 2))
-                writer.writerow(row)
-                current_line += 1
-    
-    # Replace original file with modified version
-    shutil.move(temp_filename, filename)
-
-def delete_random_rows(filename, num_deletions):
-    # Get estimated total records and generate positions to delete
-    total_records = estimate_total_records(filename)
-    deletions = set(random.sample(range(1, total_records), num_deletions))
-    
-    temp_filename = tempfile.mktemp()
-    chunk_size = 100000  # Process 100K records at a time
-    
-    with open(filename, 'r', newline='') as infile, open(temp_filename, 'w', newline='') as outfile:
-        reader = csv.reader(infile)
-        writer = csv.writer(outfile)
-        
-        # Write header
-        header = next(reader)
-        writer.writerow(header)
-        
-        current_line = 1
-        while True:
-            # Read and process chunk
-            chunk = list(islice(reader, chunk_size))
-            if not chunk:
-                break
-                
-            # Write rows that aren't marked for deletion
-            for row in chunk:
-                if current_line not in deletions:
-                    writer.writerow(row)
-                current_line += 1
-    
-    # Replace original file with modified version
-    shutil.move(temp_filename, filename)
+def _permutation(rows: int, seed: int):
+    multiplier = _PERMUTATION_MULTIPLIER
+    while math.gcd(multiplier, rows) != 1:
+        multiplier += 1
+    offset = (seed * 7919) % rows
+    return multiplier, offset, pow(multiplier, -1, rows)
 
-if __name__ == "__main__":
-    output_file = "legacy_system_trades.csv"
+def _count_in_turn(count: int, columns: int, index: int) -> int:
+    # number of r in range(count) with r % columns == index
+    return len(range(index, count, columns))
+
+def _write(conn, query: str, path: str, format: str):
+    options = "FORMAT PARQUET, COMPRESSION zstd" if format == 'parquet' else "HEADER TRUE, DELIMITER ','"
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"COPY ({query}) TO '{path}' ({options})")
+    finally:
+        cursor.close()
+    print(f"Written {path}")
+
+def generate_datasets(output_dir: str = ".", rows: int = 30_000_000, extra_columns: int = 0, format: str = 'csv',
+                      mismatch_rate: float = 0.0003, null_rate: float = 0.0, left_only_rate: float = 0.0003,
+                      right_only_rate: float = 0.0003, duplicate_key_rate: float = 0.0, seed: int = 0,
+                      chunk_rows: int = None, max_workers: int = None,
+                      left_name: str = "legacy_system_trades", right_name: str = "new_system_trades") -> dict:
+    """
+    Write a left/right pair of trade datasets with exact numbers of injected differences and its manifest.
+
+    Args:
+        output_dir (str, optional): Directory the datasets and manifest are written to. Defaults to '.'.
+        rows (int, optional): Distinct keys on the left side. Defaults to 30_000_000 (about 2GB of CSV per side).
+        extra_columns (int, optional): attr_<n> columns added to widen the rows. Defaults to 0.
+        format (str, optional): 'csv' or 'parquet'. Defaults to 'csv'.
+        mismatch_rate (float, optional): Keys with one changed value on the right side. Defaults to 0.0003.
+        null_rate (float, optional): Keys with one NULL value on the right side. Defaults to 0.
+        left_only_rate (float, optional): Keys missing on the right side. Defaults to 0.0003.
+        right_only_rate (float, optional): Keys only on the right side, relative to rows. Defaults to 0.0003.
+        duplicate_key_rate (float, optional): Keys written twice on the left side. Defaults to 0.
+        seed (int, optional): Seed of the values and of the keys picked for each injection. Defaults to 0.
+        chunk_rows (int, optional): Keys per part file. If None, each side is written to a single file. Defaults to None.
+        max_workers (int, optional): Part files written concurrently. Defaults to the number of CPUs.
+        left_name (str, optional): File or directory name of the left side. Defaults to 'legacy_system_trades'.
+        right_name (str, optional): File or directory name of the right side. Defaults to 'new_system_trades'.
+    Returns:
+        dict: The manifest, also written to '<output_dir>/<left_name>.manifest.json'
+    """
+    if rows < 1:
+        raise ValueError(f"rows must be at least 1, got {rows}")
+    counts = {name: round(rows * rate) for name, rate in (
+        ('mismatches', mismatch_rate), ('nulls', null_rate), ('left_only', left_only_rate), ('duplicates', duplicate_key_rate))}
+    right_only = round(rows * right_only_rate)
+    if sum(counts.values()) > rows:
+        raise ValueError(f"mismatch, null, left-only and duplicate key rates add up to more than all {rows} keys")
+
+    # consecutive rank ranges select the keys of each injection
+    bounds, start = {}, 0
+    for name, count in counts.items():
+        bounds[name] = (start, start + count)
+        start += count
 
-    print(f"Starting to generate {output_file}...")
+    columns = _columns(extra_columns)
+    multiplier, offset, inverse = _permutation(rows, seed)
 
-    create_large_trade_file(output_file, target_size_gb=2)
+    def values(changed: bool):
+        expressions = []
+        for i, (name, value, change) in enumerate(columns):
+            value = value.format(seed=seed)
+            if changed:
+                mismatch_start, mismatch_end = bounds['mismatches']
+                null_start, null_end = bounds['nulls']
+                value = (f"CASE WHEN _rank >= {mismatch_start} AND _rank < {mismatch_end} AND (_rank - {mismatch_start}) % {len(columns)} = {i} "
+                         f"THEN {change.format(value=value)} "
+                         f"WHEN _rank >= {null_start} AND _rank < {null_end} AND (_rank - {null_start}) % {len(columns)} = {i} THEN NULL "
+                         f"ELSE {value} END")
+            expressions.append(f"{value} AS {name}")
+        return "k AS trade_id, " + ", ".join(expressions)
 
-    shutil.copy2("legacy_system_trades.csv", "new_system_trades.csv")
-    print(f"Deleting randoom rows in {output_file}...")
-    delete_random_rows(output_file,10000)
+    def left_query(first, last):
+        query = f"SELECT {values(False)} FROM (SELECT range AS k FROM range({first}, {last}))"
+        duplicate_start, duplicate_end = bounds['duplicates']
+        if duplicate_end > duplicate_start:
+            # keys of the duplicate ranks, through the inverse permutation
+            duplicate_keys = f"SELECT (((range - {offset} + {rows})::HUGEINT * {inverse}) % {rows})::BIGINT AS k FROM range({duplicate_start}, {duplicate_end})"
+            query += f" UNION ALL SELECT {values(False)} FROM ({duplicate_keys}) WHERE k >= {first} AND k < {last}"
+        return query
 
-    print(f"Modifying randoom rows in {output_file}...")
-    modify_random_prices(output_file,10000)
+    def right_query(first, last):
+        left_only_start, left_only_end = bounds['left_only']
+        keys = f"SELECT range AS k, (range * {multiplier} + {offset}) % {rows} AS _rank FROM range({first}, {last})"
+        return f"SELECT {values(True)} FROM ({keys}) WHERE NOT (_rank >= {left_only_start} AND _rank < {left_only_end})"
 
-    print("File generation complete!")
\ No newline at end of file
+    def right_only_query(first, last):
+        return f"SELECT {values(False)} FROM (SELECT range AS k FROM range({first}, {last}))"
+
+    chunk = chunk_rows or max(rows, right_only, 1)
+    left_parts = [left_query(first, min(first + chunk, rows)) for first in range(0, rows, chunk)]
+    right_parts = [right_query(first, min(first + chunk, rows)) for first in range(0, rows, chunk)]
+    right_parts += [right_only_query(first, min(first + chunk, rows + right_only)) for first in range(rows, rows + right_only, chunk)]
+
+    extension = 'parquet' if format == 'parquet' else 'csv'
+    os.makedirs(output_dir, exist_ok=True)
+    conn = duckdb.connect()
+    conn.execute("SET enable_progress_bar = false")
+    jobs, files = [], {}
+    for side, name, parts in (('left', left_name, left_parts), ('right', right_name, right_parts)):
+        if chunk_rows is None:
+            path = os.path.join(output_dir, f"{name}.{extension}")
+            jobs.append((" UNION ALL ".join(f"({part})" for part in parts), path))
+            files[side] = path
+        else:
+            directory = os.path.join(output_dir, name)
+            os.makedirs(directory, exist_ok=True)
+            jobs += [(part, os.path.join(directory, f"part-{i:05d}.{extension}")) for i, part in enumerate(parts)]
+            files[side] = os.path.join(directory, f"*.{extension}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            for future in [pool.submit(_write, conn, query, path, format) for query, path in jobs]:
+                future.result()
+    finally:
+        conn.close()
+
+    rows_both = rows - counts['left_only']
+    fields = {}
+    for i, (name, _, _) in enumerate(columns):
+        mismatches = _count_in_turn(counts['mismatches'], len(columns), i)
+        nulls = _count_in_turn(counts['nulls'], len(columns), i)
+        fields[name] = {
+            'total': rows_both,
+            'mismatches': mismatches + nulls,
+            'left_null_mismatches': 0,
+            'right_null_mismatches': nulls,
+            'left_non_null': rows_both,
+            'right_non_null': rows_both - nulls,
+        }
+    manifest = {
+        'settings': {
+            'rows': rows, 'extra_columns': extra_columns, 'format': format, 'seed': seed, 'chunk_rows': chunk_rows,
+            'mismatch_rate': mismatch_rate, 'null_rate': null_rate, 'left_only_rate': left_only_rate,
+            'right_only_rate': right_only_rate, 'duplicate_key_rate': duplicate_key_rate,
+        },
+        'files': files,
+        'primary_keys': ['trade_id'],
+        'expected': {
+            'success': counts['duplicates'] == 0,
+            'duplicate_keys_left': counts['duplicates'],
+            'duplicate_keys_right': 0,
+            'rows_left': rows,
+            'rows_right': rows_both + right_only,
+            'rows_fully_matched': rows_both - counts['mismatches'] - counts['nulls'],
+            'rows_left_only': counts['left_only'],
+            'rows_right_only': right_only,
+            'rows_mismatched': counts['mismatches'] + counts['nulls'],
+            'fields': fields,
+        }
+    }
+    with open(os.path.join(output_dir, f"{left_name}.manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def verify_results(conn, manifest: dict, entity_name: str) -> list:
+    """
+    Check the results of a DeltaLens run against a manifest written by generate_datasets.
+
+    Args:
+        conn: DuckDB connection of the run, or of its persistent database
+        manifest (dict): Manifest returned by generate_datasets or loaded from its JSON file
+        entity_name (str): Entity compared from the generated datasets
+    Returns:
+        list: Description of each difference, empty when the results match the manifest
+    """
+    expected = manifest['expected']
+    result = conn.execute("SELECT * FROM entity_compare_results WHERE entity = ?", [entity_name])
+    row = result.fetchone()
+    if row is None:
+        return [f"no results for entity [{entity_name}]"]
+    actual = dict(zip([column[0] for column in result.description], row))
+    actual['success'] = actual['success'] == 1
+
+    if not expected['success']:
+        checked = ['success', 'duplicate_keys_left', 'duplicate_keys_right']
+    else:
+        checked = [name for name in expected if name != 'fields']
+    differences = [f"{name}: expected {expected[name]}, got {actual[name]}" for name in checked if actual[name] != expected[name]]
+    if not expected['success'] or not actual['success']:
+        return differences
+
+    summary = conn.execute(f"SELECT * FROM {entity_name}_compare_field_summary")
+    names = [column[0] for column in summary.description]
+    actual_fields = {row[0]: dict(zip(names, row)) for row in summary.fetchall()}
+    for field, counts in expected['fields'].items():
+        if field not in actual_fields:
+            differences.append(f"{field}: missing from the field summary")
+            continue
+        differences += [f"{field}.{name}: expected {value}, got {actual_fields[field][name]}"
+                        for name, value in counts.items() if actual_fields[field][name] != value]
+    return differences
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description='Generate trade datasets with known differences for DeltaLens load tests')
+    parser.add_argument('--output-dir', type=str, default='.', help='Directory the datasets and manifest are written to')
+    parser.add_argument('--rows', type=int, default=30_000_000, help='Distinct keys on the left side (default: 30M, about 2GB of CSV)')
+    parser.add_argument('--extra-columns', type=int, default=0, help='attr_<n> columns added to widen the rows')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--mismatch-rate', type=float, default=0.0003, help='Keys with one changed value on the right side')
+    parser.add_argument('--null-rate', type=float, default=0.0, help='Keys with one NULL value on the right side')
+    parser.add_argument('--left-only-rate', type=float, default=0.0003, help='Keys missing on the right side')
+    parser.add_argument('--right-only-rate', type=float, default=0.0003, help='Keys only on the right side')
+    parser.add_argument('--duplicate-key-rate', type=float, default=0.0, help='Keys written twice on the left side')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-rows', type=int, default=None, help='Keys per part file, each side is a directory of part files')
+    parser.add_argument('--workers', type=int, default=None, help='Part files written concurrently (default: number of CPUs)')
+    parser.add_argument('--verify', type=str, default=None, help='Check a persistent DeltaLens run (.duckdb) against the manifest instead of generating')
+    parser.add_argument('--entity', type=str, default='trade', help='Entity checked by --verify')
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    args = parse_args(argv)
+    manifest_path = os.path.join(args.output_dir, "legacy_system_trades.manifest.json")
+
+    if args.verify:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        conn = duckdb.connect(args.verify, read_only=True)
+        differences = verify_results(conn, manifest, args.entity)
+        conn.close()
+        for difference in differences:
+            print(difference)
+        print("Results match the manifest" if not differences else f"{len(differences)} differences from the manifest")
+        return 1 if differences else 0
+
+    print(f"Generating {args.rows} trades...")
+    generate_datasets(args.output_dir, args.rows, args.extra_columns, args.format, args.mismatch_rate, args.null_rate,
+                      args.left_only_rate, args.right_only_rate, args.duplicate_key_rate, args.seed, args.chunk_rows, args.workers)
+    print(f"File generation complete! Manifest: {manifest_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,7 +3,7 @@ import tempfile
 import csv
 import os
 from delta_lens.deltaLens import DeltaLens, EntityComparer
-from delta_lens.config import Config, Entity, Side, Transform, Defaults, ReferenceDataset
+from delta_lens.config import Config, Entity, Side, Transform, Defaults, ReferenceDataset, CompareRule
 import duckdb
 import logging
 
@@ -217,5 +217,383 @@ def test_field_summary_generation(basic_config):
     assert len(summary) > 0
     assert all(col in summary.columns for col in ['field', 'total', 'matches', 'match_percentage'])
 
+def test_parallel_entities_with_dependencies(sample_csv_files):
+    """Test that entities run concurrently and dependencies run first"""
+    config = Config(
+        entities=[
+            Entity(
+                entityName="trade_filtered",
+                dependencies=["trade"],
+                leftSide=Side(
+                    title="s1",
+                    inputFile=sample_csv_files['left'],
+                    transform=Transform(query="SELECT * FROM trade_system_1 WHERE symbol = 'AAPL'")
+                ),
+                rightSide=Side(title="s2", inputFile=sample_csv_files['right']),
+                primaryKeys=["trade_id"]
+            ),
+            Entity(
+                entityName="trade",
+                leftSide=Side(title="system_1", inputFile=sample_csv_files['left']),
+                rightSide=Side(title="system_2", inputFile=sample_csv_files['right']),
+                primaryKeys=["trade_id"]
+            ),
+            Entity(
+                entityName="trade_copy",
+                leftSide=Side(title="s1", inputFile=sample_csv_files['left']),
+                rightSide=Side(title="s2", inputFile=sample_csv_files['right']),
+                primaryKeys=["trade_id"]
+            )
+        ]
+    )
+
+    lens = DeltaLens("test_parallel", config, max_parallel_entities=3)
+    lens.execute(continue_on_error=False)
+
+    results = lens.con.execute("SELECT * FROM entity_compare_results").fetchdf().set_index('entity')
+    assert (results['success'] == 1).all()
+    assert results.loc['trade_filtered', 'started_at'] >= results.loc['trade', 'finished_at']
+    assert results['started_at'].notnull().all()
+    assert results['finished_at'].notnull().all()
+
+def test_failed_dependency_skips_entity(sample_csv_files):
+    """Test that an entity is not run when its dependency failed"""
+    config = Config(
+        entities=[
+            Entity(
+                entityName="bad_trade",
+                leftSide=Side(title="s1", inputFile="nonexistent.csv"),
+                rightSide=Side(title="s2", inputFile="nonexistent.csv"),
+                primaryKeys=["trade_id"]
+            ),
+            Entity(
+                entityName="dependent_trade",
+                dependencies=["bad_trade"],
+                leftSide=Side(title="s1", inputFile=sample_csv_files['left']),
+                rightSide=Side(title="s2", inputFile=sample_csv_files['right']),
+                primaryKeys=["trade_id"]
+            )
+        ]
+    )
+
+    lens = DeltaLens("test_failed_dependency", config, max_parallel_entities=2)
+    lens.execute()
+
+    results = lens.con.execute("SELECT * FROM entity_compare_results ORDER BY entity").fetchdf()
+    assert len(results) == 2
+    assert (results['success'] == 0).all()
+    assert "Dependencies failed" in results.iloc[1]['error_text']
+
+@pytest.fixture
+def partially_matching_csv_files(tmp_path):
+    """Create test files with full matches, a mismatch and one-sided rows"""
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text("trade_id,symbol,price,quantity\n1,AAPL,150.0,100\n2,GOOGL,2500.0,\n3,MSFT,200.0,75\n4,IBM,10.0,5\n")
+    right_file.write_text("trade_id,symbol,price,quantity\n1,AAPL,150.0,100\n2,GOOGL,2500.0,\n3,MSFT,201.0,75\n5,ORCL,20.0,6\n")
+    return {'left': str(left_file), 'right': str(right_file)}
+
+def run_partially_matching_compare(files, run_name, **entity_options):
+    config = Config(
+        entities=[
+            Entity(**{
+                'entityName': "trade",
+                'leftSide': Side(title="system_1", inputFile=files['left']),
+                'rightSide': Side(title="system_2", inputFile=files['right']),
+                'primaryKeys': ["trade_id"],
+                **entity_options
+            })
+        ]
+    )
+    lens = DeltaLens(run_name, config)
+    lens.execute(continue_on_error=False)
+    return lens
+
+@pytest.mark.parametrize("store_mismatches_only", [False, True])
+@pytest.mark.parametrize("right_transform", [None, "SELECT * FROM trade_system_2"])
+def test_row_fingerprint_matches_full_comparison(partially_matching_csv_files, store_mismatches_only, right_transform):
+    """Test that the row fingerprint fast path produces the same results as the full comparison"""
+    def run(name, row_fingerprint):
+        right_side = Side(title="system_2", inputFile=partially_matching_csv_files['right'],
+                          transform=Transform(query=right_transform) if right_transform else None)
+        lens = run_partially_matching_compare(partially_matching_csv_files, f"{name}_{store_mismatches_only}_{right_transform is not None}",
+                                              rightSide=right_side, rowFingerprint=row_fingerprint, storeMismatchesOnly=store_mismatches_only)
+        compare = lens.con.execute("SELECT * FROM trade_compare ORDER BY trade_id").fetchdf()
+        summary = lens.con.execute("SELECT * FROM trade_compare_field_summary ORDER BY field").fetchdf()
+        return lens, compare, summary
+
+    _, compare, summary = run("test_no_fingerprint", False)
+    lens, fingerprint_compare, fingerprint_summary = run("test_fingerprint", True)
+
+    assert compare.equals(fingerprint_compare)
+    assert summary.equals(fingerprint_summary)
+    expected_matches = [False, False, False] if store_mismatches_only else [True, True, False, False, False]
+    assert fingerprint_compare['_full_match'].tolist() == expected_matches
+    # the side loaded without a transform is fingerprinted while parsed
+    left_columns = [row[0] for row in lens.con.execute("DESCRIBE trade_system_1").fetchall()]
+    assert left_columns[-1] == "_row_hash"
+
+def test_store_mismatches_only(partially_matching_csv_files):
+    """Test that storing mismatches only keeps results and field summary unchanged"""
+    full = run_partially_matching_compare(partially_matching_csv_files, "test_store_all")
+    mismatches = run_partially_matching_compare(partially_matching_csv_files, "test_store_mismatches", storeMismatchesOnly=True)
+
+    stored = mismatches.con.execute("SELECT trade_id FROM trade_compare ORDER BY trade_id").fetchall()
+    assert stored == [(3,), (4,), (5,)]
+
+    results_query = """SELECT rows_left, rows_right, rows_fully_matched, rows_left_only, rows_right_only, rows_mismatched,
+        duplicate_keys_left, duplicate_keys_right FROM entity_compare_results"""
+    assert full.con.execute(results_query).fetchall() == mismatches.con.execute(results_query).fetchall() == [(4, 4, 2, 1, 1, 1, 0, 0)]
+    assert full.con.execute("SELECT elapsed_seconds >= 0 FROM entity_compare_results").fetchone()[0]
+
+    summary_query = "SELECT * FROM trade_compare_field_summary ORDER BY field"
+    assert full.con.execute(summary_query).fetchall() == mismatches.con.execute(summary_query).fetchall()
+
+@pytest.mark.parametrize("store_mismatches_only", [False, True])
+def test_field_summary_counts(tmp_path, store_mismatches_only):
+    """Test mismatch, null and non-null counts of the field summary"""
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text("trade_id,price,quantity\n1,150.0,100\n2,2500.0,\n3,200.0,75\n4,10.0,5\n")
+    right_file.write_text("trade_id,price,quantity\n1,150.0,\n2,2500.0,\n3,201.0,75\n")
+    lens = run_partially_matching_compare({'left': str(left_file), 'right': str(right_file)},
+                                          "test_field_summary_counts", storeMismatchesOnly=store_mismatches_only)
+
+    summary = lens.con.execute("""
+        SELECT field, total, matches, mismatches, left_null_mismatches, right_null_mismatches, left_non_null, right_non_null
+        FROM trade_compare_field_summary ORDER BY field""").fetchall()
+    assert summary == [
+        ('price', 3, 2, 1, 0, 0, 3, 3),
+        ('quantity', 3, 2, 1, 0, 1, 2, 1),
+    ]
+    table_type = lens.con.execute("SELECT table_type FROM information_schema.tables WHERE table_name = 'trade_compare_field_summary'").fetchone()[0]
+    assert table_type == 'BASE TABLE'
+
+@pytest.mark.parametrize("store_mismatches_only", [False, True])
+def test_one_sided_row_without_values_is_not_a_match(tmp_path, store_mismatches_only):
+    """Test that a one-sided row whose values are all NULL is counted and stored as one-sided, not as a full match"""
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text("trade_id,price\n1,150.0\n2,\n")
+    right_file.write_text("trade_id,price\n1,150.0\n")
+    lens = run_partially_matching_compare({'left': str(left_file), 'right': str(right_file)},
+                                          f"test_one_sided_null_{store_mismatches_only}", storeMismatchesOnly=store_mismatches_only)
+
+    results = lens.con.execute("SELECT rows_left, rows_right, rows_fully_matched, rows_left_only FROM entity_compare_results").fetchone()
+    assert results == (2, 1, 1, 1)
+    assert lens.con.execute("SELECT COUNT(*) FROM trade_compare WHERE trade_id = 2").fetchone()[0] == 1
+    assert lens.con.execute("SELECT total, left_non_null FROM trade_compare_field_summary").fetchone() == (1, 1)
+
+def test_view_ingestion(partially_matching_csv_files):
+    """Test that scan view ingestion compares straight from the input files"""
+    table = run_partially_matching_compare(partially_matching_csv_files, "test_table_ingestion")
+    view = run_partially_matching_compare(partially_matching_csv_files, "test_view_ingestion", ingestion="view")
+
+    table_types = view.con.execute("SELECT table_name, table_type FROM information_schema.tables WHERE table_name LIKE 'trade_system_%'").fetchall()
+    assert sorted(table_types) == [('trade_system_1', 'VIEW'), ('trade_system_2', 'VIEW')]
+
+    compare_query = "SELECT * FROM trade_compare ORDER BY trade_id"
+    assert table.con.execute(compare_query).fetchall() == view.con.execute(compare_query).fetchall()
+
+@pytest.mark.parametrize("primary_key_index", [False, True])
+def test_duplicate_primary_keys_are_reported(tmp_path, primary_key_index):
+    """Test that duplicate keys fail the entity and are written to the duplicate keys table, also with primary key indexes"""
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text("trade_id,price\n1,1.0\n1,2.0\n1,3.0\n2,4.0\n")
+    right_file.write_text("trade_id,price\n1,1.0\n2,4.0\n2,5.0\n")
+    config = Config(
+        entities=[
+            Entity(
+                entityName="trade",
+                leftSide=Side(title="s1", inputFile=str(left_file)),
+                rightSide=Side(title="s2", inputFile=str(right_file)),
+                primaryKeys=["trade_id"],
+                primaryKeyIndex=primary_key_index
+            )
+        ]
+    )
+
+    lens = DeltaLens(f"test_duplicates_{primary_key_index}", config)
+    with pytest.raises(ValueError, match="Duplicate primary keys"):
+        lens.execute(continue_on_error=False)
+
+    duplicates = lens.con.execute("SELECT side, trade_id, duplicate_count FROM trade_duplicate_keys ORDER BY side").fetchall()
+    assert duplicates == [('left', 1, 3), ('right', 2, 2)]
+
+    result = lens.con.execute("SELECT success, duplicate_keys_left, duplicate_keys_right FROM entity_compare_results").fetchone()
+    assert result == (0, 1, 1)
+
+def test_null_primary_keys_fail_the_entity(tmp_path):
+    """Test that rows with a NULL primary key fail the entity instead of dropping out of every count"""
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text("id,value\n1,a\n,b\n,c\n")
+    right_file.write_text("id,value\n1,a\n,b\n")
+    config = Config(
+        entities=[
+            Entity(
+                entityName="n",
+                leftSide=Side(title="s1", inputFile=str(left_file)),
+                rightSide=Side(title="s2", inputFile=str(right_file)),
+                primaryKeys=["id"]
+            )
+        ]
+    )
+
+    lens = DeltaLens("test_null_keys", config)
+    with pytest.raises(ValueError, match=r"NULL primary keys \['id'\] found \(left side: 2 rows, right side: 1 rows\)"):
+        lens.execute(continue_on_error=False)
+    assert lens.con.execute("SELECT success FROM entity_compare_results").fetchone()[0] == 0
+    assert lens.con.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'n_duplicate_keys'").fetchone()[0] == 0
+
+def test_primary_key_index(partially_matching_csv_files):
+    """Test that primary key indexes are only built when requested"""
+    constraints_query = "SELECT table_name FROM duckdb_constraints() WHERE constraint_type = 'PRIMARY KEY' AND table_name LIKE 'trade%' ORDER BY table_name"
+
+    without_index = run_partially_matching_compare(partially_matching_csv_files, "test_no_index")
+    assert without_index.con.execute(constraints_query).fetchall() == []
+
+    with_index = run_partially_matching_compare(partially_matching_csv_files, "test_index", primaryKeyIndex=True)
+    assert with_index.con.execute(constraints_query).fetchall() == [('trade_compare',), ('trade_system_1',), ('trade_system_2',)]
+
+@pytest.mark.parametrize("entity_options", [{}, {'rowFingerprint': True}, {'rowFingerprint': True, 'excludeColumns': ['symbol']}])
+def test_incremental_compare_against_previous_run(tmp_path, caplog, entity_options):
+    """Test that an incremental run only re-compares changed keys and matches a full compare"""
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text("trade_id,symbol,price\n1,AAPL,150.0\n2,GOOGL,2500.0\n3,MSFT,200.0\n4,IBM,10.0\n")
+    right_file.write_text("trade_id,symbol,price\n1,AAPL,150.0\n2,GOOGL,2500.0\n3,MSFT,201.0\n4,IBM,10.0\n")
+
+    def run(name, previous_run=None):
+        config = Config(
+            entities=[
+                Entity(
+                    entityName="trade",
+                    leftSide=Side(title="system_1", inputFile=str(left_file)),
+                    rightSide=Side(title="system_2", inputFile=str(right_file)),
+                    primaryKeys=["trade_id"],
+                    **entity_options
+                )
+            ]
+        )
+        lens = DeltaLens(name, config, persistent=True, persist_path=str(tmp_path), previous_run=previous_run)
+        lens.execute(continue_on_error=False)
+        return lens
+
+    day_1 = run("day_1")
+    day_1.con.close()
+
+    # rename AAPL, fix the MSFT price, change IBM, drop GOOGL and add ORCL on the right side
+    right_file.write_text("trade_id,symbol,price\n1,AAPL Inc,150.0\n3,MSFT,200.0\n4,IBM,11.0\n5,ORCL,20.0\n")
+    caplog.clear()
+    incremental = run("day_2_incremental", previous_run=str(tmp_path / "day_1.duckdb"))
+    # an excluded column is still copied into the compare table, its changes count as well
+    assert "incremental compare: 5 changed keys" in caplog.text
+    assert incremental.con.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'trade_changed_keys'").fetchone()[0] == 0
+    full = run("day_2_full")
+
+    compare_query = "SELECT * FROM trade_compare ORDER BY trade_id"
+    assert incremental.con.execute(compare_query).fetchall() == full.con.execute(compare_query).fetchall()
+    results_query = "SELECT rows_left, rows_right, rows_fully_matched FROM entity_compare_results"
+    fully_matched = 2 if 'excludeColumns' in entity_options else 1
+    assert incremental.con.execute(results_query).fetchall() == full.con.execute(results_query).fetchall() == [(4, 4, fully_matched)]
+    summary_query = "SELECT * FROM trade_compare_field_summary ORDER BY field"
+    assert incremental.con.execute(summary_query).fetchall() == full.con.execute(summary_query).fetchall()
+
+def test_incremental_compare_falls_back_on_schema_change(tmp_path, caplog):
+    """Test that a schema change since the previous run triggers a full compare"""
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text("trade_id,price\n1,150.0\n")
+    right_file.write_text("trade_id,price\n1,150.0\n")
+
+    def run(name, previous_run=None):
+        config = Config(
+            entities=[
+                Entity(
+                    entityName="trade",
+                    leftSide=Side(title="system_1", inputFile=str(left_file)),
+                    rightSide=Side(title="system_2", inputFile=str(right_file)),
+                    primaryKeys=["trade_id"]
+                )
+            ]
+        )
+        lens = DeltaLens(name, config, persistent=True, persist_path=str(tmp_path), previous_run=previous_run)
+        lens.execute(continue_on_error=False)
+        return lens
+
+    run("day_1").con.close()
+    left_file.write_text("trade_id,price\n1,ABC\n")
+    right_file.write_text("trade_id,price\n1,ABC\n")
+
+    caplog.clear()
+    lens = run("day_2", previous_run=str(tmp_path / "day_1.duckdb"))
+    assert "running full compare" in caplog.text
+    assert lens.con.execute("SELECT price_left FROM trade_compare").fetchall() == [('ABC',)]
+
+@pytest.mark.parametrize("entity_options", [
+    {'buckets': 3},
+    {'buckets': 3, 'storeMismatchesOnly': True, 'rowFingerprint': True},
+    {'buckets': 'auto'},
+])
+def test_bucketed_compare(partially_matching_csv_files, entity_options):
+    """Test that comparing bucket by bucket produces the same results as a single pass"""
+    single = run_partially_matching_compare(partially_matching_csv_files, "test_single_pass", storeMismatchesOnly=entity_options.get('storeMismatchesOnly', False))
+    bucketed = run_partially_matching_compare(partially_matching_csv_files, "test_bucketed", **entity_options)
+
+    for query in ("SELECT * FROM trade_compare ORDER BY trade_id",
+                  "SELECT rows_left, rows_right, rows_fully_matched FROM entity_compare_results",
+                  "SELECT * FROM trade_compare_field_summary ORDER BY field"):
+        assert single.con.execute(query).fetchall() == bucketed.con.execute(query).fetchall()
+
+def test_compare_rules(tmp_path):
+    """Test tolerance and normalization rules per column"""
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text(
+        "trade_id,price,fx_rate,trade_time,counterparty\n"
+        "1,100.00,1.2500,2024-01-01 10:00:00,ACME\n"
+        "2,100.00,1.2500,2024-01-01 10:00:00,\n"
+        "3,100.00,1.2500,2024-01-01 10:00:00,acme\n")
+    right_file.write_text(
+        "trade_id,price,fx_rate,trade_time,counterparty\n"
+        "1,100.004,1.25012,2024-01-01 10:00:00.5, acme \n"
+        "2,100.02,1.2600,2024-01-01 10:00:05,\"\"\n"
+        "3,100.00,1.2500,2024-01-01 10:00:00,ACME CORP\n")
+    config = Config(
+        entities=[
+            Entity(
+                entityName="trade",
+                leftSide=Side(title="s1", inputFile=str(left_file)),
+                rightSide=Side(title="s2", inputFile=str(right_file)),
+                primaryKeys=["trade_id"],
+                compareRules={
+                    'price': CompareRule(absoluteTolerance=0.01),
+                    'fx_rate': CompareRule(relativeTolerance=0.001),
+                    'trade_time': CompareRule(timestampToleranceSeconds=1),
+                    'counterparty': CompareRule(caseInsensitive=True, trimWhitespace=True, emptyAsNull=True)
+                }
+            )
+        ]
+    )
+
+    lens = DeltaLens("test_compare_rules", config)
+    lens.execute(continue_on_error=False)
+
+    matches = lens.con.execute("""
+        SELECT trade_id, price_match, fx_rate_match, trade_time_match, counterparty_match, _full_match
+        FROM trade_compare ORDER BY trade_id""").fetchall()
+    assert matches == [
+        (1, True, True, True, True, True),
+        (2, False, False, False, True, False),
+        (3, True, True, True, False, False),
+    ]
+
+def test_compare_rules_unknown_column(partially_matching_csv_files):
+    """Test that compare rules on columns that are not compared are rejected"""
+    with pytest.raises(ValueError, match="Compare rules reference columns that are not compared"):
+        run_partially_matching_compare(partially_matching_csv_files, "test_unknown_rule", compareRules={'trade_id': CompareRule(absoluteTolerance=1)})
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -12,10 +12,27 @@ The CLI can be configured through command-line arguments or environment variable
 - DELTALENS_OUTPUT_DIR: Directory for output files
 - DELTALENS_PERSISTENT: Enable persistent storage
 - DELTALENS_CONTINUE_ON_ERROR: Continue processing on errors
+- DELTALENS_MAX_PARALLEL_ENTITIES: Number of entities compared concurrently
+- DELTALENS_INCREMENTAL_FROM: Previous run .duckdb file to compare incrementally against
+- DELTALENS_CACHE_DIR: Directory caching parsed inputs and cached transforms across runs
+- DELTALENS_CACHE_KEY_MODE: Cache key derived from file 'content' or 'stat' (path, size, mtime)
+- DELTALENS_CACHE_MAX_SIZE_GB: Size limit of the cache directory
+- DELTALENS_SCHEMA_CACHE: JSON file of sniffed CSV schemas reused across runs instead of sniffing again
+- DELTALENS_MEMORY_LIMIT_GB: DuckDB memory limit, detected from the cgroup or system memory when unset
+- DELTALENS_THREADS: DuckDB worker threads, detected from the cgroup CPU quota when unset
+- DELTALENS_TEMP_DIRECTORY: Directory DuckDB spills to
+- DELTALENS_MAX_TEMP_DIRECTORY_SIZE_GB: Size limit of the spill directory
 - DELTALENS_EXPORT_SQLITE: Export results to SQLite
 - DELTALENS_EXPORT_SAMPLING_THRESHOLD: Sample size for  export
+- DELTALENS_EXPORT_SAMPLING_SEED: Seed of the primary key hash picking sampled rows
+- DELTALENS_EXPORT_SAMPLING_ROWS_PER_FIELD: Sampled rows added per mismatching field
 - DELTALENS_EXPORT_CSV: export to csv archive
+- DELTALENS_EXPORT_PARQUET: export to Parquet files
+- DELTALENS_EXPORT_PARQUET_PARTITIONED: Hive partition exported compare tables by entity and match status
+- DELTALENS_EXPORT_PARQUET_ROW_GROUP_SIZE: Rows per Parquet row group
 - DELTALENS_EXPORT_MISMATCHES_ONLY: export only mismatched rows
+- DELTALENS_EXPORT_QUEUE_SIZE: Compared entities waiting for export before further entities are held back
+- DELTALENS_PROFILE_QUERIES: Save the JSON query profiles of expensive statements next to the output
 - DELTALENS_LOG_LEVEL: Logging level
 
 
@@ -40,6 +57,9 @@ Dependencies:
     - delta_lens.deltaLens
     - delta_lens.config
     - delta_lens.sqliteExport
+    - delta_lens.csvExport
+    - delta_lens.parquetExport
+    - delta_lens.exportPipeline
 
 Author: Paul
 License: MIT
@@ -49,9 +69,14 @@ import os
 from datetime import date
 from pathlib import Path
 from delta_lens.deltaLens import DeltaLens
-from delta_lens.config import load_config
-from delta_lens.sqliteExport import export_to_sqlite
-from delta_lens.csvExport import export_to_csv_archive
+from delta_lens.config import load_config, Resources
+from delta_lens.ingestCache import IngestCache
+from delta_lens.schemaCache import SchemaCache
+from delta_lens.exportPipeline import ExportPipeline
+from delta_lens.sqliteExport import SqliteExporter
+from delta_lens.csvExport import CsvArchiveExporter
+from delta_lens.parquetExport import ParquetExporter
+from delta_lens.stageTimings import format_hot_spots
 import argparse
 
 def setup_logging(log_level: str = "INFO") -> None:
@@ -106,6 +131,88 @@ def parse_args():
         help='Continue processing entities if error occurs (env: DELTALENS_CONTINUE_ON_ERROR)'
     )
     
+    # Parallel entity comparison
+    parser.add_argument(
+        '--max-parallel-entities',
+        type=int,
+        default=int(os.getenv('DELTALENS_MAX_PARALLEL_ENTITIES', '1')),
+        help='Maximum number of entities compared concurrently (env: DELTALENS_MAX_PARALLEL_ENTITIES)'
+    )
+    
+    # Incremental compare
+    parser.add_argument(
+        '--incremental-from',
+        type=str,
+        default=os.getenv('DELTALENS_INCREMENTAL_FROM'),
+        help='Previous persistent run (.duckdb) to compare incrementally against (env: DELTALENS_INCREMENTAL_FROM)'
+    )
+
+    # Ingest cache
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=os.getenv('DELTALENS_CACHE_DIR'),
+        help='Directory caching parsed inputs and cached transforms across runs (env: DELTALENS_CACHE_DIR)'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        default=False,
+        help='Ignore the cache directory for this run'
+    )
+
+    parser.add_argument(
+        '--cache-key-mode',
+        type=str,
+        choices=['content', 'stat'],
+        default=os.getenv('DELTALENS_CACHE_KEY_MODE', 'content'),
+        help='Key cached inputs by file content hash or by path, size and mtime (env: DELTALENS_CACHE_KEY_MODE)'
+    )
+
+    parser.add_argument(
+        '--cache-max-size-gb',
+        type=float,
+        default=float(os.getenv('DELTALENS_CACHE_MAX_SIZE_GB', '10')),
+        help='Size limit of the cache directory, least recently used entries are evicted (env: DELTALENS_CACHE_MAX_SIZE_GB)'
+    )
+
+    parser.add_argument(
+        '--schema-cache',
+        type=str,
+        default=os.getenv('DELTALENS_SCHEMA_CACHE'),
+        help='JSON file of sniffed CSV schemas reused across runs instead of sniffing again (env: DELTALENS_SCHEMA_CACHE)'
+    )
+
+    # Resources, unset values come from the config resources section or the detected cgroup limits
+    parser.add_argument(
+        '--memory-limit-gb',
+        type=float,
+        default=float(os.environ['DELTALENS_MEMORY_LIMIT_GB']) if os.getenv('DELTALENS_MEMORY_LIMIT_GB') else None,
+        help='DuckDB memory limit, defaults to 70%% of the container or system memory (env: DELTALENS_MEMORY_LIMIT_GB)'
+    )
+
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=int(os.environ['DELTALENS_THREADS']) if os.getenv('DELTALENS_THREADS') else None,
+        help='DuckDB worker threads, defaults to the container CPU quota or usable CPUs (env: DELTALENS_THREADS)'
+    )
+
+    parser.add_argument(
+        '--temp-directory',
+        type=str,
+        default=os.getenv('DELTALENS_TEMP_DIRECTORY'),
+        help='Directory DuckDB spills to when the memory limit is reached (env: DELTALENS_TEMP_DIRECTORY)'
+    )
+
+    parser.add_argument(
+        '--max-temp-directory-size-gb',
+        type=float,
+        default=float(os.environ['DELTALENS_MAX_TEMP_DIRECTORY_SIZE_GB']) if os.getenv('DELTALENS_MAX_TEMP_DIRECTORY_SIZE_GB') else None,
+        help='Size limit of the DuckDB spill directory (env: DELTALENS_MAX_TEMP_DIRECTORY_SIZE_GB)'
+    )
+    
     # Export to SQLite
     parser.add_argument(
         '--export-sqlite',
@@ -122,6 +229,34 @@ def parse_args():
         help='Export results to CSV (gziped) (env: DELTALENS_EXPORT_CSV)'
     )
 
+    parser.add_argument(
+        '--export-parquet',
+        action='store_true',
+        default=os.getenv('DELTALENS_EXPORT_PARQUET', 'false').lower() in ('true', '1', 'yes'),
+        help='Export results to compressed Parquet files (env: DELTALENS_EXPORT_PARQUET)'
+    )
+
+    parser.add_argument(
+        '--export-parquet-partitioned',
+        action='store_true',
+        default=os.getenv('DELTALENS_EXPORT_PARQUET_PARTITIONED', 'false').lower() in ('true', '1', 'yes'),
+        help='Hive partition exported compare tables by entity and match status (env: DELTALENS_EXPORT_PARQUET_PARTITIONED)'
+    )
+
+    parser.add_argument(
+        '--export-parquet-row-group-size',
+        type=int,
+        default=int(os.getenv('DELTALENS_EXPORT_PARQUET_ROW_GROUP_SIZE', '122880')),
+        help='Rows per Parquet row group (env: DELTALENS_EXPORT_PARQUET_ROW_GROUP_SIZE)'
+    )
+
+    parser.add_argument(
+        '--export-queue-size',
+        type=int,
+        default=int(os.getenv('DELTALENS_EXPORT_QUEUE_SIZE', '2')),
+        help='Compared entities waiting for export before further entities are held back (env: DELTALENS_EXPORT_QUEUE_SIZE)'
+    )
+
     parser.add_argument(
         '--export-mismatches-only',
         action='store_true',
@@ -135,7 +270,29 @@ def parse_args():
         default=int(os.getenv('DELTALENS_EXPORT_SAMPLING_THRESHOLD', '10000')),
         help='Sampling size for  export (env: DELTALENS_EXPORT_SAMPLING_THRESHOLD)'
     )
+
+    parser.add_argument(
+        '--export-sampling-seed',
+        type=int,
+        default=int(os.getenv('DELTALENS_EXPORT_SAMPLING_SEED', '0')),
+        help='Seed of the primary key hash picking sampled rows (env: DELTALENS_EXPORT_SAMPLING_SEED)'
+    )
+
+    parser.add_argument(
+        '--export-sampling-rows-per-field',
+        type=int,
+        default=int(os.getenv('DELTALENS_EXPORT_SAMPLING_ROWS_PER_FIELD', '0')),
+        help='Sampled rows added per mismatching field so every field is represented (env: DELTALENS_EXPORT_SAMPLING_ROWS_PER_FIELD)'
+    )
     
+    # Query profiles
+    parser.add_argument(
+        '--profile-queries',
+        action='store_true',
+        default=os.getenv('DELTALENS_PROFILE_QUERIES', 'false').lower() in ('true', '1', 'yes'),
+        help='Save the JSON query profiles of the load, join and summary statements to <run-name>_profiles in the output directory (env: DELTALENS_PROFILE_QUERIES)'
+    )
+
     # Log level
     parser.add_argument(
         '--log-level',
@@ -162,42 +319,86 @@ def main():
         logger.info(f"Loading configuration from: {args.config}")
         config = load_config(args.config)
         
+        cache = None
+        if args.cache_dir and not args.no_cache:
+            logger.info(f"Using ingest cache: {args.cache_dir}")
+            cache = IngestCache(
+                args.cache_dir,
+                key_mode=args.cache_key_mode,
+                max_size_bytes=int(args.cache_max_size_gb * 1024**3)
+            )
+
         # Initialize DeltaLens
         lens = DeltaLens(
             args.run_name,
             config,
             persistent=args.persistent,
-            persist_path=str(output_dir)
+            persist_path=str(output_dir),
+            max_parallel_entities=args.max_parallel_entities,
+            cache=cache,
+            previous_run=args.incremental_from,
+            resources=Resources(
+                memoryLimitGb=args.memory_limit_gb,
+                threads=args.threads,
+                tempDirectory=args.temp_directory,
+                maxTempDirectorySizeGb=args.max_temp_directory_size_gb
+            ),
+            profile_dir=str(output_dir / f"{args.run_name}_profiles") if args.profile_queries else None,
+            schema_cache=SchemaCache(args.schema_cache) if args.schema_cache else None
         )
         
-        # Execute comparison
-        logger.info("Starting comparison")
-        lens.execute(continue_on_error=args.continue_on_error)
-        
-        # Export to SQLite if requested
+        # exporters receive the tables of each entity as soon as it is compared
+        exporters = []
         if args.export_sqlite:
-
             sqlite_path = output_dir / f"{args.run_name}.sqlite"
             logger.info(f"Exporting results to SQLite: {sqlite_path}")
-            export_to_sqlite(
-                lens.con,
+            exporters.append(SqliteExporter(
                 str(sqlite_path),
                 sample_threshold=args.export_sampling_threshold,
                 mismatches_only=args.export_mismatches_only
-            )
+            ))
 
-         # Export to SQLite if requested
         if args.export_csv:
             tar_path = output_dir / f"{args.run_name}.tar.gz"
             logger.info(f"Exporting results to CSV: {tar_path}")
-            export_to_csv_archive(
-                lens.con,
+            exporters.append(CsvArchiveExporter(
                 str(tar_path),
+                sample_threshold=args.export_sampling_threshold,
                 mismatches_only=args.export_mismatches_only
-            )
+            ))
+
+        if args.export_parquet:
+            parquet_dir = output_dir / f"{args.run_name}_parquet"
+            logger.info(f"Exporting results to Parquet: {parquet_dir}")
+            exporters.append(ParquetExporter(
+                str(parquet_dir),
+                sample_threshold=args.export_sampling_threshold,
+                mismatches_only=args.export_mismatches_only,
+                partition_by_match=args.export_parquet_partitioned,
+                row_group_size=args.export_parquet_row_group_size
+            ))
+
+        # Execute comparison
+        logger.info("Starting comparison")
+        if not exporters:
+            # nothing to export, compare tables are neither sampled nor queued
+            lens.execute(continue_on_error=args.continue_on_error)
+        else:
+            with ExportPipeline(
+                lens.con,
+                exporters,
+                sample_threshold=args.export_sampling_threshold,
+                sample_seed=args.export_sampling_seed,
+                mismatches_only=args.export_mismatches_only,
+                sample_rows_per_field=args.export_sampling_rows_per_field,
+                max_pending=args.export_queue_size
+            ) as pipeline:
+                lens.execute(continue_on_error=args.continue_on_error, on_entity_complete=pipeline.entity_completed)
         
         
         logger.info("Comparison completed successfully")
+        print("Hot spots (slowest entity stages):")
+        print(format_hot_spots(lens.hot_spots()))
         
     except Exception as e:
         logger.error(f"Error during comparison: {str(e)}", exc_info=True)
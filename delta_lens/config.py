@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 import json
 import re
 import jsonschema
@@ -16,6 +16,17 @@ class Side:
     title: str = None
     inputFile: str = None
     transform: Optional[Transform] = None
+    format: Optional[str] = None
+    inputFiles: Optional[List[str]] = None
+
+@dataclass
+class CompareRule:
+    absoluteTolerance: Optional[float] = None
+    relativeTolerance: Optional[float] = None
+    timestampToleranceSeconds: Optional[float] = None
+    caseInsensitive: bool = False
+    trimWhitespace: bool = False
+    emptyAsNull: bool = False
 
 @dataclass
 class Entity:
@@ -25,23 +36,44 @@ class Entity:
     primaryKeys: List[str]
     dependencies: Optional[List[str]] = None
     excludeColumns: Optional[List[str]] = None
+    rowFingerprint: bool = False
+    storeMismatchesOnly: bool = False
+    ingestion: str = 'table'
+    primaryKeyIndex: bool = False
+    buckets: Optional[Union[int, str]] = None
+    compareRules: Optional[Dict[str, CompareRule]] = None
+    fileNameColumn: Optional[str] = None
+    columnTypes: Optional[Dict[str, str]] = None
+    negotiateTypes: bool = False
 
 @dataclass
 class Defaults:
     leftSideTitle: str = None
     rightSideTitle: str = None
     filePattenGlobTemplate: str = None
+    fileNameColumn: str = None
 
 @dataclass
 class ReferenceDataset:
     datasetName: str
     inputFile: str
+    format: Optional[str] = None
+    materialize: bool = False
+
+@dataclass
+class Resources:
+    memoryLimitGb: Optional[float] = None
+    memoryFraction: Optional[float] = None
+    threads: Optional[int] = None
+    tempDirectory: Optional[str] = None
+    maxTempDirectorySizeGb: Optional[float] = None
 
 @dataclass
 class Config:
     entities: List[Entity]
     defaults:  Optional[Defaults]=None
     reference_datasets: Optional[List[ReferenceDataset]] = None
+    resources: Optional[Resources] = None
     @staticmethod
     def Validate(config):
         if config.defaults and config.defaults.leftSideTitle and config.defaults.rightSideTitle:
@@ -65,7 +97,58 @@ class Config:
 
         for entity in config.entities:
             Config._validate_entity_name_characters(entity.entityName)
+            if entity.ingestion not in ('table', 'view'):
+                raise ValueError(f"Invalid ingestion mode '{entity.ingestion}' for entity '{entity.entityName}'. Expected 'table' or 'view'.")
+            for column, rule in (entity.compareRules or {}).items():
+                Config._validate_compare_rule(entity.entityName, column, rule)
+            if entity.buckets is not None and entity.buckets != 'auto' and (not isinstance(entity.buckets, int) or isinstance(entity.buckets, bool) or entity.buckets < 1):
+                raise ValueError(f"Invalid buckets '{entity.buckets}' for entity '{entity.entityName}'. Expected a positive integer or 'auto'.")
+
+        Config._validate_dependencies(config.entities)
+
+        if config.resources:
+            Config._validate_resources(config.resources)
+
+    @staticmethod
+    def _validate_resources(resources: Resources) -> None:
+        for setting in ('memoryLimitGb', 'threads', 'maxTempDirectorySizeGb'):
+            value = getattr(resources, setting)
+            if value is not None and value <= 0:
+                raise ValueError(f"Invalid resources {setting} {value}. Expected a positive value.")
+        if resources.memoryFraction is not None and not 0 < resources.memoryFraction <= 1:
+            raise ValueError(f"Invalid resources memoryFraction {resources.memoryFraction}. Expected a value in (0, 1].")
    
+    @staticmethod
+    def _validate_compare_rule(entity_name: str, column: str, rule: CompareRule) -> None:
+        for tolerance in ('absoluteTolerance', 'relativeTolerance', 'timestampToleranceSeconds'):
+            value = getattr(rule, tolerance)
+            if value is not None and value < 0:
+                raise ValueError(f"Invalid {tolerance} {value} for column '{column}' of entity '{entity_name}'. Tolerances must not be negative.")
+        if rule.timestampToleranceSeconds is not None and (rule.absoluteTolerance is not None or rule.relativeTolerance is not None):
+            raise ValueError(f"Column '{column}' of entity '{entity_name}' cannot have both numeric and timestamp tolerances.")
+
+    @staticmethod
+    def _validate_dependencies( entities) -> None:
+        entity_names = {e.entityName for e in entities}
+        for entity in entities:
+            unknown = [d for d in (entity.dependencies or []) if d not in entity_names]
+            if unknown:
+                raise ValueError(f"Entity '{entity.entityName}' depends on unknown entities: {unknown}")
+        # depth first search for dependency cycles
+        dependencies = {e.entityName: e.dependencies or [] for e in entities}
+        visiting, visited = set(), set()
+        def visit(name, path):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Circular entity dependency found: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dependency in dependencies[name]:
+                visit(dependency, path + [name])
+            visiting.remove(name)
+            visited.add(name)
+        for entity in entities:
+            visit(entity.entityName, [])
     
     @staticmethod
     def _validate_unique_entity_names( entities) -> None:
@@ -95,11 +178,18 @@ class ConfigLoader:
             cached=data.get('cached', False)
         )
 
+    def _create_compare_rules(self, data: Dict) -> Dict[str, CompareRule]:
+        if not data:
+            return None
+        return {column: CompareRule(**rule) for column, rule in data.items()}
+
     def _create_side(self, data: Dict) -> Side:
         return Side(
             title=data['title'],
-            inputFile=data['inputFile'],
-            transform=self._create_transform(data.get('transform'))
+            inputFile=data.get('inputFile'),
+            transform=self._create_transform(data.get('transform')),
+            format=data.get('format'),
+            inputFiles=data.get('inputFiles')
         )
 
     def _create_entity(self, data: Dict) -> Entity:
@@ -109,7 +199,16 @@ class ConfigLoader:
             rightSide=self._create_side(data['rightSide']),
             primaryKeys=data['primaryKeys'],
             dependencies=data.get('dependencies'),
-            excludeColumns=data.get('excludeColumns')
+            excludeColumns=data.get('excludeColumns'),
+            rowFingerprint=data.get('rowFingerprint', False),
+            storeMismatchesOnly=data.get('storeMismatchesOnly', False),
+            ingestion=data.get('ingestion', 'table'),
+            primaryKeyIndex=data.get('primaryKeyIndex', False),
+            buckets=data.get('buckets'),
+            compareRules=self._create_compare_rules(data.get('compareRules')),
+            fileNameColumn=data.get('fileNameColumn'),
+            columnTypes=data.get('columnTypes'),
+            negotiateTypes=data.get('negotiateTypes', False)
         )
 
    
@@ -142,8 +241,8 @@ class ConfigLoader:
         config = Config(
             defaults=Defaults(**config_data['defaults']),
             entities=[self._create_entity(e) for e in config_data['entities']],
-            reference_datasets=[ReferenceDataset(**r) for r in config_data.get('reference_datasets', [])]
-    
+            reference_datasets=[ReferenceDataset(**r) for r in config_data.get('reference_datasets', [])],
+            resources=Resources(**config_data['resources']) if 'resources' in config_data else None
         )
         Config.Validate(config)
         return config
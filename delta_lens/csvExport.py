@@ -2,29 +2,117 @@ import duckdb
 import logging
 from pathlib import Path
 import os
-import gzip
 import tempfile
 import tarfile
-import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .sampling import create_sample
 
-def export_to_csv_archive(conn, archive_path: str,  table_filter = None, mismatches_only = True):
+class CsvArchiveExporter:
+    """
+    Incremental export of DuckDB tables into a gzipped tar archive of CSV files, used by
+    export_to_csv_archive and by the export pipeline to add the tables of each entity as soon as its
+    comparison completes.
+
+    Tables are copied to temporary CSV files concurrently, each on its own cursor. Every CSV file is
+    streamed into the archive as soon as it is written and removed afterwards, so memory use stays
+    constant and at most max_workers CSV files wait on disk.
+    Parameters
+    ----------
+    archive_path : str
+        Path to the output tar.gz archive file
+    mismatches_only : bool, optional
+        Export only mismatched rows of the compare tables (default is True)
+    max_workers : int, optional
+        Number of tables copied concurrently (default is 4)
+    compresslevel : int, optional
+        gzip compression level of the archive, 1 (fastest) to 9 (default is 6)
+    sample_threshold : int, optional
+        Maximum number of rows sampled from compare tables, see sampling.create_sample. An existing
+        '{table}_sample' table is exported instead. If <= 0, no sampling is performed (default is 0)
+    """
+    def __init__(self, archive_path: str, mismatches_only = True, max_workers = 4, compresslevel = 6, sample_threshold = 0):
+        # Check if archive file exists
+        if os.path.exists(archive_path):
+            raise FileExistsError(f"Archive file '{archive_path}' already exists")
+        self.logger = logging.getLogger(__name__)
+        self.archive_path = archive_path
+        self.mismatches_only = mismatches_only
+        self.max_workers = max_workers
+        self.sample_threshold = sample_threshold
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.tar = tarfile.open(archive_path, "w:gz", compresslevel=compresslevel)
+
+    def __copy_table(self, conn, table_name, csv_path):
+        cursor = conn.cursor()
+        try:
+            source_table = table_name
+            if table_name.endswith("_compare") and self.sample_threshold > 0:
+                # deterministic sample shared with the other exporters
+                source_table = create_sample(cursor, table_name, self.sample_threshold, mismatches_only=self.mismatches_only)
+            if table_name.endswith("_compare") and self.mismatches_only:
+                source = f"SELECT * FROM {source_table} WHERE _full_match=0"
+            else:
+                source = f"SELECT * FROM {source_table}"
+            # COPY returns the number of rows written
+            return cursor.execute(f"COPY ({source}) TO '{csv_path}' WITH (HEADER TRUE, DELIMITER ',')").fetchone()[0]
+        finally:
+            cursor.close()
+
+    def export_tables(self, conn, tables):
+        """Export the given DuckDB tables, conn is a DuckDB connection or cursor"""
+        pending = deque(tables)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="CsvExport") as pool:
+            futures = deque()
+
+            def submit_next():
+                table_name = pending.popleft()
+                self.logger.info(f"Exporting table: {table_name} mismatches_only={self.mismatches_only}")
+                csv_path = Path(self.temp_dir.name) / f"{table_name}.csv"
+                futures.append((table_name, csv_path, pool.submit(self.__copy_table, conn, table_name, csv_path)))
+
+            # a table is only submitted once a file leaves the disk, so at most max_workers are written or waiting
+            while pending and len(futures) < self.max_workers:
+                submit_next()
+
+            # members are added in table order, each streamed into the compressed archive in chunks
+            while futures:
+                table_name, csv_path, future = futures.popleft()
+                row_count = future.result()
+                self.tar.add(csv_path, arcname=f"{table_name}.csv")
+                os.remove(csv_path)
+                self.logger.info(f"Exported {row_count} rows from {table_name}")
+                if pending:
+                    submit_next()
+
+    def close(self):
+        self.tar.close()
+        self.temp_dir.cleanup()
+        return self.archive_path
+
+def export_to_csv_archive(conn, archive_path: str,  table_filter = None, mismatches_only = True, max_workers = 4, compresslevel = 6, sample_threshold = 0):
     """
     Export tables from DuckDB to a gzipped tar archive containing CSV files.
-    
+    See CsvArchiveExporter for how tables are copied and streamed into the archive.
+
     Args:
         conn: DuckDB connection object
         archive_path (str): Path to the output tar.gz archive file
-        sample_threshold (int, optional): Maximum number of rows to sample from large tables. 
-            If <= 0, no sampling is performed. Defaults to 10000.
         table_filter (callable, optional): Function to filter which tables to export.
-            Takes table name as input and returns boolean. If None, exports tables ending with 
+            Takes table name as input and returns boolean. If None, exports tables ending with
             '_compare_field_summary', 'entity_compare_results', or '_compare'. Defaults to None.
-    
+        mismatches_only (bool, optional): Export only mismatched rows of the compare tables. Defaults to True.
+        max_workers (int, optional): Number of tables copied concurrently. Defaults to 4.
+        compresslevel (int, optional): gzip compression level of the archive, 1 (fastest) to 9. Defaults to 6.
+        sample_threshold (int, optional): Maximum number of rows sampled from compare tables, see
+            sampling.create_sample. An existing '{table}_sample' table is exported instead.
+            If <= 0, no sampling is performed. Defaults to 0.
+
     Returns:
         str: Path to the created archive file
     """
     logger = logging.getLogger(__name__)
-    
+
     # Check if archive file exists
     if os.path.exists(archive_path):
         raise FileExistsError(f"Archive file '{archive_path}' already exists")
@@ -33,70 +121,32 @@ def export_to_csv_archive(conn, archive_path: str,  table_filter = None, mismatc
         table_filter = lambda table: table.endswith("_compare_field_summary") or \
                                    table.endswith("entity_compare_results") or \
                                    table.endswith("_compare")
-    
-    duck_con = conn
-    temp_tar = archive_path.replace('.gz', '')
-    
-    # Create temporary directory for CSV files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        try:
-            # Get list of tables
-            tables = duck_con.execute("""
-                SELECT table_name
-                FROM information_schema.tables
-                WHERE table_schema = 'main'
-                AND table_type IN ('BASE TABLE', 'VIEW')
-            """).fetchall()
-            
-            # Filter tables
-            tables = [name[0] for name in tables if table_filter(name[0])]
-            logger.info(f"Found {len(tables)} tables to export")
-            
-            # Create uncompressed tar archive
-            with tarfile.open(temp_tar, "w") as tar:
-                for table_name in tables:
-                    logger.info(f"Exporting table: {table_name} mismatches_only={mismatches_only}")
-                    csv_path = Path(temp_dir) / f"{table_name}.csv"
-                    
-                    if table_name.endswith("_compare") and mismatches_only:
-
-                        query = f"""
-                                    COPY (SELECT * FROM {table_name} WHERE _full_match=0)
-                                    TO '{csv_path}'
-                                    WITH (HEADER TRUE, DELIMITER ',')
-                                """
-                    else:       
-                        query = f"""
-                                    COPY (SELECT * FROM {table_name})
-                                    TO '{csv_path}'
-                                    WITH (HEADER TRUE, DELIMITER ',')
-                                """
-                
-                    # Export to CSV
-                    duck_con.execute(query)
-                    
-                    # Add CSV to tar archive
-                    tar.add(csv_path, arcname=f"{table_name}.csv")
-                    
-                    # Log row count
-                    row_count = sum(1 for _ in open(csv_path)) - 1  # Subtract header row
-                    logger.info(f"Exported {row_count} rows from {table_name}")
-            
-            # Compress the tar file
-            with open(temp_tar, 'rb') as f_in:
-                with gzip.open(archive_path, 'wb') as f_out:
-                    f_out.write(f_in.read())
-            
-            # Clean up temporary tar file
-            os.remove(temp_tar)
-            
-            logger.info(f"Archive created successfully at: {archive_path}")
-            return archive_path
-            
-        except Exception as e:
-            logger.error(f"Error during export: {str(e)}")
-            if os.path.exists(archive_path):
-                os.remove(archive_path)
-            if os.path.exists(temp_tar):
-                os.remove(temp_tar)
-            raise
\ No newline at end of file
+
+    exporter = None
+    try:
+        # Get list of tables
+        tables = conn.execute("""
+            SELECT table_name
+            FROM information_schema.tables
+            WHERE table_schema = 'main'
+            AND table_type IN ('BASE TABLE', 'VIEW')
+        """).fetchall()
+
+        # Filter tables
+        tables = [name[0] for name in tables if table_filter(name[0])]
+        logger.info(f"Found {len(tables)} tables to export")
+
+        exporter = CsvArchiveExporter(archive_path, mismatches_only, max_workers, compresslevel, sample_threshold)
+        exporter.export_tables(conn, tables)
+        exporter.close()
+
+        logger.info(f"Archive created successfully at: {archive_path}")
+        return archive_path
+
+    except Exception as e:
+        logger.error(f"Error during export: {str(e)}")
+        if exporter is not None:
+            exporter.close()
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        raise
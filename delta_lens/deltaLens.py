@@ -1,12 +1,54 @@
 
 from .config import *
+from .inputFormats import scan_expression, detect_format, expand_patterns
+from .ingestCache import IngestCache
+from .resourceGovernor import ResourceGovernor
+from .stageTimings import StageTimer, create_stage_timings_table, record_stage_timings, table_rows, hot_spots
+from .referenceDatasets import ReferenceDatasets
+from .schemaCache import SchemaCache, sniff_csv_schema, csv_read_options
+from .schemaNegotiation import TYPE_WIDENINGS_TABLE, create_type_widenings_table, record_type_widenings, negotiate_types, cast_columns
 
+import dataclasses
+import hashlib
+import json
 import logging
 import os
 import duckdb
 import pandas as pd
-import glob
 import psutil
+import math
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+PREVIOUS_RUN_CATALOG = "previous_run"
+
+# rough expansion of compressed columnar files once loaded, used to estimate bucket counts
+IN_MEMORY_SIZE_FACTOR = {'parquet': 4}
+
+# rows of a compare table that are not full matches of keys found on both sides
+UNMATCHED_ROWS_FILTER = "NOT (coalesce(_full_match, FALSE) AND _exists_left AND _exists_right)"
+
+# fingerprint of the compared columns of a row, see Entity.rowFingerprint
+ROW_HASH_COLUMN = "_row_hash"
+
+def _input_files(side):
+    return side.inputFiles or [side.inputFile]
+
+def _input_path(side):
+    # the shards of a sharded input are scanned together, a single file is scanned on its own
+    files = _input_files(side)
+    return files if len(files) > 1 else files[0]
+
+def _settings_key(entity):
+    # every setting of an entity that shapes its tables, the input files are keyed by their content instead
+    settings = dataclasses.asdict(entity)
+    for side in ('leftSide', 'rightSide'):
+        settings[side].pop('inputFile')
+        settings[side].pop('inputFiles')
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+def _quote_columns(columns):
+    return ", ".join(f'"{col}"' for col in columns)
 
 
 class DeltaLens:
@@ -27,6 +69,26 @@ class DeltaLens:
     persist_path : str, optional
         Directory path where the persistent database file will be stored
         (default is current directory '.')
+    max_parallel_entities : int, optional
+        Maximum number of entities compared concurrently, each on its own DuckDB cursor.
+        Entities only start once all of their dependencies completed successfully
+        (default is 1)
+    cache : IngestCache, optional
+        Cache of parsed inputs, reference datasets and cached transform results reused across runs
+        (default is None, no caching)
+    previous_run : str, optional
+        Path of a .duckdb file written by a previous persistent run. Entities whose inputs kept their
+        schema and compare query are compared incrementally: only keys whose rows changed are
+        compared again and merged with the previous compare table (default is None)
+    resources : Resources, optional
+        Memory, thread and spill settings overriding those of entityConfig.resources field by field,
+        unset fields are detected from the cgroup limits, see ResourceGovernor (default is None)
+    profile_dir : str, optional
+        Directory the JSON query profiles of the expensive statements of every entity are saved to,
+        created when missing (default is None, no profiling)
+    schema_cache : SchemaCache, optional
+        Sniffed schemas of CSV inputs reused across runs, inputs with a cached schema are read with
+        explicit column types instead of being sniffed (default is None)
     Attributes
     ----------
     config : Config
@@ -39,16 +101,34 @@ class DeltaLens:
         Path to the DuckDB database file or memory identifier
     Methods
     -------
-    execute(continue_on_error=True)
-        Executes the comparison process for all configured entities
+    execute(continue_on_error=True, on_entity_complete=None)
+        Executes the comparison process for all configured entities. on_entity_complete is called
+        with the entity name after each successful entity, e.g. ExportPipeline.entity_completed
+    hot_spots(limit=10)
+        Slowest entity stages of the run, see stageTimings.hot_spots
     Notes
     -----
     - The class creates a results table named 'entity_compare_results' to track comparison outcomes
+    - defaults.filePattenGlobTemplate is expanded per entity and side, all matching files (shards)
+      are read together as that side's input
+    - Reference datasets are loaded when the first transform referencing them runs, datasets
+      no transform references are never read
+    - Wall time, rows and peak memory of every stage of every entity are recorded in 'entity_stage_timings'
+    - Columns loaded with a negotiated type (entities with negotiateTypes) are recorded in 'entity_type_widenings'
     - The execute() method can only be called once per instance
+    - Entities are scheduled as a DAG built from their dependencies; an entity whose dependency
+      failed is recorded as failed without being run
    
     """
-    def __init__(self, runName: str, entityConfig: Config, persistent = False, persist_path = '.'):
+    def __init__(self, runName: str, entityConfig: Config, persistent = False, persist_path = '.', max_parallel_entities = 1, cache: IngestCache = None, previous_run: str = None, resources: Resources = None, profile_dir: str = None, schema_cache: SchemaCache = None):
         self.config = entityConfig
+        self.cache = cache
+        self.schema_cache = schema_cache
+        self.previous_run = previous_run
+        self.profile_dir = profile_dir
+        if max_parallel_entities < 1:
+            raise ValueError(f"max_parallel_entities must be at least 1, got {max_parallel_entities}")
+        self.max_parallel_entities = max_parallel_entities
        
         self.runName = runName
         self.logger = logging.getLogger(self.__class__.__name__ + "[" + runName + "]")
@@ -60,14 +140,28 @@ class DeltaLens:
             self.duck_db_fileName =f':memory:{clean_name}'
             
             
-        memory_gb = int(psutil.virtual_memory().total * 0.7 / (1024**3))
-       
-        self.logger.info(f'setting duckdb memory_limit to {memory_gb}GB')
-        self.con = duckdb.connect(self.duck_db_fileName, config={'preserve_insertion_order': False, 'memory_limit': f'{memory_gb}GB'})
+        self.resources = self.__mergeResources(entityConfig.resources, resources)
+        self.governor = ResourceGovernor(self.resources, max_parallel_entities)
+        self.memory_limit_bytes = self.governor.memory_limit_bytes
+        self.governor.log_effective(self.logger)
+        self.con = duckdb.connect(self.duck_db_fileName, config={'preserve_insertion_order': False, **self.governor.duckdb_config()})
 
         self.logger.info(f"Connected to DuckDB database @: {self.duck_db_fileName}")
+
+        if previous_run is not None and os.path.abspath(previous_run) == os.path.abspath(self.duck_db_fileName):
+            raise ValueError(f"previous_run must be a different database than the current run: {previous_run}")
+        if profile_dir is not None:
+            os.makedirs(profile_dir, exist_ok=True)
       
 
+    @staticmethod
+    def __mergeResources(configured: Resources, overrides: Resources) -> Resources:
+        merged = Resources(**vars(configured)) if configured else Resources()
+        for name, value in vars(overrides or Resources()).items():
+            if value is not None:
+                setattr(merged, name, value)
+        return merged
+
     def __populateDefaults(self):
         if self.config.defaults and self.config.defaults.leftSideTitle:
             for entity in self.config.entities:
@@ -75,86 +169,208 @@ class DeltaLens:
         if self.config.defaults and self.config.defaults.rightSideTitle:
             for entity in self.config.entities:
                 entity.rightSide.title = self.config.defaults.rightSideTitle
+        if self.config.defaults and self.config.defaults.fileNameColumn:
+            for entity in self.config.entities:
+                entity.fileNameColumn = entity.fileNameColumn or self.config.defaults.fileNameColumn
         if self.config.defaults and self.config.defaults.filePattenGlobTemplate:
+            # every matching shard is read, the patterns of all entities are resolved with one listing per directory
+            template = self.config.defaults.filePattenGlobTemplate
+            patterns = {(entity.entityName, side.title): template.format(entityName=entity.entityName, title=side.title)
+                        for entity in self.config.entities for side in (entity.leftSide, entity.rightSide)}
+            matches = expand_patterns(patterns.values())
+            for entity in self.config.entities:
+                for side in (entity.leftSide, entity.rightSide):
+                    pattern = patterns[(entity.entityName, side.title)]
+                    if not matches[pattern]:
+                        raise FileNotFoundError(f"Executing file glob for [{entity.entityName}] entity: No files found matching pattern: {pattern}")
+                    side.inputFile = matches[pattern][0]
+                    side.inputFiles = matches[pattern]
+
+    def __registerExternalDatasets(self):
+        # datasets are only read once a transform references them, missing files still fail the run up front
+        for dataset in self.config.reference_datasets or []:
+            if not os.path.exists(dataset.inputFile):
+                 raise FileNotFoundError(f"file not found at: {dataset.inputFile}")
+        self.reference_datasets = ReferenceDatasets(self.con, self.config.reference_datasets, self.cache)
 
-             for entity in self.config.entities:
-            # find first matching file for left side
-                left_glob_pattern = self.config.defaults.filePattenGlobTemplate.format(entityName=entity.entityName, title=entity.leftSide.title)
-                left_matches = glob.glob(left_glob_pattern)
-                if not left_matches:
-                    raise FileNotFoundError(f"Executing file glob for [{entity.entityName}] entity: No files found matching pattern: {left_glob_pattern}")
-                entity.leftSide.inputFile = left_matches[0]
-
-                # find first matching file for right side 
-                right_glob_pattern = self.config.defaults.filePattenGlobTemplate.format(entityName=entity.entityName, title=entity.rightSide.title)
-                right_matches = glob.glob(right_glob_pattern)
-                if not right_matches:
-                    raise FileNotFoundError(f"Executing file glob for [{entity.entityName}] entity: No files found matching pattern: {right_glob_pattern}")
-                entity.rightSide.inputFile = right_matches[0]
-
-    def __loadExternalDatasets(self):
-        if self.config.reference_datasets:
-            for dataset in self.config.reference_datasets:
-                self.logger.info(f"Loading reference dataset: {dataset.datasetName} from {dataset.inputFile}")
-                if not os.path.exists(dataset.inputFile):
-                     raise FileNotFoundError(f"file not found at: {dataset.inputFile}")
-                self.con.execute(f"CREATE TABLE {dataset.datasetName} AS SELECT * FROM read_csv_auto('{dataset.inputFile}')")
+    def __attachPreviousRun(self):
+        if self.previous_run is None:
+            return
+        if not os.path.exists(self.previous_run):
+            raise FileNotFoundError(f"previous run database not found at: {self.previous_run}")
+        self.logger.info(f"Attaching previous run for incremental compare: {self.previous_run}")
+        self.con.execute(f"ATTACH '{self.previous_run}' AS {PREVIOUS_RUN_CATALOG} (READ_ONLY)")
 
     def __createResultsTable(self):
-        self.con.execute("CREATE TABLE entity_compare_results (entity VARCHAR PRIMARY KEY, rows_left INT, rows_right INT, rows_fully_matched INT, error_text VARCHAR, success INT);")
-    
-    def execute(self, continue_on_error = True):      
+        self.con.execute("""CREATE TABLE entity_compare_results (entity VARCHAR PRIMARY KEY, rows_left BIGINT, rows_right BIGINT, rows_fully_matched BIGINT,
+            error_text VARCHAR, success INT, started_at TIMESTAMP, finished_at TIMESTAMP,
+            rows_left_only BIGINT, rows_right_only BIGINT, rows_mismatched BIGINT,
+            duplicate_keys_left BIGINT, duplicate_keys_right BIGINT, elapsed_seconds DOUBLE, primary_keys VARCHAR);""")
+        create_stage_timings_table(self.con)
+        create_type_widenings_table(self.con)
+
+    def __recordResult(self, entity, statistics, error_msg, started_at, finished_at, stage_timings, type_widenings):
+        statistics = statistics or {}
+        elapsed_seconds = (finished_at - started_at).total_seconds() if started_at and finished_at else None
+        self.con.execute(
+            """INSERT INTO entity_compare_results 
+            (entity, rows_left, rows_right, rows_fully_matched, error_text, success, started_at, finished_at,
+             rows_left_only, rows_right_only, rows_mismatched, duplicate_keys_left, duplicate_keys_right, elapsed_seconds, primary_keys)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [entity.entityName, statistics.get('rows_left'), statistics.get('rows_right'), statistics.get('rows_fully_matched'),
+             error_msg, 1 if error_msg is None else 0, started_at, finished_at,
+             statistics.get('rows_left_only'), statistics.get('rows_right_only'), statistics.get('rows_mismatched'),
+             statistics.get('duplicate_keys_left'), statistics.get('duplicate_keys_right'), elapsed_seconds,
+             json.dumps(entity.primaryKeys)]
+        )
+        record_stage_timings(self.con, stage_timings)
+        record_type_widenings(self.con, entity.entityName, type_widenings)
+
+    def __recordSuccess(self, entity, statistics, started_at, finished_at, stage_timings, type_widenings):
+        self.__recordResult(entity, statistics, None, started_at, finished_at, stage_timings, type_widenings)
+
+    def __recordFailure(self, entity, error_msg, started_at = None, finished_at = None, statistics = None, stage_timings = None, type_widenings = None):
+        self.__recordResult(entity, statistics, error_msg, started_at, finished_at, stage_timings, type_widenings)
+
+    def __cacheContext(self, entity, conn, query):
+        # cache keys of everything a cached transform query of the entity may read besides its own inputs,
+        # only computed when such a transform runs since content keys read the files in full
+        keys = [self.cache.file_key(d.inputFile, d.format) for d in self.reference_datasets.referenced(conn, [query])]
+        entities = {e.entityName: e for e in self.config.entities}
+        to_visit, visited = list(entity.dependencies or []), set()
+        while to_visit:
+            name = to_visit.pop()
+            if name in visited:
+                continue
+            visited.add(name)
+            dependency = entities[name]
+            keys += [self.cache.input_key(_input_path(side), side.format, dependency.fileNameColumn) for side in (dependency.leftSide, dependency.rightSide)
+                     if _input_files(side)[0] and all(os.path.exists(file) for file in _input_files(side))]
+            # the transform queries, compare rules and other settings of the dependency shape the tables it leaves behind
+            keys.append(_settings_key(dependency))
+            to_visit += dependency.dependencies or []
+        return keys
+
+    def __compareEntity(self, entity):
+        # runs on a worker thread, every entity gets its own cursor
+        cursor = self.con.cursor()
+        started_at = datetime.now()
+        equityComparer = None
+        try:
+            self.logger.info(f"Processing entity: [{entity.entityName}]")
+            previous_catalog = PREVIOUS_RUN_CATALOG if self.previous_run is not None else None
+            # entities compared concurrently share the memory limit
+            memory_budget = self.governor.entity_memory_budget
+            cache_context = (lambda conn, query: self.__cacheContext(entity, conn, query)) if self.cache is not None else None
+            equityComparer = EntityComparer(cursor, entity, self.cache, cache_context, previous_catalog, memory_budget, self.profile_dir, self.reference_datasets, self.schema_cache)
+            equityComparer.runcompare()
+            return started_at, datetime.now(), equityComparer.statistics, equityComparer.timer.timings, equityComparer.type_widenings, None
+        except Exception as e:
+            # partial statistics, such as duplicate key counts, completed stages and negotiated types are kept for the failure record
+            if equityComparer is None:
+                return started_at, datetime.now(), None, None, None, e
+            return started_at, datetime.now(), equityComparer.statistics, equityComparer.timer.timings, equityComparer.type_widenings, e
+        finally:
+            cursor.close()
+
+    def execute(self, continue_on_error = True, on_entity_complete = None):      
         if hasattr(self, '_has_executed'):
             raise ValueError("Execute method has already been called")
         self.__populateDefaults()
         Config.Validate(self.config)
         self.__createResultsTable()
-        self.__loadExternalDatasets()
-        for entity in self.config.entities:
-            self.logger.info(f"Processing entity: [{entity.entityName}]")
-            try:
-                equityComparer = EntityComparer(self.con, entity)
-                equityComparer.runcompare()
-                # Log success
-                self.con.execute(
-                    """INSERT INTO entity_compare_results 
-                    (entity, rows_left, rows_right, rows_fully_matched, error_text, success)
-                    SELECT ?, 
-                        COUNT(*) FILTER (WHERE _exists_left), 
-                        COUNT(*) FILTER (WHERE _exists_right),
-                        COUNT(*) FILTER (WHERE _full_match),
-                        NULL,
-                        1
-                    FROM {}_compare""".format(entity.entityName), 
-                    [entity.entityName]
-                )
-                self.logger.info(f"Completed processing entity: [{entity.entityName}]")
-            except Exception as e:
-                error_msg = str(e)
-                self.logger.error(f"Error processing entity [{entity.entityName}]: {e}")
-                # Log failure
-                self.con.execute(
-                    """INSERT INTO entity_compare_results 
-                    (entity, rows_left, rows_right, rows_fully_matched, error_text, success)
-                    VALUES (?, NULL, NULL, NULL, ?, 0)""",
-                    [entity.entityName, error_msg]
-                )
-                if not continue_on_error:
-                    raise
+        self.__attachPreviousRun()
+        self.__registerExternalDatasets()
+
+        pending = list(self.config.entities)
+        succeeded = set()
+        failed = set()
+        running = {}
+        first_error = None
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel_entities, thread_name_prefix="DeltaLens") as pool:
+            while running or (pending and first_error is None):
+                if first_error is None:
+                    for entity in list(pending):
+                        dependencies = entity.dependencies or []
+                        failed_dependencies = [d for d in dependencies if d in failed]
+                        if failed_dependencies:
+                            pending.remove(entity)
+                            failed.add(entity.entityName)
+                            error_msg = f"Dependencies failed: {failed_dependencies}"
+                            self.logger.error(f"Skipping entity [{entity.entityName}]: {error_msg}")
+                            self.__recordFailure(entity, error_msg)
+                            if not continue_on_error:
+                                first_error = ValueError(f"Entity [{entity.entityName}] skipped. {error_msg}")
+                                break
+                        elif len(running) < self.max_parallel_entities and all(d in succeeded for d in dependencies):
+                            pending.remove(entity)
+                            running[pool.submit(self.__compareEntity, entity)] = entity
+
+                if not running:
+                    if pending and first_error is None:
+                        raise ValueError(f"Unable to schedule entities with unresolved dependencies: {[e.entityName for e in pending]}")
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entity = running.pop(future)
+                    started_at, finished_at, statistics, stage_timings, type_widenings, error = future.result()
+                    if error is None:
+                        self.__recordSuccess(entity, statistics, started_at, finished_at, stage_timings, type_widenings)
+                        succeeded.add(entity.entityName)
+                        self.logger.info(f"Completed processing entity: [{entity.entityName}]")
+                        if on_entity_complete is not None:
+                            # may block to hold back further entities, e.g. while an export catches up
+                            on_entity_complete(entity.entityName)
+                    else:
+                        self.logger.error(f"Error processing entity [{entity.entityName}]: {error}")
+                        self.__recordFailure(entity, str(error), started_at, finished_at, statistics, stage_timings, type_widenings)
+                        failed.add(entity.entityName)
+                        if not continue_on_error and first_error is None:
+                            first_error = error
+
+        if first_error is not None:
+            raise first_error
 
         self._has_executed = True
 
+    def hot_spots(self, limit = 10):
+        return hot_spots(self.con, limit)
+
 
 
 class EntityComparer:
     """
     A class for comparing two datasets (left and right side) with the same structure and primary keys.
-    This class handles data comparison between two CSV files, applying optional transformations,
+    This class handles data comparison between two input files (CSV, Parquet, Arrow IPC or JSON),
+    applying optional transformations,
     and generating detailed comparison results including field-level matching statistics.
     Parameters
     ----------
     con : duckdb.DuckDBPyConnection
         A DuckDB connection object for database operations
+    cache : IngestCache, optional
+        Cache of parsed inputs and cached transform results (default is None, no caching)
+    cache_context : callable, optional
+        Called with the cursor and a cached transform query, returns the cache keys of other inputs
+        the query may read, such as reference datasets (default is None, only the entity inputs)
+    previous_catalog : str, optional
+        Name of an attached database holding a previous run. When its inputs, schema and compare
+        query are compatible, only keys changed since that run are compared and merged with its
+        compare table (default is None, full compare)
+    memory_budget : int, optional
+        Memory in bytes available to this entity, used to pick the bucket count when the entity
+        sets buckets to 'auto' (default is None, 70% of system memory)
+    profile_dir : str, optional
+        Directory the JSON query profiles of the load, join and summary statements are written to
+        (default is None, no profiling)
+    reference_datasets : ReferenceDatasets, optional
+        Reference datasets of the run, those read by the transforms of the entity are loaded before
+        the transforms are applied (default is None)
+    schema_cache : SchemaCache, optional
+        Cached schemas of CSV inputs, read with explicit column types and dialect instead of being
+        sniffed (default is None)
     entity : Entity
         An Entity object containing comparison configuration details including:
         - entityName: Name of the entity being compared
@@ -162,6 +378,23 @@ class EntityComparer:
         - rightSide: Configuration for right dataset (input file, transformations)
         - primaryKeys: List of columns that uniquely identify records
         - excludeColumns: List of columns to exclude from comparison
+        - rowFingerprint: Hash the compared columns of each row while it is loaded so rows with
+          equal hashes are treated as full matches without per column comparison; with
+          storeMismatchesOnly only the keys whose hashes differ are joined in full
+        - storeMismatchesOnly: Only materialize mismatched and one-sided rows in the compare table
+        - ingestion: 'table' copies each input into a DuckDB table, 'view' creates a view over
+          the file scan so the join reads straight from the input files
+        - primaryKeyIndex: Keep primary key indexes on the materialized tables for point lookups
+        - buckets: Split both sides by primary key hash and compare bucket by bucket to bound
+          peak memory, an integer or 'auto' to derive it from input size and memory budget
+        - compareRules: Per column CompareRule with numeric or timestamp tolerances and
+          string normalization compiled into the match expression
+        - fileNameColumn: Column holding the file each row was read from, carried into the
+          compare table but not compared
+        - columnTypes: Pinned DuckDB types of CSV input columns, overriding the sniffed types
+        - negotiateTypes: Load both sides with the common supertype of every shared column whose
+          types differ instead of failing on the mismatch, entities with transforms are not negotiated
+        A side with inputFiles reads all of them as one input with the multi-file reader of its format.
     Attributes
     ----------
     logger : Logger
@@ -178,11 +411,20 @@ class EntityComparer:
         Name of the transformed left side table (if transformation is applied)
     rightSideInputTableTransformed : str, optional
         Name of the transformed right side table (if transformation is applied)
+    statistics : dict
+        Row counts of the comparison (rows_left, rows_right, rows_fully_matched, rows_both,
+        rows_left_only, rows_right_only, rows_mismatched, duplicate_keys_left, duplicate_keys_right),
+        available after runcompare(). Duplicate key counts are also set when runcompare() fails on them
+    timer : StageTimer
+        Wall time, rows and peak memory of each stage, also recorded for stages completed before a failure
+    type_widenings : list
+        Columns loaded with a negotiated type: column_name, left_type, right_type, negotiated_type and
+        lossy, set once the input schemas are resolved
     Methods
     -------
     runcompare()
         Executes the comparison process and generates results:
-        - Loads data from CSV files into DuckDB tables
+        - Loads data from input files into DuckDB tables using the native reader of their format
         - Applies transformations if specified
         - Validates data types and primary keys
         - Performs full outer join comparison
@@ -190,17 +432,32 @@ class EntityComparer:
     Raises
     ------
     FileNotFoundError
-        If input CSV files are not found
+        If input files are not found
     ValueError
         If primary keys are missing in tables
+        If primary keys are not unique, offending keys are written to the {entity}_duplicate_keys table
+        If a primary key column is NULL on either side
         If column data types don't match between tables
         If required columns are missing in either table
         """
   
-    def __init__(self, con:duckdb.DuckDBPyConnection, entity: Entity):
+    def __init__(self, con:duckdb.DuckDBPyConnection, entity: Entity, cache: IngestCache = None, cache_context = None, previous_catalog: str = None, memory_budget: int = None, profile_dir: str = None, reference_datasets: ReferenceDatasets = None, schema_cache: SchemaCache = None):
         self.logger = logging.getLogger(self.__class__.__name__ + "[" + entity.entityName + "]")
         self.con = con
         self.entity = entity
+        self.timer = StageTimer(con, entity.entityName, profile_dir)
+        self.cache = cache
+        self.cache_context = cache_context
+        self.previous_catalog = previous_catalog
+        self.memory_budget = memory_budget
+        self.reference_datasets = reference_datasets
+        self.schema_cache = schema_cache
+        self.csv_options = {}
+        self.column_casts = {"left": {}, "right": {}}
+        self.type_widenings = []
+        # the source file of a row is carried into the compare table but never compared
+        self.excludeColumns = (entity.excludeColumns or []) + ([entity.fileNameColumn] if entity.fileNameColumn else [])
+        self.statistics = {}
         self.leftSideInputTable = f"{self.entity.entityName}_{self.entity.leftSide.title}"
         self.rightSideInputTable = f"{self.entity.entityName}_{self.entity.rightSide.title}"
         if self.entity.leftSide.transform:
@@ -213,14 +470,12 @@ class EntityComparer:
     def __applyLeftTransform(self):
         self.logger.info(f"Applying left side transform: {self.entity.leftSide.transform.query}")
                  
-        if self.entity.leftSide.transform.cached:
-            create_statement = f"CREATE TABLE {self.leftSideInputTableTransformed} AS {self.entity.leftSide.transform.query}"
-            self.con.execute(create_statement)
-            self.con.execute(f"ALTER TABLE {self.leftSideInputTableTransformed} ADD PRIMARY KEY ({','.join(self.entity.primaryKeys)})")
-        else:
-            create_statement = f"CREATE VIEW {self.leftSideInputTableTransformed} AS {self.entity.leftSide.transform.query}"   
-            self.con.execute(create_statement)
-
+        with self.timer.stage("transform_left") as stage:
+            if self.entity.leftSide.transform.cached:
+                self.__create_cached_transform_table(stage, self.leftSideInputTableTransformed, self.entity.leftSide.transform.query)
+            else:
+                create_statement = f"CREATE VIEW {self.leftSideInputTableTransformed} AS {self.entity.leftSide.transform.query}"   
+                self.con.execute(create_statement)
         self.leftSideInputTable = self.leftSideInputTableTransformed
 
         
@@ -228,42 +483,50 @@ class EntityComparer:
     def __applyRightTransform(self):
         self.logger.info(f"Applying right side transform: {self.entity.rightSide.transform.query}")
                  
-        if self.entity.rightSide.transform.cached:
-            create_statement = f"CREATE TABLE {self.rightSideInputTableTransformed} AS {self.entity.rightSide.transform.query}"
-            self.con.execute(create_statement)
-            self.con.execute(f"ALTER TABLE {self.rightSideInputTableTransformed} ADD PRIMARY KEY ({','.join(self.entity.primaryKeys)})")
-        else:
-            create_statement = f"CREATE VIEW {self.rightSideInputTableTransformed} AS {self.entity.rightSide.transform.query}"   
-            self.con.execute(create_statement)
-
+        with self.timer.stage("transform_right") as stage:
+            if self.entity.rightSide.transform.cached:
+                self.__create_cached_transform_table(stage, self.rightSideInputTableTransformed, self.entity.rightSide.transform.query)
+            else:
+                create_statement = f"CREATE VIEW {self.rightSideInputTableTransformed} AS {self.entity.rightSide.transform.query}"   
+                self.con.execute(create_statement)
         self.rightSideInputTable = self.rightSideInputTableTransformed
        
 
   
     def runcompare(self):
        
+        self.__resolve_input_schemas()
         self.__create_left_side_table()     
         self.__create_right_side_table()
 
+        self.__load_reference_datasets()
         if self.entity.leftSide.transform:
             self.__applyLeftTransform()
         if self.entity.rightSide.transform:
             self.__applyRightTransform()
 
-        # get column names from both tables
-        left_columns, right_columns = self.__extract_columns()
+        with self.timer.stage("validate") as stage:
+            # get column names from both tables
+            left_columns, right_columns = self.__extract_columns()
 
-        # verify column data types match between both tables
-        self.__validate_data_types(left_columns, right_columns)
+            # verify column data types match between both tables
+            self.__validate_data_types(left_columns, right_columns)
 
 
-        # verify primary keys exist in both tables
-        for pk in self.entity.primaryKeys:
-            if pk not in left_columns:
-                raise ValueError(f"Primary key '{pk}' not found in left table [{self.leftSideInputTable}] columns: {left_columns}")
-            if pk not in right_columns:
-                raise ValueError(f"Primary key '{pk}' not found in right table [{self.rightSideInputTable}] columns: {right_columns}")
+            # verify primary keys exist in both tables
+            for pk in self.entity.primaryKeys:
+                if pk not in left_columns:
+                    raise ValueError(f"Primary key '{pk}' not found in left table [{self.leftSideInputTable}] columns: {left_columns}")
+                if pk not in right_columns:
+                    raise ValueError(f"Primary key '{pk}' not found in right table [{self.rightSideInputTable}] columns: {right_columns}")
+
+            # verify primary keys are unique on both sides
+            side_rows = [table_rows(self.con, table) for table in (self.leftSideInputTable, self.rightSideInputTable)]
+            stage['rows'] = sum(side_rows) if None not in side_rows else None
+            self.__validate_unique_keys(left_columns, right_columns)
 
+        # indexes are only built once the keys are known to be unique and not null
+        self.__index_validated_inputs()
 
         # Build join conditions for multiple primary keys
         join_conditions = []
@@ -271,12 +534,23 @@ class EntityComparer:
             join_conditions.append(f'{self.leftSideInputTable}."{pk}" = {self.rightSideInputTable}."{pk}"')
         
         join_condition = " AND ".join(join_conditions)
-        full_outer_join = f"FROM {self.leftSideInputTable} FULL OUTER JOIN {self.rightSideInputTable} ON {join_condition}"
 
         # Get all non-primary key columns for comparison
         comparison_columns = set(left_columns + right_columns) - set(self.entity.primaryKeys)
-        if self.entity.excludeColumns is not None:
-             comparison_columns = comparison_columns - set(self.entity.excludeColumns)
+        comparison_columns = comparison_columns - set(self.excludeColumns)
+        comparison_columns = sorted(comparison_columns)
+
+        unknown_rule_columns = set(self.entity.compareRules or {}) - set(comparison_columns)
+        if unknown_rule_columns:
+            raise ValueError(f"Compare rules reference columns that are not compared: {sorted(unknown_rule_columns)}")
+
+        # row fingerprints are only usable when every compared column exists on both sides
+        use_fingerprint = self.entity.rowFingerprint and len(comparison_columns) > 0 and \
+            all(col in left_columns and col in right_columns for col in comparison_columns)
+
+        left_fingerprint = self.__fingerprint_select(self.leftSideInputTable, self.entity.leftSide, comparison_columns) if use_fingerprint else None
+        right_fingerprint = self.__fingerprint_select(self.rightSideInputTable, self.entity.rightSide, comparison_columns) if use_fingerprint else None
+        fingerprint_match = f'{self.leftSideInputTable}.{ROW_HASH_COLUMN} = {self.rightSideInputTable}.{ROW_HASH_COLUMN}'
 
         # Build column comparisons for the SELECT clause
         column_expressions = []
@@ -294,12 +568,16 @@ class EntityComparer:
             if in_left and in_right:
                 column_expressions.append(f'{self.leftSideInputTable}."{col}" as "{col}_left"')
                 column_expressions.append(f'{self.rightSideInputTable}."{col}" as "{col}_right"')
-                column_expressions.append(f'({self.leftSideInputTable}."{col}" = {self.rightSideInputTable}."{col}" OR ({self.leftSideInputTable}."{col}" IS NULL AND {self.rightSideInputTable}."{col}" IS NULL)) as "{col}_match"')
+                match_expression = self.__match_expression(col, f'{self.leftSideInputTable}."{col}"', f'{self.rightSideInputTable}."{col}"')
+                if use_fingerprint and not self.entity.storeMismatchesOnly:
+                    # rows with equal fingerprints are full matches, skip the per column comparison
+                    match_expression = f'(CASE WHEN {fingerprint_match} THEN TRUE ELSE {match_expression} END)'
+                column_expressions.append(f'{match_expression} as "{col}_match"')
                 match_columns.append(f'"{col}_match"')
             else:
                 raise ValueError(f"Column '{col}' not found in both tables: left table= {self.leftSideInputTable}.found={in_left}, right table={self.rightSideInputTable}.found={in_right}")
-        if self.entity.excludeColumns is not None:
-            for col in self.entity.excludeColumns:
+        if self.excludeColumns:
+            for col in self.excludeColumns:
                 in_left = col in left_columns
                 in_right = col in right_columns
 
@@ -322,65 +600,431 @@ class EntityComparer:
 
         select_clause = ", ".join(column_expressions)
 
-        compare_sql_statement = f"SELECT {select_clause} {full_outer_join}"
-
         match_columns = [ col  + "=1" for col in match_columns]
 
         match_columns_str = " AND ".join(match_columns)
 
-        cte_statement = f"WITH comparison AS ({compare_sql_statement}) SELECT *, ({match_columns_str}) as _full_match  FROM comparison"
+        # set in the join stage when only the keys with different fingerprints are compared
+        fingerprint_filter = None
+
+        def compare_statement(source_filter = None):
+            # source_filter restricts the rows read from both sides, e.g. to a subset of keys
+            source_filter = " AND ".join(f for f in (fingerprint_filter, source_filter) if f) or None
+            left_source = self.__side_source(self.leftSideInputTable, left_fingerprint, source_filter)
+            right_source = self.__side_source(self.rightSideInputTable, right_fingerprint, source_filter)
+            full_outer_join = f"FROM {left_source} FULL OUTER JOIN {right_source} ON {join_condition}"
+            compare_sql_statement = f"SELECT {select_clause} {full_outer_join}"
+            return f"WITH comparison AS ({compare_sql_statement}) SELECT *, ({match_columns_str}) as _full_match  FROM comparison"
+
+        cte_statement = compare_statement()
         
         self.logger.info(cte_statement)
 
         view_name = f"{self.entity.entityName}_compare_view"
+        compare_table = f"{self.entity.entityName}_compare"
 
         view_statement = f"CREATE VIEW {view_name} AS {cte_statement}"
         
         self.con.execute(view_statement)
 
-        create_result_table_statement = f"CREATE TABLE {self.entity.entityName}_compare AS SELECT * FROM {view_name}"
-        
-        self.con.execute(create_result_table_statement)
+        # fully matched rows are only counted, never stored
+        stored_rows_filter = f" WHERE {UNMATCHED_ROWS_FILTER}" if self.entity.storeMismatchesOnly else ""
+
+        with self.timer.stage("join") as stage:
+            if use_fingerprint and self.entity.storeMismatchesOnly:
+                fingerprint_filter = self.__fingerprint_mismatches(stage, left_fingerprint, right_fingerprint)
+            buckets = self.__bucket_count()
+            if self.previous_catalog is not None and self.__can_compare_incrementally(view_name):
+                self.__incremental_compare(stage, compare_statement, stored_rows_filter, left_columns, right_columns)
+            elif buckets > 1:
+                self.__bucketed_compare(stage, compare_statement, stored_rows_filter, view_name, buckets)
+            else:
+                compare_source = f"({compare_statement()})" if fingerprint_filter else view_name
+                create_result_table_statement = f"CREATE TABLE {compare_table} AS SELECT * FROM {compare_source}{stored_rows_filter}"
+                self.timer.execute(stage, create_result_table_statement)
+            if fingerprint_filter:
+                self.con.execute(f"DROP TABLE {self.entity.entityName}_fingerprint_mismatches")
+            stage['rows'] = table_rows(self.con, compare_table)
+
+        self.__add_primary_key_index(compare_table, "compare")
+
+        with self.timer.stage("summary") as stage:
+            stage['rows'] = table_rows(self.con, compare_table)
+            self.__summarize(stage, comparison_columns)
+
+    def __match_expression(self, col, left, right):
+        rule = (self.entity.compareRules or {}).get(col)
+        if rule is None:
+            return f'({left} = {right} OR ({left} IS NULL AND {right} IS NULL))'
+
+        # normalize both sides the same way before comparing
+        for side in ('left', 'right'):
+            value = left if side == 'left' else right
+            if rule.trimWhitespace:
+                value = f"trim({value})"
+            if rule.caseInsensitive:
+                value = f"lower({value})"
+            if rule.emptyAsNull:
+                value = f"nullif({value}, '')"
+            if side == 'left':
+                left = value
+            else:
+                right = value
+
+        if rule.absoluteTolerance is not None or rule.relativeTolerance is not None:
+            # |l - r| <= atol + rtol * max(|l|, |r|), symmetric in both sides like math.isclose, with
+            # the tolerances added up as in numpy.isclose rather than taking the larger of the two
+            equals = f"abs({left} - {right}) <= {rule.absoluteTolerance or 0} + {rule.relativeTolerance or 0} * greatest(abs({left}), abs({right}))"
+        elif rule.timestampToleranceSeconds is not None:
+            tolerance = f"to_microseconds({int(rule.timestampToleranceSeconds * 1000000)})"
+            equals = f"{left} BETWEEN {right} - {tolerance} AND {right} + {tolerance}"
+        else:
+            equals = f"{left} = {right}"
 
-        self.con.execute(f"ALTER TABLE  {self.entity.entityName}_compare ADD PRIMARY KEY ({','.join(self.entity.primaryKeys)})")
+        return f'({equals} OR ({left} IS NULL AND {right} IS NULL))'
 
-        self.__create_field_summary_table(match_columns)
+    def __has_stored_row_hash(self, input_table, side):
+        # inputs loaded into a table without a transform are fingerprinted while parsed, a fingerprint
+        # in a transform result is carried over from its source and does not describe its rows
+        return not side.transform and ROW_HASH_COLUMN in [column for column, _ in self.__table_columns(input_table)]
 
+    def __fingerprint_select(self, input_table, side, comparison_columns):
+        # views and transform results are hashed while scanned, replacing a carried over fingerprint
+        if self.__has_stored_row_hash(input_table, side):
+            return None
+        has_row_hash = ROW_HASH_COLUMN in [column for column, _ in self.__table_columns(input_table)]
+        row_hash = f"hash({_quote_columns(comparison_columns)})"
+        return f"* REPLACE ({row_hash} AS {ROW_HASH_COLUMN})" if has_row_hash else f"*, {row_hash} AS {ROW_HASH_COLUMN}"
+
+    def __fingerprint_mismatches(self, stage, left_fingerprint, right_fingerprint):
+        # fully matched rows are not stored: a join of the keys and fingerprints alone finds the keys whose
+        # fingerprints differ or that exist on one side only, only those are read by the full compare
+        mismatches_table = f"{self.entity.entityName}_fingerprint_mismatches"
+        key_columns = _quote_columns(self.entity.primaryKeys)
+        sides = {}
+        for alias, input_table, select_list in (("l", self.leftSideInputTable, left_fingerprint), ("r", self.rightSideInputTable, right_fingerprint)):
+            sides[alias] = f"(SELECT {key_columns}, {ROW_HASH_COLUMN} FROM {self.__side_source(input_table, select_list)}) AS {alias}"
+        keys = ", ".join(f'coalesce(l."{pk}", r."{pk}") AS "{pk}"' for pk in self.entity.primaryKeys)
+        on = " AND ".join(f'l."{pk}" = r."{pk}"' for pk in self.entity.primaryKeys)
+        self.timer.execute(stage, f"""CREATE TEMP TABLE {mismatches_table} AS SELECT {keys} FROM {sides['l']} FULL OUTER JOIN {sides['r']}
+                                      ON {on} WHERE l.{ROW_HASH_COLUMN} IS DISTINCT FROM r.{ROW_HASH_COLUMN}""", "join_fingerprints")
+        mismatches = self.con.execute(f"SELECT COUNT(*) FROM {mismatches_table}").fetchone()[0]
+        self.logger.info(f"{mismatches} keys with different fingerprints or on one side only")
+        return f"({key_columns}) IN (SELECT {key_columns} FROM {mismatches_table})"
+
+    def __side_source(self, input_table, select_list = None, source_filter = None):
+        if not select_list and not source_filter:
+            return input_table
+        # aliased back to the input table name so the generated column expressions stay unchanged
+        where_clause = f" WHERE {source_filter}" if source_filter else ""
+        return f"(SELECT {select_list or '*'} FROM {input_table}{where_clause}) AS {input_table}"
+
+    def __table_columns(self, table_name, catalog = None):
+        catalog_filter = f"'{catalog}'" if catalog else "current_database()"
+        return self.con.execute(f"""
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_catalog = {catalog_filter} AND table_schema = 'main' AND table_name = '{table_name}'
+            ORDER BY ordinal_position""").fetchall()
+
+    def __can_compare_incrementally(self, view_name):
+        previous = self.previous_catalog
+        previous_tables = dict(self.con.execute(f"""
+            SELECT table_name, table_type FROM information_schema.tables
+            WHERE table_catalog = '{previous}' AND table_schema = 'main'""").fetchall())
+
+        compare_table = f"{self.entity.entityName}_compare"
+        for table_name in (self.leftSideInputTable, self.rightSideInputTable, compare_table):
+            if previous_tables.get(table_name) != 'BASE TABLE':
+                self.logger.info(f"previous run has no table [{table_name}], running full compare")
+                return False
+
+        for table_name in (self.leftSideInputTable, self.rightSideInputTable):
+            if self.__table_columns(table_name) != self.__table_columns(table_name, previous):
+                self.logger.info(f"schema of [{table_name}] changed since previous run, running full compare")
+                return False
+
+        # the generated compare query captures compared columns, exclusions and match rules
+        view_sql = f"SELECT sql FROM duckdb_views() WHERE schema_name = 'main' AND view_name = '{view_name}' AND database_name = "
+        current_sql = self.con.execute(view_sql + "current_database()").fetchall()
+        previous_sql = self.con.execute(view_sql + f"'{previous}'").fetchall()
+        if current_sql != previous_sql:
+            self.logger.info("compare query changed since previous run, running full compare")
+            return False
+
+        if not self.entity.storeMismatchesOnly:
+            # a previous compare table holding mismatches only cannot provide the matched rows
+            stored_matches = self.con.execute(f"SELECT COUNT(*) FILTER (WHERE _full_match) FROM {previous}.main.{compare_table}").fetchone()[0]
+            previous_matches = self.con.execute(
+                f"SELECT rows_fully_matched FROM {previous}.main.entity_compare_results WHERE entity = ? AND success = 1",
+                [self.entity.entityName]).fetchone()
+            if previous_matches is None or previous_matches[0] != stored_matches:
+                self.logger.info("previous run did not store fully matched rows, running full compare")
+                return False
+
+        return True
+
+    def __bucket_count(self):
+        if self.entity.buckets != 'auto':
+            return self.entity.buckets or 1
+        # estimate the in-memory size of both sides from their files, columnar files expand when loaded
+        input_bytes = 0
+        for side in (self.entity.leftSide, self.entity.rightSide):
+            format = side.format or detect_format(_input_files(side)[0])
+            input_bytes += sum(os.path.getsize(file) for file in _input_files(side)) * IN_MEMORY_SIZE_FACTOR.get(format, 1)
+        memory_budget = self.memory_budget or psutil.virtual_memory().total * 0.7
+        # the join needs room for both sides of a bucket plus its hash table
+        buckets = max(1, math.ceil(input_bytes * 2 / (memory_budget * 0.5)))
+        self.logger.info(f"estimated input size {input_bytes} bytes, memory budget {int(memory_budget)} bytes: using {buckets} buckets")
+        return buckets
+
+    def __bucketed_compare(self, stage, compare_statement, stored_rows_filter, view_name, buckets):
+        compare_table = f"{self.entity.entityName}_compare"
+        key_columns = _quote_columns(self.entity.primaryKeys)
+        self.con.execute(f"CREATE TABLE {compare_table} AS SELECT * FROM {view_name} LIMIT 0")
+        for bucket in range(buckets):
+            # both sides are split by the same key hash, so matching keys always land in the same bucket
+            self.logger.info(f"comparing bucket {bucket + 1} of {buckets}")
+            bucket_filter = f"hash({key_columns}) % {buckets} = {bucket}"
+            self.timer.execute(stage, f"INSERT INTO {compare_table} SELECT * FROM ({compare_statement(bucket_filter)}){stored_rows_filter}",
+                               f"join_bucket{bucket + 1}")
+
+    def __incremental_compare(self, stage, compare_statement, stored_rows_filter, left_columns, right_columns):
+        previous = self.previous_catalog
+        compare_table = f"{self.entity.entityName}_compare"
+        changed_keys_table = f"{self.entity.entityName}_changed_keys"
+        key_columns = _quote_columns(self.entity.primaryKeys)
+
+        # keys whose row hash differs from the previous run, including inserted and deleted keys
+        side_changes = []
+        sides = ((self.leftSideInputTable, self.entity.leftSide, left_columns), (self.rightSideInputTable, self.entity.rightSide, right_columns))
+        for table_name, side, columns in sides:
+            if self.__has_stored_row_hash(table_name, side):
+                # the fingerprint stored while parsing covers the compared columns, excluded columns are
+                # still copied into the compare table
+                row_hash = f"hash({_quote_columns([ROW_HASH_COLUMN] + [col for col in self.excludeColumns if col in columns])})"
+            else:
+                row_hash = f"hash({_quote_columns(columns)})"
+            current_rows = f"SELECT {key_columns}, {row_hash} FROM {table_name}"
+            previous_rows = f"SELECT {key_columns}, {row_hash} FROM {previous}.main.{table_name}"
+            side_changes.append(f"({current_rows} EXCEPT {previous_rows})")
+            side_changes.append(f"({previous_rows} EXCEPT {current_rows})")
+        self.con.execute(f"CREATE TEMP TABLE {changed_keys_table} AS SELECT DISTINCT {key_columns} FROM ({' UNION ALL '.join(side_changes)})")
+
+        changed_keys = self.con.execute(f"SELECT COUNT(*) FROM {changed_keys_table}").fetchone()[0]
+        self.logger.info(f"incremental compare: {changed_keys} changed keys since previous run")
+
+        changed_filter = f"({key_columns}) IN (SELECT {key_columns} FROM {changed_keys_table})"
+        unchanged_previous_rows = f"SELECT * FROM {previous}.main.{compare_table} WHERE NOT {changed_filter}"
+        if stored_rows_filter:
+            unchanged_previous_rows += f" AND {UNMATCHED_ROWS_FILTER}"
+        changed_rows = f"SELECT * FROM ({compare_statement(changed_filter)}){stored_rows_filter}"
+        self.timer.execute(stage, f"CREATE TABLE {compare_table} AS {unchanged_previous_rows} UNION ALL {changed_rows}")
+        self.con.execute(f"DROP TABLE {changed_keys_table}")
+
+    def __load_reference_datasets(self):
+        if self.reference_datasets is None:
+            return
+        queries = [side.transform.query for side in (self.entity.leftSide, self.entity.rightSide) if side.transform]
+        if self.reference_datasets.referenced(self.con, queries):
+            with self.timer.stage("reference_datasets"):
+                self.reference_datasets.load_referenced(self.con, queries)
+
+    def __resolve_input_schemas(self):
+        # csv inputs with a cached or pinned schema are read with explicit types and dialect instead of being sniffed,
+        # with type negotiation both sides are loaded once with the common type of every shared column
+        no_transforms = not self.entity.leftSide.transform and not self.entity.rightSide.transform
+        negotiate = self.entity.negotiateTypes and no_transforms
+        if self.schema_cache is None and not self.entity.columnTypes and not negotiate:
+            return
+        sides = (("left", self.entity.leftSide), ("right", self.entity.rightSide))
+        with self.timer.stage("schema"):
+            input_types = {}
+            for label, side in sides:
+                first_file = _input_files(side)[0]
+                if first_file is None or not os.path.exists(first_file):
+                    continue
+                if (side.format or detect_format(first_file)) == 'csv':
+                    if self.schema_cache is not None:
+                        schema = self.schema_cache.resolve(self.con, f"{self.entity.entityName}.{side.title}", first_file)
+                    else:
+                        schema = sniff_csv_schema(self.con, first_file)
+                    self.csv_options[label] = csv_read_options(schema, self.entity.columnTypes)
+                    input_types[label] = self.csv_options[label]['columns']
+                elif negotiate:
+                    # columnar inputs carry their types, reading the schema does not scan the data
+                    source = scan_expression(self.con, _input_path(side), side.format)
+                    input_types[label] = dict(row[:2] for row in self.con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall())
+
+            if negotiate and len(input_types) == 2:
+                self.type_widenings = negotiate_types(self.con, input_types['left'], input_types['right'])
+                for widening in self.type_widenings:
+                    level = logging.WARNING if widening['lossy'] else logging.INFO
+                    self.logger.log(level, f"column '{widening['column_name']}' loaded as {widening['negotiated_type']}: "
+                                           f"left {widening['left_type']}, right {widening['right_type']}{' (lossy)' if widening['lossy'] else ''}")
+                    for label in ("left", "right"):
+                        if label in self.csv_options:
+                            self.csv_options[label]['columns'][widening['column_name']] = widening['negotiated_type']
+                        elif input_types[label][widening['column_name']] != widening['negotiated_type']:
+                            self.column_casts[label][widening['column_name']] = widening['negotiated_type']
+
+        # without transforms the loaded types are known now, report type drift before anything is loaded
+        if len(self.csv_options) == 2 and no_transforms:
+            left_types = self.csv_options['left']['columns']
+            right_types = self.csv_options['right']['columns']
+            for col in sorted(set(left_types) & set(right_types)):
+                if left_types[col] != right_types[col]:
+                    raise ValueError(f"Data type mismatch for column '{col}': left file= {_input_files(self.entity.leftSide)[0]}.{left_types[col]}, right file={_input_files(self.entity.rightSide)[0]}.{right_types[col]}")
 
     def __create_right_side_table(self):
-        self.logger.info(f"Loading data into right side input table: {self.rightSideInputTable} from {self.entity.rightSide.inputFile}")
-        if not os.path.exists(self.entity.rightSide.inputFile):
-            raise FileNotFoundError(f"Right side input file not found: {self.entity.rightSide.inputFile}")
-       
-        self.con.execute(f"CREATE TABLE  {self.rightSideInputTable} AS SELECT * FROM read_csv_auto('{self.entity.rightSide.inputFile}')")  
-        self.logger.info(f"adding primary key to right side input table: {self.rightSideInputTable}")
-        self.con.execute(f"ALTER TABLE {self.rightSideInputTable} ADD PRIMARY KEY ({','.join(self.entity.primaryKeys)})")
+        self.__create_side_table("right", self.entity.rightSide, self.rightSideInputTable)
 
     def __create_left_side_table(self):
-        self.logger.info(f"Loading data into left side input table: {self.leftSideInputTable} from {self.entity.leftSide.inputFile}")
-        if not os.path.exists(self.entity.leftSide.inputFile):
-            raise FileNotFoundError(f"Left side input file not found: {self.entity.leftSide.inputFile}")
-       
-        self.con.execute(f"CREATE TABLE  {self.leftSideInputTable} AS SELECT * FROM read_csv_auto('{self.entity.leftSide.inputFile}')")
-        self.logger.info(f"adding primary key to left side input table: {self.leftSideInputTable}")
-        self.con.execute(f"ALTER TABLE {self.leftSideInputTable} ADD PRIMARY KEY ({','.join(self.entity.primaryKeys)})")
+        self.__create_side_table("left", self.entity.leftSide, self.leftSideInputTable)
 
-    def __extract_columns(self):
-        left_columns = self.con.execute(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{self.leftSideInputTable}'").fetchall()
-        right_columns = self.con.execute(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{self.rightSideInputTable}'").fetchall()
+    def __create_side_table(self, label, side, table_name):
+        files = _input_files(side)
+        self.logger.info(f"Loading data into {label} side input table: {table_name} from {files[0]}" + (f" and {len(files) - 1} more files" if len(files) > 1 else ""))
+        for file in files:
+            if file is None or not os.path.exists(file):
+                raise FileNotFoundError(f"{label.capitalize()} side input file not found: {file}")
 
-        # convert from list of tuples to list of strings
-        left_columns = [col[0] for col in left_columns]
-        right_columns = [col[0] for col in right_columns]
+        # arrow files are scanned through a dataset registered on this cursor, a view would outlive it
+        view = self.entity.ingestion == 'view' and not ((side.format or detect_format(files[0])) == 'arrow' and self.cache is None)
+        if self.entity.ingestion == 'view' and not view:
+            self.logger.info(f"materializing arrow input of {label} side as {table_name}, arrow files cannot be read through a view")
+
+        with self.timer.stage(f"parse_{label}") as stage:
+            try:
+                self.__load_side(stage, label, side, table_name, view)
+            except (duckdb.ConversionException, duckdb.InvalidInputException) as e:
+                # a cached schema only saw a sample of an earlier file, it is sniffed again once when the data no longer fits it
+                if self.schema_cache is None or label not in self.csv_options:
+                    raise
+                self.logger.warning(f"{label} side input does not match its cached schema, sniffing it again: {e}")
+                self.__refresh_csv_options(label, side)
+                self.__load_side(stage, label, side, table_name, view)
+
+    def __load_side(self, stage, label, side, table_name, view):
+        if self.cache is not None:
+            source = self.cache.cached_scan(self.con, _input_path(side), side.format, self.entity.fileNameColumn, self.csv_options.get(label))
+        else:
+            source = scan_expression(self.con, _input_path(side), side.format, self.entity.fileNameColumn, self.csv_options.get(label))
+        source = cast_columns(source, self.column_casts[label])
+
+        if view:
+            # the input file is scanned each time the view is read, nothing is kept resident
+            self.con.execute(f"CREATE VIEW  {table_name} AS SELECT * FROM {source}")
+            return
+
+        select_list = "*"
+        if self.entity.rowFingerprint and not side.transform:
+            # rows are fingerprinted once while the input is parsed instead of by every join
+            columns = [row[0] for row in self.con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+            hashed_columns = sorted(set(columns) - set(self.entity.primaryKeys) - set(self.excludeColumns))
+            if hashed_columns:
+                select_list += f", hash({_quote_columns(hashed_columns)}) AS {ROW_HASH_COLUMN}"
+
+        stage['rows'] = self.timer.execute(stage, f"CREATE TABLE  {table_name} AS SELECT {select_list} FROM {source}")[0][0]
+
+    def __refresh_csv_options(self, label, side):
+        schema = self.schema_cache.refresh(self.con, f"{self.entity.entityName}.{side.title}", _input_files(side)[0])
+        options = csv_read_options(schema, self.entity.columnTypes)
+        # negotiated types still apply to the columns whose type did not change
+        for widening in self.type_widenings:
+            if options['columns'].get(widening['column_name']) == widening[f"{label}_type"]:
+                options['columns'][widening['column_name']] = widening['negotiated_type']
+        self.csv_options[label] = options
+
+    def __create_cached_transform_table(self, stage, table_name, query):
+        if self.cache is None:
+            self.timer.execute(stage, f"CREATE TABLE {table_name} AS {query}")
+        else:
+            # the result is keyed by the query text and every input the query could read
+            input_keys = [self.cache.input_key(_input_path(side), side.format, self.entity.fileNameColumn, self.csv_options.get(label))
+                          for label, side in (("left", self.entity.leftSide), ("right", self.entity.rightSide))]
+            context_keys = self.cache_context(self.con, query) if self.cache_context is not None else []
+            key = self.cache.transform_key(query, input_keys + context_keys)
+            cached = self.cache.lookup(key)
+            if cached is not None:
+                self.logger.info(f"loading transform result from cache: {cached}")
+                self.con.execute(f"CREATE TABLE {table_name} AS SELECT * FROM read_parquet('{cached}')")
+            else:
+                self.timer.execute(stage, f"CREATE TABLE {table_name} AS {query}")
+                self.cache.store(self.con, f"SELECT * FROM {table_name}", key)
+        stage['rows'] = table_rows(self.con, table_name)
+
+    def __index_validated_inputs(self):
+        if not self.entity.primaryKeyIndex:
+            return
+        sides = (("left", self.leftSideInputTable, self.entity.leftSide), ("right", self.rightSideInputTable, self.entity.rightSide))
+        for label, table_name, side in sides:
+            # views over the input files or over uncached transforms have nothing to index
+            if table_rows(self.con, table_name) is not None:
+                self.__add_primary_key_index(table_name, f"{label}_transform" if side.transform else label)
+
+    def __add_primary_key_index(self, table_name, label):
+        # uniqueness is validated by __validate_unique_keys, the index is only kept for point lookups
+        if not self.entity.primaryKeyIndex:
+            return
+        self.logger.info(f"adding primary key to table: {table_name}")
+        with self.timer.stage(f"pk_index_{label}") as stage:
+            stage['rows'] = table_rows(self.con, table_name)
+            self.con.execute(f"ALTER TABLE {table_name} ADD PRIMARY KEY ({','.join(self.entity.primaryKeys)})")
+
+    def __validate_unique_keys(self, left_columns, right_columns):
+        # a single aggregation pass over each side finds NULL and duplicate keys and counts the rows and
+        # non-null values of every column, which the summary uses for the fully matched rows it never reads
+        key_columns = _quote_columns(self.entity.primaryKeys)
+        null_key_filter = " OR ".join(f'"{pk}" IS NULL' for pk in self.entity.primaryKeys)
+        distinct_keys = key_columns if len(self.entity.primaryKeys) == 1 else f"row({key_columns})"
+        self.input_counts = {}
+        for label, table, columns in (('left', self.leftSideInputTable, left_columns), ('right', self.rightSideInputTable, right_columns)):
+            columns = [col for col in columns if col not in self.entity.primaryKeys]
+            count_expressions = ", ".join([
+                "COUNT(*)",
+                f"COUNT(*) FILTER (WHERE {null_key_filter})",
+                f"COUNT(DISTINCT {distinct_keys}) FILTER (WHERE NOT ({null_key_filter}))",
+            ] + [f'COUNT("{col}")' for col in columns])
+            counts = self.con.execute(f"SELECT {count_expressions} FROM {table}").fetchone()
+            self.input_counts[label] = {'rows': counts[0], 'null_keys': counts[1], 'distinct_keys': counts[2],
+                                        'non_null': dict(zip(columns, counts[3:]))}
+
+        null_keys = [(label, counts['null_keys']) for label, counts in self.input_counts.items() if counts['null_keys'] > 0]
+        if null_keys:
+            details = ", ".join(f"{label} side: {rows} rows" for label, rows in null_keys)
+            raise ValueError(f"NULL primary keys {self.entity.primaryKeys} found ({details})")
+
+        has_duplicates = any(counts['rows'] > counts['distinct_keys'] for counts in self.input_counts.values())
+        if not has_duplicates:
+            self.statistics['duplicate_keys_left'] = 0
+            self.statistics['duplicate_keys_right'] = 0
+            return
+
+        # only a failing entity groups its keys again to keep the offending ones
+        duplicate_keys_table = f"{self.entity.entityName}_duplicate_keys"
+        side_duplicates = [
+            f"SELECT '{label}' AS side, {key_columns}, COUNT(*) AS duplicate_count FROM {table} GROUP BY ALL HAVING COUNT(*) > 1"
+            for label, table in (('left', self.leftSideInputTable), ('right', self.rightSideInputTable))
+        ]
+        self.con.execute(f"CREATE OR REPLACE TABLE {duplicate_keys_table} AS {' UNION ALL '.join(side_duplicates)}")
+
+        summary = self.con.execute(f"SELECT side, COUNT(*), SUM(duplicate_count) FROM {duplicate_keys_table} GROUP BY side ORDER BY side").fetchall()
+        duplicate_keys = {side: keys for side, keys, _ in summary}
+        self.statistics['duplicate_keys_left'] = duplicate_keys.get('left', 0)
+        self.statistics['duplicate_keys_right'] = duplicate_keys.get('right', 0)
+        details = ", ".join(f"{side} side: {keys} keys in {rows} rows" for side, keys, rows in summary)
+        raise ValueError(f"Duplicate primary keys {self.entity.primaryKeys} found ({details}). Offending keys are in table [{duplicate_keys_table}]")
+
+    def __extract_columns(self):
+        # the row fingerprint is not an input column
+        left_columns = [col[0] for col in self.__table_columns(self.leftSideInputTable) if col[0] != ROW_HASH_COLUMN]
+        right_columns = [col[0] for col in self.__table_columns(self.rightSideInputTable) if col[0] != ROW_HASH_COLUMN]
         return left_columns,right_columns
 
     def __validate_data_types(self, left_columns, right_columns):
-        left_dtypes = self.con.execute(f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{self.leftSideInputTable}'").fetchdf()
-        right_dtypes = self.con.execute(f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{self.rightSideInputTable}'").fetchdf()
-
         # create dictionaries mapping column names to data types
-        left_dtype_dict = dict(zip(left_dtypes['column_name'], left_dtypes['data_type']))
-        right_dtype_dict = dict(zip(right_dtypes['column_name'], right_dtypes['data_type']))
+        left_dtype_dict = dict(self.__table_columns(self.leftSideInputTable))
+        right_dtype_dict = dict(self.__table_columns(self.rightSideInputTable))
 
         # check matching columns have same data type
         common_columns = set(left_columns) & set(right_columns)
@@ -388,27 +1032,71 @@ class EntityComparer:
             if left_dtype_dict[col] != right_dtype_dict[col]:
                 raise ValueError(f"Data type mismatch for column '{col}': left table= {self.leftSideInputTable}.{left_dtype_dict[col]}, right table={self.rightSideInputTable}.{right_dtype_dict[col]}")
 
-    def __create_field_summary_table(self, match_columns):
-        summary_query = """
-            WITH match_counts AS (
+    def __summarize(self, stage, comparison_columns):
+        # fully matched rows only add to the row and non-null counts gathered from the inputs while their keys
+        # were validated, entity statistics and per field counters are aggregated over the other rows of the
+        # compare table into a one row counts table, the field summary unpivots it into one row per field
+        compare_table = f"{self.entity.entityName}_compare"
+        counts_table = f"{self.entity.entityName}_compare_counts"
+        summary_table = f"{self.entity.entityName}_compare_field_summary"
+        left_counts, right_counts = self.input_counts['left'], self.input_counts['right']
+        both = "_exists_left AND _exists_right"
+        left_only = "COUNT(*) FILTER (WHERE _exists_left AND NOT _exists_right)"
+        mismatched = f"COUNT(*) FILTER (WHERE {both} AND NOT coalesce(_full_match, FALSE))"
+        total = f"{left_counts['rows']} - {left_only}"
+
+        entity_counts = {
+            'rows_left': f"{left_counts['rows']}::BIGINT",
+            'rows_right': f"{right_counts['rows']}::BIGINT",
+            'rows_fully_matched': f"{total} - {mismatched}",
+            'rows_left_only': left_only,
+            'rows_right_only': "COUNT(*) FILTER (WHERE _exists_right AND NOT _exists_left)",
+            'rows_mismatched': mismatched,
+        }
+
+        counters = ["{" + ", ".join(f"'{name}': {expression}" for name, expression in entity_counts.items()) + "} AS _entity_counts"]
+        for col in comparison_columns:
+            mismatch = f'{both} AND NOT coalesce("{col}_match", FALSE)'
+            counters.append(f"""{{
+                    'total': {total},
+                    'mismatches': COUNT(*) FILTER (WHERE {mismatch}),
+                    'left_null_mismatches': COUNT(*) FILTER (WHERE {mismatch} AND "{col}_left" IS NULL AND "{col}_right" IS NOT NULL),
+                    'right_null_mismatches': COUNT(*) FILTER (WHERE {mismatch} AND "{col}_left" IS NOT NULL AND "{col}_right" IS NULL),
+                    'left_non_null': {left_counts['non_null'][col]} - COUNT("{col}_left") FILTER (WHERE _exists_left AND NOT _exists_right),
+                    'right_non_null': {right_counts['non_null'][col]} - COUNT("{col}_right") FILTER (WHERE _exists_right AND NOT _exists_left)
+                }} AS "{col}" """)
+
+        counts_statement = f"CREATE TEMP TABLE {counts_table} AS SELECT {', '.join(counters)} FROM {compare_table} WHERE {UNMATCHED_ROWS_FILTER}"
+        self.logger.info(counts_statement)
+        self.timer.execute(stage, counts_statement)
+
+        result = self.con.execute(f"SELECT _entity_counts.* FROM {counts_table}")
+        self.statistics.update(zip([column[0] for column in result.description], result.fetchone()))
+        self.statistics['rows_both'] = self.statistics['rows_left'] - self.statistics['rows_left_only']
+
+        if comparison_columns:
+            summary_statement = f"""
+                CREATE TABLE {summary_table} AS
                 SELECT
-                    COUNT(*) as total_count,
-                    """ + \
-                    ",            ".join([f'SUM(CASE WHEN {col} THEN 1 ELSE 0 END) as {col[:-9]}_matches"' for col in match_columns]) + \
-        """
-                FROM {entity}_compare WHERE _exists_left = 1 and _exists_right = 1 
-            )
-            SELECT
-                """ + \
-                " UNION ALL SELECT ".join([
-                    f'\'{col[:-9][1:]}\' as field, total_count as total, {col[:-9]}_matches" as matches, ' + \
-                    f'ROUND(CAST({col[:-9]}_matches" AS FLOAT) / total_count * 100, 2) as match_percentage FROM match_counts'
-                    for col in match_columns
-                ])
-
-        summary_view_statement = f"CREATE VIEW {self.entity.entityName}_compare_field_summary AS {summary_query.format(entity=self.entity.entityName)}"
-        self.logger.info(summary_view_statement)
-        self.con.execute(summary_view_statement)
+                    field,
+                    counts.total AS total,
+                    counts.total - counts.mismatches AS matches,
+                    ROUND(CAST(counts.total - counts.mismatches AS FLOAT) / counts.total * 100, 2) AS match_percentage,
+                    counts.mismatches AS mismatches,
+                    counts.left_null_mismatches AS left_null_mismatches,
+                    counts.right_null_mismatches AS right_null_mismatches,
+                    counts.left_non_null AS left_non_null,
+                    counts.right_non_null AS right_non_null
+                FROM (UNPIVOT (SELECT * EXCLUDE (_entity_counts) FROM {counts_table}) ON COLUMNS(*) INTO NAME field VALUE counts)"""
+        else:
+            summary_statement = f"""
+                CREATE TABLE {summary_table} (field VARCHAR, total BIGINT, matches BIGINT, match_percentage FLOAT,
+                    mismatches BIGINT, left_null_mismatches BIGINT, right_null_mismatches BIGINT,
+                    left_non_null BIGINT, right_non_null BIGINT)"""
+        self.con.execute(summary_statement)
+        self.con.execute(f"DROP TABLE {counts_table}")
+
+
         # if transform query is provided, execute it
 
     
@@ -0,0 +1,125 @@
+import logging
+import queue
+import threading
+from .sampling import create_sample
+from .stageTimings import StageTimer, STAGE_TIMINGS_TABLE, record_stage_timings, table_rows
+from .schemaNegotiation import TYPE_WIDENINGS_TABLE
+
+_FINISHED = object()
+
+class ExportPipeline:
+    """
+    Exports the tables of each entity while later entities are still being compared.
+
+    Entities are queued through entity_completed, passed to DeltaLens.execute as on_entity_complete,
+    and exported by a single background thread on its own cursor: the compare table sample is
+    created, then the entity's compare and field summary tables are handed to every exporter.
+    The export of each entity is recorded as its 'export' stage in entity_stage_timings.
+    entity_compare_results, entity_stage_timings and entity_type_widenings are exported last, once the run has finished.
+    At most max_pending entities wait for export. When the queue is full, entity_completed blocks,
+    which holds back the scheduling of further entities until the export catches up.
+    Parameters
+    ----------
+    conn : duckdb.DuckDBPyConnection
+        Connection of the DeltaLens run
+    exporters : list
+        Incremental exporters (SqliteExporter, CsvArchiveExporter, ParquetExporter), closed when the pipeline finishes
+    sample_threshold : int, optional
+        Rows sampled from compare tables, see sampling.create_sample. If <= 0 or without exporters, no sampling
+        is performed (default is 0)
+    sample_seed : int, optional
+        Seed of the primary key hash picking sampled rows (default is 0)
+    mismatches_only : bool, optional
+        Sample only rows that are not fully matched (default is True)
+    sample_rows_per_field : int, optional
+        Sampled rows added per mismatching field (default is 0)
+    max_pending : int, optional
+        Number of completed entities waiting for export before entity_completed blocks (default is 2)
+    Notes
+    -----
+    - Use as a context manager around DeltaLens.execute. On a clean exit the results table is exported and
+      the exporters closed; when execute raises, queued entities are dropped and the exporters closed
+    - The first export error stops the pipeline and is raised by the next entity_completed call or on exit
+    """
+    def __init__(self, conn, exporters, sample_threshold = 0, sample_seed = 0, mismatches_only = True,
+                 sample_rows_per_field = 0, max_pending = 2):
+        if max_pending < 1:
+            raise ValueError(f"max_pending must be at least 1, got {max_pending}")
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.conn = conn
+        self.exporters = exporters
+        self.sample_threshold = sample_threshold
+        self.sample_seed = sample_seed
+        self.mismatches_only = mismatches_only
+        self.sample_rows_per_field = sample_rows_per_field
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._cancelled = False
+        self._thread = threading.Thread(target=self.__run, name="ExportPipeline", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._cancelled = True
+        self.__put(_FINISHED)
+        self._thread.join()
+        if exc_type is None and self._error is not None:
+            raise self._error
+        return False
+
+    def entity_completed(self, entity_name: str):
+        """Queue the tables of a successfully compared entity for export, blocks while the queue is full"""
+        self.__put(entity_name)
+        if self._error is not None:
+            raise self._error
+
+    def __put(self, item):
+        # a failed worker stops consuming, so never block on it
+        while self._thread.is_alive():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __export(self, cursor, tables):
+        for exporter in self.exporters:
+            exporter.export_tables(cursor, tables)
+
+    def __run(self):
+        cursor = self.conn.cursor()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _FINISHED:
+                    break
+                if self._cancelled:
+                    continue
+                self.logger.info(f"Exporting entity: [{item}]")
+                compare_table = f"{item}_compare"
+                timer = StageTimer(cursor, item)
+                with timer.stage("export") as stage:
+                    stage['rows'] = table_rows(cursor, compare_table)
+                    # samples are only read by exporters
+                    if self.sample_threshold > 0 and self.exporters:
+                        create_sample(cursor, compare_table, self.sample_threshold, self.sample_seed,
+                                      self.mismatches_only, self.sample_rows_per_field)
+                    self.__export(cursor, [compare_table, f"{compare_table}_field_summary"])
+                record_stage_timings(cursor, timer.timings)
+
+            if not self._cancelled:
+                self.__export(cursor, ["entity_compare_results", STAGE_TIMINGS_TABLE, TYPE_WIDENINGS_TABLE])
+        except Exception as e:
+            self.logger.error(f"Error during export: {str(e)}")
+            self._error = e
+        finally:
+            for exporter in self.exporters:
+                try:
+                    exporter.close()
+                except Exception as e:
+                    self.logger.error(f"Error closing exporter: {str(e)}")
+                    self._error = self._error or e
+            cursor.close()
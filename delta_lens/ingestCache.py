@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from .inputFormats import scan_expression
+
+# bump when the way inputs are parsed changes so stale cache entries are not reused
+CACHE_FORMAT_VERSION = "1"
+
+class IngestCache:
+    """
+    A content-addressed cache of parsed input files and cached transform results.
+
+    Parsed tables are stored as Parquet files in the cache directory, named by a key derived from
+    the input file (its content hash, or its path, size and modification time) or from the transform
+    query text together with the keys of the inputs it reads. Unchanged inputs and transforms are
+    loaded from the Parquet copy instead of being parsed or executed again.
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the cached Parquet files, created if missing
+    key_mode : str, optional
+        'content' hashes the file content, 'stat' uses path, size and modification time
+        (default is 'content')
+    max_size_bytes : int, optional
+        Size limit of the cache directory. Least recently used entries are evicted after each store.
+        None disables eviction (default is None)
+    Notes
+    -----
+    - Entries read during the lifetime of the cache object are never evicted by it, since views
+      created in the current run may still scan them
+    - The cache is safe to share between entities compared concurrently
+    """
+    def __init__(self, cache_dir: str, key_mode: str = 'content', max_size_bytes: int = None):
+        if key_mode not in ('content', 'stat'):
+            raise ValueError(f"Invalid cache key mode '{key_mode}'. Expected 'content' or 'stat'.")
+        self.cache_dir = cache_dir
+        self.key_mode = key_mode
+        self.max_size_bytes = max_size_bytes
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._file_keys = {}
+        self._in_use = set()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_key(self, path: str, format: str = None) -> str:
+        """Key of a parsed input file, computed once per path"""
+        path = os.path.abspath(path)
+        with self._lock:
+            if (path, format) in self._file_keys:
+                return self._file_keys[(path, format)]
+
+        digest = hashlib.sha256(f"{CACHE_FORMAT_VERSION}|{format}|".encode())
+        if self.key_mode == 'content':
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(path)
+            digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+
+        key = digest.hexdigest()
+        with self._lock:
+            self._file_keys[(path, format)] = key
+        return key
+
+    def input_key(self, path, format: str = None, filename_column: str = None, csv_options: dict = None) -> str:
+        """
+        Key of a parsed input, a single file or the files of a sharded input read together.
+        With a filename column the parsed rows hold the file paths, so the paths are part of the key,
+        explicit csv read options (such as pinned column types) are part of it as well.
+        """
+        if isinstance(path, str) and filename_column is None and not csv_options:
+            return self.file_key(path, format)
+        paths = [path] if isinstance(path, str) else path
+        options = json.dumps(csv_options) if csv_options else None
+        digest = hashlib.sha256(f"{CACHE_FORMAT_VERSION}|files|{filename_column}|{options}".encode())
+        for file in paths:
+            digest.update(f"|{self.file_key(file, format)}".encode())
+            if filename_column is not None:
+                digest.update(f"|{file}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def transform_key(query: str, input_keys) -> str:
+        """Key of a transform result, derived from the query text and the keys of the inputs it may read"""
+        digest = hashlib.sha256(f"{CACHE_FORMAT_VERSION}|transform|{query}".encode())
+        for input_key in sorted(input_keys):
+            digest.update(f"|{input_key}".encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def lookup(self, key: str):
+        """Return the Parquet path of a cached entry or None, marking the entry as recently used"""
+        path = self._entry_path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            os.utime(path)
+            self._in_use.add(path)
+        return path
+
+    def store(self, con, select_statement: str, key: str) -> str:
+        """Write the result of a SELECT statement to the cache and return its Parquet path"""
+        path = self._entry_path(key)
+        temp_path = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            con.execute(f"COPY ({select_statement}) TO '{temp_path}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        with self._lock:
+            self._in_use.add(path)
+        self.evict()
+        return path
+
+    def cached_scan(self, con, path, format: str = None, filename_column: str = None, csv_options: dict = None) -> str:
+        """
+        Build a table expression for an input file or the files of a sharded input, served from the cache.
+        On a cache miss the input is parsed once with its native reader and stored.
+        """
+        key = self.input_key(path, format, filename_column, csv_options)
+        cached = self.lookup(key)
+        if cached is None:
+            self.logger.info(f"cache miss for {path}, storing parsed copy")
+            cached = self.store(con, f"SELECT * FROM {scan_expression(con, path, format, filename_column, csv_options)}", key)
+        else:
+            self.logger.info(f"cache hit for {path}: {cached}")
+        return f"read_parquet('{cached}')"
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_size_bytes"""
+        if self.max_size_bytes is None:
+            return
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith(".parquet"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size_bytes:
+                    break
+                if path in self._in_use:
+                    continue
+                self.logger.info(f"evicting cache entry: {path}")
+                os.remove(path)
+                total_size -= size
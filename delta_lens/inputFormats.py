@@ -0,0 +1,149 @@
+import fnmatch
+import glob
+import hashlib
+import os
+import re
+
+SUPPORTED_FORMATS = ('csv', 'parquet', 'arrow', 'json', 'ndjson')
+
+_COMPRESSION_EXTENSIONS = ('.gz', '.gzip', '.zst', '.zstd')
+
+_FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.tsv': 'csv',
+    '.txt': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+    '.json': 'json',
+    '.jsonl': 'ndjson',
+    '.ndjson': 'ndjson',
+}
+
+def detect_format(path: str) -> str:
+    """
+    Detect the input format of a file from its extension.
+    Compression suffixes (.gz, .zst) are ignored, so 'trades.csv.gz' is detected as csv.
+    Unknown extensions fall back to csv.
+
+    Args:
+        path (str): Path of the input file
+    Returns:
+        str: One of SUPPORTED_FORMATS
+    """
+    name = path.lower()
+    for extension in _COMPRESSION_EXTENSIONS:
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+            break
+    return _FORMAT_EXTENSIONS.get(os.path.splitext(name)[1], 'csv')
+
+def _quote(path: str) -> str:
+    return "'" + path.replace("'", "''") + "'"
+
+def _file_list(paths) -> str:
+    if isinstance(paths, str):
+        return _quote(paths)
+    return "[" + ", ".join(_quote(path) for path in paths) + "]"
+
+def _sql_value(value) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{_quote(key)}: {_sql_value(item)}" for key, item in value.items()) + "}"
+    return _quote(value)
+
+def scan_expression(con, path, format: str = None, filename_column: str = None, csv_options: dict = None) -> str:
+    """
+    Build the DuckDB table expression that scans an input file with its native reader.
+
+    Columnar formats (parquet, arrow) keep their types and get projection and filter pushdown.
+    Compressed csv files are decompressed by read_csv_auto based on their extension.
+    A list of files, such as the shards of a sharded input, is read as one input by the multi-file
+    reader of the format, which scans the files in parallel.
+    Arrow IPC files are scanned through a pyarrow dataset registered on the given connection,
+    so the returned expression is only valid on that connection.
+
+    Args:
+        con: DuckDB connection or cursor the expression will be executed on
+        path (str or list): Path of the input file, or paths of files with the same schema
+        format (str, optional): One of SUPPORTED_FORMATS. Detected from the (first) file extension if None.
+        filename_column (str, optional): Add a column with the path of the file each row was read from
+        csv_options (dict, optional): Named read_csv parameters, such as the dialect and column types of
+            a known schema (see schemaCache.csv_read_options), used instead of sniffing the file
+    Returns:
+        str: Table expression usable in a FROM clause
+    Raises:
+        ValueError: If the format is not supported, or filename_column is set for arrow files
+        ImportError: If an arrow file is read and pyarrow is not installed
+    """
+    if format is None:
+        format = detect_format(path if isinstance(path, str) else path[0])
+    files = _file_list(path)
+    options = f", filename={_quote(filename_column)}" if filename_column else ""
+
+    if format == 'csv':
+        if csv_options:
+            return f"read_csv({files}{options}, " + ", ".join(f"{name}={_sql_value(value)}" for name, value in csv_options.items()) + ")"
+        return f"read_csv_auto({files}{options})"
+    if format == 'parquet':
+        return f"read_parquet({files}{options})"
+    if format == 'json':
+        return f"read_json_auto({files}{options})"
+    if format == 'ndjson':
+        return f"read_json_auto({files}, format='newline_delimited'{options})"
+    if format == 'arrow':
+        if filename_column:
+            raise ValueError(f"A filename column is not supported for Arrow IPC input {path}")
+        return _register_arrow_dataset(con, path)
+
+    raise ValueError(f"Unsupported input format '{format}' for {path}. Supported formats: {SUPPORTED_FORMATS}")
+
+_GLOB_CHARACTERS = re.compile(r'[*?[]')
+
+def expand_patterns(patterns) -> dict:
+    """
+    Expand glob patterns to the sorted files they match.
+
+    Every directory is listed once and its file names are matched with fnmatch, so resolving the
+    patterns of many entities sharing a directory costs a single listing. Patterns with wildcards
+    in the directory part fall back to glob. As with glob, hidden files only match patterns
+    starting with a dot.
+
+    Args:
+        patterns (list): File glob patterns, e.g. 'data/trade_legacy_part-*.csv'
+    Returns:
+        dict: Pattern to the sorted list of matching files, empty when nothing matches
+    """
+    listings = {}
+    matches = {}
+    for pattern in patterns:
+        directory, name_pattern = os.path.split(pattern)
+        if _GLOB_CHARACTERS.search(directory):
+            matches[pattern] = sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+            continue
+        if directory not in listings:
+            try:
+                listings[directory] = sorted(entry.name for entry in os.scandir(directory or '.') if entry.is_file())
+            except (FileNotFoundError, NotADirectoryError):
+                listings[directory] = []
+        names = listings[directory]
+        if not name_pattern.startswith('.'):
+            names = [name for name in names if not name.startswith('.')]
+        matches[pattern] = [os.path.join(directory, name) for name in fnmatch.filter(names, name_pattern)]
+    return matches
+
+def _register_arrow_dataset(con, path) -> str:
+    try:
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        raise ImportError(f"pyarrow is required to read Arrow IPC file {path}: pip install pyarrow") from e
+
+    paths = [path] if isinstance(path, str) else path
+    view_name = "arrow_scan_" + hashlib.sha1("|".join(os.path.abspath(p) for p in paths).encode()).hexdigest()[:16]
+    con.register(view_name, ds.dataset(path, format="arrow"))
+    return view_name
@@ -0,0 +1,131 @@
+import duckdb
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from .sampling import create_sample
+
+class ParquetExporter:
+    """
+    Incremental export of DuckDB tables into compressed Parquet files, used by export_to_parquet and
+    by the export pipeline to add the tables of each entity as soon as its comparison completes.
+
+    Every table is written to '{output_dir}/{table_name}.parquet'. With partition_by_match the compare
+    tables are written as a Hive partitioned dataset instead, partitioned by entity and match status:
+    '{output_dir}/compare/entity={entity}/_full_match={true|false}/data_0.parquet'.
+    Tables are copied concurrently, each on its own cursor.
+    Parameters
+    ----------
+    output_dir : str
+        Directory to write the Parquet files to, must not exist yet
+    sample_threshold : int, optional
+        Maximum number of rows sampled from compare tables, see sampling.create_sample. An existing
+        '{table}_sample' table is exported instead. If <= 0, no sampling is performed (default is 0)
+    mismatches_only : bool, optional
+        Export only mismatched rows of the compare tables (default is True)
+    partition_by_match : bool, optional
+        Hive partition the compare tables by entity and _full_match (default is False)
+    row_group_size : int, optional
+        Rows per Parquet row group (default is 122880)
+    compression : str, optional
+        Parquet compression codec, e.g. 'zstd', 'snappy' or 'uncompressed' (default is 'zstd')
+    max_workers : int, optional
+        Number of tables copied concurrently (default is 4)
+    """
+    def __init__(self, output_dir: str, sample_threshold = 0, mismatches_only = True, partition_by_match = False,
+                 row_group_size = 122880, compression = 'zstd', max_workers = 4):
+        if os.path.exists(output_dir):
+            raise FileExistsError(f"Parquet output directory '{output_dir}' already exists")
+        self.logger = logging.getLogger(__name__)
+        self.output_dir = output_dir
+        self.sample_threshold = sample_threshold
+        self.mismatches_only = mismatches_only
+        self.partition_by_match = partition_by_match
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.max_workers = max_workers
+        os.makedirs(os.path.join(output_dir, "compare") if partition_by_match else output_dir)
+
+    def __copy_table(self, conn, table_name):
+        is_compare = table_name.endswith("_compare")
+        options = f"FORMAT PARQUET, COMPRESSION {self.compression}, ROW_GROUP_SIZE {self.row_group_size}"
+        if is_compare and self.partition_by_match:
+            target = os.path.join(self.output_dir, "compare", f"entity={table_name[:-len('_compare')]}")
+            options += ", PARTITION_BY (_full_match)"
+        else:
+            target = os.path.join(self.output_dir, f"{table_name}.parquet")
+
+        cursor = conn.cursor()
+        try:
+            source_table = table_name
+            if is_compare and self.sample_threshold > 0:
+                # deterministic sample shared with the other exporters
+                source_table = create_sample(cursor, table_name, self.sample_threshold, mismatches_only=self.mismatches_only)
+            source = f"SELECT * FROM {source_table}"
+            if is_compare and self.mismatches_only:
+                source += " WHERE _full_match=0"
+            # COPY returns the number of rows written
+            row_count = cursor.execute(f"COPY ({source}) TO '{target}' ({options})").fetchone()[0]
+        finally:
+            cursor.close()
+        self.logger.info(f"Exported {row_count} rows from {table_name} to {target}")
+        return row_count
+
+    def export_tables(self, conn, tables):
+        """Export the given DuckDB tables, conn is a DuckDB connection or cursor"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ParquetExport") as pool:
+            for future in [pool.submit(self.__copy_table, conn, table_name) for table_name in tables]:
+                future.result()
+
+    def close(self):
+        return self.output_dir
+
+def export_to_parquet(conn, output_dir: str, sample_threshold = 0, table_filter = None, mismatches_only = True,
+                      partition_by_match = False, row_group_size = 122880, compression = 'zstd', max_workers = 4):
+    """
+    Export tables from DuckDB to compressed Parquet files.
+    See ParquetExporter for the file layout.
+
+    Args:
+        conn: DuckDB connection object
+        output_dir (str): Directory to write the Parquet files to, must not exist yet
+        sample_threshold (int, optional): Maximum number of rows sampled from compare tables, see
+            sampling.create_sample. An existing '{table}_sample' table is exported instead.
+            If <= 0, no sampling is performed. Defaults to 0.
+        table_filter (callable, optional): Function to filter which tables to export.
+            Takes table name as input and returns boolean. If None, exports tables ending with
+            '_compare_field_summary', 'entity_compare_results', or '_compare'. Defaults to None.
+        mismatches_only (bool, optional): Export only mismatched rows of the compare tables. Defaults to True.
+        partition_by_match (bool, optional): Hive partition the compare tables by entity and _full_match.
+            Defaults to False.
+        row_group_size (int, optional): Rows per Parquet row group. Defaults to 122880.
+        compression (str, optional): Parquet compression codec, e.g. 'zstd', 'snappy' or 'uncompressed'.
+            Defaults to 'zstd'.
+        max_workers (int, optional): Number of tables copied concurrently. Defaults to 4.
+    Returns:
+        str: Path to the output directory
+    """
+    logger = logging.getLogger(__name__)
+
+    if os.path.exists(output_dir):
+        raise FileExistsError(f"Parquet output directory '{output_dir}' already exists")
+
+    if table_filter is None:
+        table_filter = lambda table: table.endswith("_compare_field_summary") or \
+                                   table.endswith("entity_compare_results") or \
+                                   table.endswith("_compare")
+
+    tables = conn.execute("""
+        SELECT table_name
+        FROM information_schema.tables
+        WHERE table_schema = 'main'
+        AND table_type IN ('BASE TABLE', 'VIEW')
+    """).fetchall()
+    tables = [name[0] for name in tables if table_filter(name[0])]
+    logger.info(f"Found {len(tables)} tables to export")
+
+    exporter = ParquetExporter(output_dir, sample_threshold, mismatches_only, partition_by_match,
+                               row_group_size, compression, max_workers)
+    exporter.export_tables(conn, tables)
+
+    logger.info(f"Parquet export created successfully at: {output_dir}")
+    return exporter.close()
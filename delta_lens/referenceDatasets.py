@@ -0,0 +1,108 @@
+import json
+import logging
+import re
+import threading
+from .config import ReferenceDataset
+from .inputFormats import scan_expression, detect_format
+
+def referenced_tables(conn, query: str) -> set:
+    """
+    Names of the tables and views a query reads, lower cased.
+
+    The query is parsed by DuckDB (json_serialize_sql) and every base table reference is collected,
+    including those in joins, subqueries and CTEs. Queries DuckDB cannot serialize fall back to every
+    identifier in the query text, which may over-detect but never misses a reference.
+
+    Args:
+        conn: DuckDB connection or cursor used to parse the query
+        query (str): SELECT statement
+    Returns:
+        set: Referenced table names
+    """
+    parsed = json.loads(conn.execute("SELECT json_serialize_sql(?)", [query]).fetchone()[0])
+    if parsed.get('error'):
+        return {name.lower() for name in re.findall(r'[A-Za-z_][A-Za-z0-9_]*', query)}
+
+    names = set()
+    def visit(node):
+        if isinstance(node, dict):
+            if node.get('type') == 'BASE_TABLE' and 'table_name' in node:
+                names.add(node['table_name'].lower())
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+    visit(parsed['statements'])
+    return names
+
+class ReferenceDatasets:
+    """
+    Loads reference datasets on demand, the first time a transform query references them.
+
+    Nothing is read before an entity needs a dataset, so datasets used by no transform of the run, for
+    example because the entity using them was filtered out or failed earlier, are never loaded.
+    A dataset is registered as a view over the scan of its file, or with materialize as a table parsed
+    once and shared by every entity. Datasets are loaded at most once, concurrent entities referencing
+    the same dataset wait for the first one to load it.
+    Parameters
+    ----------
+    con : duckdb.DuckDBPyConnection
+        Connection of the DeltaLens run
+    datasets : list
+        ReferenceDataset definitions
+    cache : IngestCache, optional
+        Cache of parsed inputs. Cached datasets are parsed into the cache on first reference and read
+        from it afterwards, in this and later runs (default is None, no caching)
+    Notes
+    -----
+    - Arrow IPC datasets are always materialized, their scan is only valid on the loading cursor
+    """
+    def __init__(self, con, datasets, cache = None):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.con = con
+        self.cache = cache
+        self.datasets = {dataset.datasetName.lower(): dataset for dataset in datasets or []}
+        self.loaded = set()
+        self._locks = {name: threading.Lock() for name in self.datasets}
+
+    def referenced(self, conn, queries) -> list:
+        """Reference datasets read by any of the queries, in definition order"""
+        names = set()
+        for query in queries:
+            names |= referenced_tables(conn, query)
+        return [dataset for name, dataset in self.datasets.items() if name in names]
+
+    def load_referenced(self, conn, queries) -> list:
+        """
+        Load the reference datasets the queries read that are not loaded yet.
+
+        Args:
+            conn: DuckDB cursor of the entity whose transforms are about to run
+            queries (list): Transform queries of the entity
+        Returns:
+            list: Names of the datasets loaded by this call
+        """
+        loaded = []
+        for dataset in self.referenced(conn, queries):
+            name = dataset.datasetName.lower()
+            with self._locks[name]:
+                if name in self.loaded:
+                    continue
+                self.__load(conn, dataset)
+                self.loaded.add(name)
+                loaded.append(dataset.datasetName)
+        return loaded
+
+    def __load(self, conn, dataset: ReferenceDataset):
+        if self.cache is not None:
+            source = self.cache.cached_scan(conn, dataset.inputFile, dataset.format)
+        else:
+            source = scan_expression(conn, dataset.inputFile, dataset.format)
+        format = dataset.format or detect_format(dataset.inputFile)
+        if dataset.materialize or (format == 'arrow' and self.cache is None):
+            self.logger.info(f"Loading reference dataset: {dataset.datasetName} from {dataset.inputFile}")
+            conn.execute(f"CREATE TABLE {dataset.datasetName} AS SELECT * FROM {source}")
+        else:
+            self.logger.info(f"Registering reference dataset view: {dataset.datasetName} over {dataset.inputFile}")
+            conn.execute(f"CREATE VIEW {dataset.datasetName} AS SELECT * FROM {source}")
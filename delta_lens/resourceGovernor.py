@@ -0,0 +1,136 @@
+import logging
+import math
+import os
+import psutil
+from .config import Resources
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# share of the memory limit given to DuckDB when the limit is not set explicitly
+DEFAULT_MEMORY_FRACTION = 0.7
+
+def _read(path: str):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def cgroup_memory_limit(cgroup_root: str = CGROUP_ROOT):
+    """
+    Memory limit of the current cgroup in bytes, from cgroup v2 (memory.max) or v1 (memory.limit_in_bytes).
+    Returns None when no limit is set or no cgroup filesystem is mounted.
+    """
+    value = _read(os.path.join(cgroup_root, "memory.max"))
+    if value is None:
+        value = _read(os.path.join(cgroup_root, "memory", "memory.limit_in_bytes"))
+    if value is None or not value.isdigit():
+        return None
+    # cgroup v1 reports an unlimited group as a value close to the maximum 64 bit integer
+    limit = int(value)
+    return limit if limit < 2**62 else None
+
+def cgroup_cpu_limit(cgroup_root: str = CGROUP_ROOT):
+    """
+    CPU quota of the current cgroup in cores, from cgroup v2 (cpu.max) or v1 (cpu.cfs_quota_us / cpu.cfs_period_us).
+    Returns None when no quota is set or no cgroup filesystem is mounted.
+    """
+    value = _read(os.path.join(cgroup_root, "cpu.max"))
+    if value is not None:
+        quota, _, period = value.partition(" ")
+    else:
+        quota = period = None
+        for controller in ("cpu", "cpu,cpuacct"):
+            quota = _read(os.path.join(cgroup_root, controller, "cpu.cfs_quota_us"))
+            period = _read(os.path.join(cgroup_root, controller, "cpu.cfs_period_us"))
+            if quota is not None:
+                break
+    try:
+        quota, period = int(quota), int(period)
+    except (TypeError, ValueError):
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return quota / period
+
+class ResourceGovernor:
+    """
+    Resolves the memory, thread and spill settings of the DuckDB database of a run.
+
+    Explicit settings win; otherwise memory is memoryFraction of the smaller of the physical memory
+    and the cgroup memory limit, and threads are the smaller of the usable CPUs and the cgroup CPU quota.
+    Containers therefore get budgets based on their own limits instead of the host's.
+    Parameters
+    ----------
+    resources : Resources, optional
+        Configured settings, None fields are detected (default is None, detect everything)
+    max_parallel_entities : int, optional
+        Number of entities compared concurrently, sharing the budgets (default is 1)
+    cgroup_root : str, optional
+        Mount point of the cgroup filesystem (default is /sys/fs/cgroup)
+    Attributes
+    ----------
+    memory_limit_bytes : int
+        DuckDB memory_limit
+    threads : int
+        DuckDB threads
+    temp_directory : str or None
+        DuckDB spill directory, None keeps the DuckDB default
+    max_temp_directory_size_bytes : int or None
+        Size limit of the spill directory, None keeps the DuckDB default
+    entity_memory_budget : int
+        Memory available to each of the concurrently compared entities
+    Notes
+    -----
+    - memory_limit, threads and the spill directory are database wide in DuckDB. Concurrent entities share
+      them, and the per entity memory budget is what EntityComparer uses to size hash buckets
+    """
+    def __init__(self, resources: Resources = None, max_parallel_entities: int = 1, cgroup_root: str = CGROUP_ROOT):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        resources = resources or Resources()
+        self.max_parallel_entities = max_parallel_entities
+
+        self.cgroup_memory_limit = cgroup_memory_limit(cgroup_root)
+        self.cgroup_cpu_limit = cgroup_cpu_limit(cgroup_root)
+
+        if resources.memoryLimitGb is not None:
+            self.memory_limit_bytes = int(resources.memoryLimitGb * 1024**3)
+        else:
+            available = psutil.virtual_memory().total
+            if self.cgroup_memory_limit is not None:
+                available = min(available, self.cgroup_memory_limit)
+            fraction = resources.memoryFraction if resources.memoryFraction is not None else DEFAULT_MEMORY_FRACTION
+            self.memory_limit_bytes = int(available * fraction)
+
+        if resources.threads is not None:
+            self.threads = resources.threads
+        else:
+            cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+            if self.cgroup_cpu_limit is not None:
+                cpus = min(cpus, math.ceil(self.cgroup_cpu_limit))
+            self.threads = max(1, cpus)
+
+        self.temp_directory = resources.tempDirectory
+        self.max_temp_directory_size_bytes = int(resources.maxTempDirectorySizeGb * 1024**3) if resources.maxTempDirectorySizeGb is not None else None
+        self.entity_memory_budget = self.memory_limit_bytes // max_parallel_entities
+
+    def duckdb_config(self) -> dict:
+        """Settings passed to duckdb.connect"""
+        config = {
+            'memory_limit': f'{self.memory_limit_bytes // 1024**2}MB',
+            'threads': self.threads,
+        }
+        if self.temp_directory is not None:
+            config['temp_directory'] = self.temp_directory
+        if self.max_temp_directory_size_bytes is not None:
+            config['max_temp_directory_size'] = f'{self.max_temp_directory_size_bytes // 1024**2}MB'
+        return config
+
+    def log_effective(self, logger = None):
+        logger = logger or self.logger
+        cgroup_memory = f"{self.cgroup_memory_limit / 1024**3:.1f}GB" if self.cgroup_memory_limit is not None else "none"
+        cgroup_cpu = f"{self.cgroup_cpu_limit:g}" if self.cgroup_cpu_limit is not None else "none"
+        logger.info(f"cgroup limits: memory={cgroup_memory}, cpu={cgroup_cpu}")
+        logger.info(f"effective duckdb settings: {self.duckdb_config()}")
+        logger.info(f"memory budget per entity: {self.entity_memory_budget / 1024**3:.2f}GB "
+                    f"({self.max_parallel_entities} entities compared concurrently)")
@@ -0,0 +1,122 @@
+import json
+import logging
+
+def sample_table_name(table_name: str) -> str:
+    return f"{table_name}_sample"
+
+def table_primary_keys(conn) -> dict:
+    """
+    Primary key columns per table, from key constraints and from the keys recorded per entity in
+    entity_compare_results. Compare tables only keep key constraints when built with primaryKeyIndex.
+
+    Args:
+        conn: DuckDB connection object
+    Returns:
+        dict: Table name to list of primary key column names
+    """
+    primary_keys = dict(conn.execute("""
+        SELECT table_name, constraint_column_names
+        FROM duckdb_constraints()
+        WHERE constraint_type = 'PRIMARY KEY' AND schema_name = 'main' AND database_name = current_database()
+    """).fetchall())
+
+    has_recorded_keys = conn.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_catalog = current_database() AND table_schema = 'main'
+        AND table_name = 'entity_compare_results' AND column_name = 'primary_keys'
+    """).fetchone()[0]
+    if has_recorded_keys:
+        for entity, keys in conn.execute("SELECT entity, primary_keys FROM entity_compare_results WHERE primary_keys IS NOT NULL").fetchall():
+            primary_keys.setdefault(f"{entity}_compare", json.loads(keys))
+    return primary_keys
+
+def create_sample(conn, table_name: str, sample_size: int, seed: int = 0, mismatches_only: bool = True, rows_per_field: int = 0) -> str:
+    """
+    Create a deterministic sample of a compare table as '{table_name}_sample', unless it already exists.
+
+    Rows are picked by a seeded hash of their primary key: the sample holds the sample_size rows with
+    the smallest hashes, so the same keys are sampled by every run and every exporter. With
+    rows_per_field, the rows_per_field smallest hashes among the rows mismatching each field are added
+    as well, so every mismatching field is represented. Building the sample costs one scan of the
+    table, or two when stratified by field.
+
+    Args:
+        conn: DuckDB connection or cursor
+        table_name (str): Compare table to sample
+        sample_size (int): Number of rows sampled by key hash
+        seed (int, optional): Seed mixed into the key hash, a different seed picks different keys. Defaults to 0.
+        mismatches_only (bool, optional): Sample only rows that are not fully matched. Defaults to True.
+        rows_per_field (int, optional): Rows added per mismatching field, 0 disables stratification. Defaults to 0.
+    Returns:
+        str: Name of the sample table
+    """
+    logger = logging.getLogger(__name__)
+    sample_table = sample_table_name(table_name)
+    exists = conn.execute(f"""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_catalog = current_database() AND table_schema = 'main' AND table_name = '{sample_table}'
+    """).fetchone()[0]
+    if exists:
+        return sample_table
+
+    columns = [name for name, in conn.execute(f"""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_catalog = current_database() AND table_schema = 'main' AND table_name = '{table_name}'
+        ORDER BY ordinal_position
+    """).fetchall()]
+    # tables without known keys are sampled by a hash of all their columns
+    keys = table_primary_keys(conn).get(table_name) or columns
+    key_columns = ", ".join(f'"{key}"' for key in keys)
+    key_hash = f"hash({key_columns}, {int(seed)})"
+    where_clause = " WHERE _full_match=0" if mismatches_only else ""
+    hashed = f"SELECT *, {key_hash} AS _sample_hash FROM {table_name}{where_clause}"
+
+    match_columns = [col for col in columns if col.endswith("_match") and col != "_full_match"] if rows_per_field > 0 else []
+    if match_columns:
+        # hash thresholds below which rows are sampled: overall and among the rows mismatching each field
+        thresholds = [f"list_last(min(_sample_hash, {int(sample_size)})) AS _threshold"]
+        conditions = ["_sample_hash <= _threshold"]
+        for i, col in enumerate(match_columns):
+            mismatch = f'NOT coalesce("{col}", FALSE)'
+            thresholds.append(f"list_last(min(_sample_hash, {int(rows_per_field)}) FILTER (WHERE {mismatch})) AS _threshold_{i}")
+            conditions.append(f"({mismatch} AND _sample_hash <= _threshold_{i})")
+        sample_query = f"""
+            WITH hashed AS ({hashed}),
+            thresholds AS (SELECT {', '.join(thresholds)} FROM hashed)
+            SELECT hashed.* EXCLUDE (_sample_hash) FROM hashed, thresholds
+            WHERE {' OR '.join(conditions)}
+            ORDER BY _sample_hash"""
+    else:
+        sample_query = f"SELECT * EXCLUDE (_sample_hash) FROM ({hashed}) ORDER BY _sample_hash LIMIT {int(sample_size)}"
+
+    logger.info(f"sampling {sample_size} rows from {table_name} by primary key hash {keys}, seed={seed}, rows_per_field={rows_per_field}")
+    conn.execute(f"CREATE TABLE {sample_table} AS {sample_query}")
+    return sample_table
+
+def create_samples(conn, sample_size: int, seed: int = 0, mismatches_only: bool = True, rows_per_field: int = 0, table_filter = None) -> list:
+    """
+    Create the deterministic samples of all compare tables once, for every exporter to reuse.
+    See create_sample.
+
+    Args:
+        conn: DuckDB connection object
+        sample_size (int): Number of rows sampled by key hash. If <= 0, no samples are created.
+        seed (int, optional): Seed mixed into the key hash. Defaults to 0.
+        mismatches_only (bool, optional): Sample only rows that are not fully matched. Defaults to True.
+        rows_per_field (int, optional): Rows added per mismatching field, 0 disables stratification. Defaults to 0.
+        table_filter (callable, optional): Function to filter which compare tables to sample.
+            If None, every table ending with '_compare' is sampled. Defaults to None.
+    Returns:
+        list: Names of the sample tables
+    """
+    if sample_size <= 0:
+        return []
+    if table_filter is None:
+        table_filter = lambda table: table.endswith("_compare")
+    tables = conn.execute("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_catalog = current_database() AND table_schema = 'main'
+        AND table_type IN ('BASE TABLE', 'VIEW')
+    """).fetchall()
+    return [create_sample(conn, name, sample_size, seed, mismatches_only, rows_per_field)
+            for name, in tables if table_filter(name)]
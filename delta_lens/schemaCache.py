@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import uuid
+import duckdb
+
+# read_csv options taken from sniff_csv, quoting falls back to the RFC 4180 defaults when the sniffed
+# sample had no quotes, so later files with quoted values are still read correctly
+_DIALECT_OPTIONS = {
+    'Delimiter': 'delim',
+    'Quote': 'quote',
+    'Escape': 'escape',
+    'NewLineDelimiter': 'new_line',
+    'SkipRows': 'skip',
+    'Comment': 'comment',
+    'HasHeader': 'header',
+    'DateFormat': 'dateformat',
+    'TimestampFormat': 'timestampformat',
+}
+_DEFAULT_QUOTE = '"'
+
+def sniff_csv_schema(con, path: str, sample_size: int = None) -> dict:
+    """
+    Sniff the dialect and column types of a CSV file with DuckDB's sniffer.
+
+    Args:
+        con: DuckDB connection or cursor
+        path (str): Path of the CSV file
+        sample_size (int, optional): Number of rows sampled, -1 for the whole file. Defaults to DuckDB's sample size.
+    Returns:
+        dict: 'options' holding the read_csv dialect options and 'columns' mapping column names to types
+    """
+    if sample_size is None:
+        cursor = con.execute("SELECT * FROM sniff_csv(?)", [path])
+    else:
+        cursor = con.execute("SELECT * FROM sniff_csv(?, sample_size=?)", [path, sample_size])
+    names = [d[0] for d in cursor.description]
+    sniffed = dict(zip(names, cursor.fetchone()))
+    options = {}
+    for field, option in _DIALECT_OPTIONS.items():
+        value = sniffed.get(field)
+        if option in ('quote', 'escape') and value in ('\x00', ''):
+            value = _DEFAULT_QUOTE
+        if value is None or value == '\x00':
+            continue
+        options[option] = value
+    return {'options': options, 'columns': {column['name']: column['type'] for column in sniffed['Columns']}}
+
+def csv_read_options(schema: dict, column_types: dict = None) -> dict:
+    """
+    read_csv options reading a file with a known schema without sniffing it.
+
+    Args:
+        schema (dict): Output of sniff_csv_schema
+        column_types (dict, optional): Pinned column types overriding the sniffed ones
+    Returns:
+        dict: Named read_csv parameters, see inputFormats.scan_expression
+    """
+    pinned = {column: type for column, type in (column_types or {}).items() if column in schema['columns']}
+    return {'auto_detect': False, **schema['options'], 'columns': {**schema['columns'], **pinned}}
+
+def schema_drift(previous: dict, current: dict) -> list:
+    """Describe the column changes between two schemas, empty when they have the same columns and types"""
+    changes = []
+    for column, type in current['columns'].items():
+        if column not in previous['columns']:
+            changes.append(f"added {column} {type}")
+        elif previous['columns'][column] != type:
+            changes.append(f"{column} {previous['columns'][column]} -> {type}")
+    changes += [f"removed {column}" for column in previous['columns'] if column not in current['columns']]
+    return changes
+
+class SchemaCache:
+    """
+    A JSON file of the sniffed schemas of CSV inputs, reused across runs so inputs are read with
+    explicit column types and dialect instead of being sniffed again.
+
+    Schemas are kept per entity side, so daily files with changing names reuse the schema of the
+    previous day. Before a cached schema is used, the header of the current file is read and
+    checked against it (only the number of columns for files without a header); a file whose
+    columns changed is sniffed again and the differences are logged as schema drift. A file
+    holding values the cached types cannot read is sniffed again from the whole file, once.
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file, created on the first store
+    Notes
+    -----
+    - The cache is safe to share between entities compared concurrently
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._schemas = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._schemas = json.load(f)
+
+    def lookup(self, key: str):
+        with self._lock:
+            return self._schemas.get(key)
+
+    def store(self, key: str, schema: dict):
+        with self._lock:
+            self._schemas[key] = schema
+            # written to a temporary file first so a failed run never leaves a truncated cache behind
+            temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'w') as f:
+                # column order is significant, read_csv assigns the columns by position
+                json.dump(self._schemas, f, indent=2)
+            os.replace(temp_path, self.path)
+
+    def resolve(self, con, key: str, path: str) -> dict:
+        """
+        Schema of a CSV input, from the cache when the header of the file still matches it,
+        otherwise sniffed and stored.
+
+        Args:
+            con: DuckDB connection or cursor
+            key (str): Cache key of the input, e.g. 'trade.legacy'
+            path (str): Path of the CSV file (the first file of a sharded input)
+        Returns:
+            dict: Schema as returned by sniff_csv_schema
+        """
+        cached = self.lookup(key)
+        if cached is not None and _header_matches(con, path, cached):
+            self.logger.info(f"schema cache hit for [{key}]: {len(cached['columns'])} columns")
+            return cached
+        schema = sniff_csv_schema(con, path)
+        if cached is not None:
+            self.logger.warning(f"schema of [{key}] changed since it was cached: {'; '.join(schema_drift(cached, schema)) or 'dialect changed'}")
+        self.store(key, schema)
+        return schema
+
+    def refresh(self, con, key: str, path: str) -> dict:
+        """
+        Sniff a CSV input again from the whole file, after it failed to load with its cached schema.
+
+        Args:
+            con: DuckDB connection or cursor
+            key (str): Cache key of the input, e.g. 'trade.legacy'
+            path (str): Path of the CSV file (the first file of a sharded input)
+        Returns:
+            dict: Schema as returned by sniff_csv_schema
+        """
+        schema = sniff_csv_schema(con, path, sample_size=-1)
+        cached = self.lookup(key)
+        if cached is not None:
+            self.logger.warning(f"schema of [{key}] sniffed again from the whole file: {'; '.join(schema_drift(cached, schema)) or 'no column changes'}")
+        self.store(key, schema)
+        return schema
+
+def _header_matches(con, path: str, schema: dict) -> bool:
+    # reads the first line only, as text with the cached dialect, a different number of columns fails to read
+    options = schema['options']
+    names = list(schema['columns'])
+    columns = "{" + ", ".join(f"'c{i}': 'VARCHAR'" for i in range(len(names))) + "}"
+    try:
+        header = con.execute(f"""SELECT * FROM read_csv(?, auto_detect=false, header=false, skip=?, delim=?, quote=?, escape=?,
+                                 columns={columns}) LIMIT 1""",
+                             [path, options.get('skip', 0), options['delim'], options['quote'], options['escape']]).fetchone()
+    except duckdb.Error:
+        return False
+    # without a header line only the number of columns can be checked
+    return header is not None and (not options.get('header') or list(header) == names)
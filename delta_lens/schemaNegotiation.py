@@ -0,0 +1,85 @@
+import duckdb
+
+TYPE_WIDENINGS_TABLE = "entity_type_widenings"
+
+# integer and decimal types whose values are not all exactly representable as a DOUBLE
+_INEXACT_AS_DOUBLE = ('BIGINT', 'UBIGINT', 'HUGEINT', 'UHUGEINT')
+
+def create_type_widenings_table(conn):
+    conn.execute(f"""CREATE TABLE {TYPE_WIDENINGS_TABLE} (entity VARCHAR, column_name VARCHAR, left_type VARCHAR,
+        right_type VARCHAR, negotiated_type VARCHAR, lossy BOOLEAN)""")
+
+def record_type_widenings(conn, entity_name, widenings):
+    """Insert the widenings of a negotiation into the entity_type_widenings table"""
+    if not widenings:
+        return
+    conn.executemany(
+        f"INSERT INTO {TYPE_WIDENINGS_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+        [[entity_name, w['column_name'], w['left_type'], w['right_type'], w['negotiated_type'], w['lossy']] for w in widenings]
+    )
+
+def common_supertype(conn, left_type: str, right_type: str) -> str:
+    """
+    The type DuckDB implicitly casts both types to, VARCHAR when there is none (e.g. BIGINT and VARCHAR).
+
+    Args:
+        conn: DuckDB connection or cursor
+        left_type (str): Type of the column on the left side
+        right_type (str): Type of the column on the right side
+    Returns:
+        str: The common supertype
+    """
+    if left_type == right_type:
+        return left_type
+    try:
+        return conn.execute(f"SELECT typeof([NULL::{left_type}, NULL::{right_type}][1])").fetchone()[0]
+    except duckdb.Error:
+        return 'VARCHAR'
+
+def is_lossy(source_type: str, target_type: str) -> bool:
+    """
+    Whether widening a column to target_type can change how its values compare: text loses the
+    ordering and formatting of typed values, floating point loses digits of large integers and decimals.
+    """
+    if source_type == target_type:
+        return False
+    if target_type == 'VARCHAR':
+        return True
+    if target_type in ('DOUBLE', 'FLOAT'):
+        inexact = _INEXACT_AS_DOUBLE + (('INTEGER', 'UINTEGER', 'DOUBLE') if target_type == 'FLOAT' else ())
+        return source_type in inexact or source_type.startswith('DECIMAL')
+    return False
+
+def negotiate_types(conn, left_columns: dict, right_columns: dict) -> list:
+    """
+    Work out a common type for each column both sides share with a different type.
+
+    Args:
+        conn: DuckDB connection or cursor
+        left_columns (dict): Column name to type of the left side
+        right_columns (dict): Column name to type of the right side
+    Returns:
+        list: One dict per widened column with column_name, left_type, right_type, negotiated_type
+              and lossy, in left side column order
+    """
+    widenings = []
+    for column, left_type in left_columns.items():
+        right_type = right_columns.get(column)
+        if right_type is None or right_type == left_type:
+            continue
+        negotiated = common_supertype(conn, left_type, right_type)
+        widenings.append({
+            'column_name': column,
+            'left_type': left_type,
+            'right_type': right_type,
+            'negotiated_type': negotiated,
+            'lossy': is_lossy(left_type, negotiated) or is_lossy(right_type, negotiated),
+        })
+    return widenings
+
+def cast_columns(source: str, casts: dict) -> str:
+    """Wrap a table expression so the given columns are cast to their negotiated types while it is scanned"""
+    if not casts:
+        return source
+    replacements = ", ".join(f'CAST("{column}" AS {type}) AS "{column}"' for column, type in casts.items())
+    return f"(SELECT * REPLACE ({replacements}) FROM {source})"
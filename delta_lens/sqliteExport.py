@@ -2,8 +2,119 @@ import duckdb
 import logging
 from pathlib import Path
 import os
+import sqlite3
+from .sampling import create_sample, table_primary_keys
 
-def export_to_sqlite(conn, sqlite_db_path: str, sample_threshold = 10000, table_filter = None, mismatches_only = True):  
+# SQLite affinity of DuckDB types exported as is, all other types are exported as TEXT
+_SQLITE_AFFINITY = {
+    'BOOLEAN': 'INTEGER', 'TINYINT': 'INTEGER', 'SMALLINT': 'INTEGER', 'INTEGER': 'INTEGER', 'BIGINT': 'INTEGER',
+    'UTINYINT': 'INTEGER', 'USMALLINT': 'INTEGER', 'UINTEGER': 'INTEGER',
+    'FLOAT': 'REAL', 'DOUBLE': 'REAL',
+    'VARCHAR': 'TEXT', 'BLOB': 'BLOB',
+}
+
+def _export_column(column_name, data_type):
+    """SQLite column definition and DuckDB select expression of an exported column"""
+    quoted = f'"{column_name}"'
+    if data_type in _SQLITE_AFFINITY:
+        return f'{quoted} {_SQLITE_AFFINITY[data_type]}', quoted
+    if data_type.startswith('DECIMAL'):
+        return f'{quoted} REAL', f'CAST({quoted} AS DOUBLE) AS {quoted}'
+    # temporal, nested and 128 bit integer types have no SQLite equivalent
+    return f'{quoted} TEXT', f'CAST({quoted} AS VARCHAR) AS {quoted}'
+
+class SqliteExporter:
+    """
+    Incremental export of DuckDB tables into a SQLite database, used by export_to_sqlite and by the
+    export pipeline to add the tables of each entity as soon as its comparison completes.
+    Parameters
+    ----------
+    sqlite_db_path : str
+        Path to the SQLite database file to create
+    sample_threshold : int, optional
+        Maximum number of rows sampled from compare tables, see sampling.create_sample. An existing
+        '{table}_sample' table is exported instead. If <= 0, no sampling is performed (default is 10000)
+    mismatches_only : bool, optional
+        Export only mismatched rows of the compare tables (default is True)
+    batch_size : int, optional
+        Rows fetched from DuckDB and inserted into SQLite per batch (default is 100000)
+    Notes
+    -----
+    - Rows are bulk loaded with journaling and syncing disabled, one transaction per table.
+      A failed export leaves an incomplete file behind
+    - Indexes on the primary keys and on _full_match are created after loading each table
+    """
+    def __init__(self, sqlite_db_path: str, sample_threshold = 10000, mismatches_only = True, batch_size = 100000):
+        # Check if SQLite file exists and raise error
+        if os.path.exists(sqlite_db_path):
+            raise FileExistsError(f"SQLite database file '{sqlite_db_path}' already exists")
+        self.logger = logging.getLogger(__name__)
+        self.sqlite_db_path = sqlite_db_path
+        self.sample_threshold = sample_threshold
+        self.mismatches_only = mismatches_only
+        self.batch_size = batch_size
+
+        self.sqlite_con = sqlite3.connect(sqlite_db_path, isolation_level=None, check_same_thread=False)
+        # bulk load tuning, the file is only usable once the export completed
+        self.sqlite_con.execute("PRAGMA journal_mode = OFF")
+        self.sqlite_con.execute("PRAGMA synchronous = OFF")
+        self.sqlite_con.execute("PRAGMA temp_store = MEMORY")
+        self.sqlite_con.execute("PRAGMA cache_size = -262144")
+
+    def export_tables(self, conn, tables):
+        """Export the given DuckDB tables, conn is a DuckDB connection or cursor"""
+        duck_con = conn
+        sqlite_con = self.sqlite_con
+        primary_keys = table_primary_keys(duck_con)
+
+        for table_name in tables:
+            self.logger.info(f"Exporting table: {table_name}")
+
+            columns = duck_con.execute(f"""
+                SELECT column_name, data_type
+                FROM information_schema.columns
+                WHERE table_catalog = current_database() AND table_schema = 'main' AND table_name = '{table_name}'
+                ORDER BY ordinal_position
+            """).fetchall()
+            column_definitions, select_expressions = zip(*[_export_column(name, data_type) for name, data_type in columns])
+
+            source_table = table_name
+            if table_name.endswith("_compare") and self.sample_threshold > 0:
+                # deterministic sample shared with the other exporters
+                source_table = create_sample(duck_con, table_name, self.sample_threshold, mismatches_only=self.mismatches_only)
+            query = f"SELECT {', '.join(select_expressions)} FROM main.{source_table}"
+            if table_name.endswith("_compare") and self.mismatches_only:
+                query += " WHERE _full_match=0"
+
+            sqlite_con.execute(f'CREATE TABLE "{table_name}" ({", ".join(column_definitions)})')
+            insert_statement = f'INSERT INTO "{table_name}" VALUES ({", ".join(["?"] * len(columns))})'
+
+            row_count = 0
+            result = duck_con.execute(query)
+            sqlite_con.execute("BEGIN")
+            while True:
+                rows = result.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                sqlite_con.executemany(insert_statement, rows)
+                row_count += len(rows)
+            sqlite_con.execute("COMMIT")
+            self.logger.info(f"Exported {row_count} rows from {table_name}")
+
+            # indexes are built once after loading instead of being maintained during inserts
+            column_names = {name for name, _ in columns}
+            keys = [key for key in primary_keys.get(table_name, []) if key in column_names]
+            if keys:
+                key_columns = ", ".join(f'"{key}"' for key in keys)
+                sqlite_con.execute(f'CREATE INDEX "{table_name}_pk" ON "{table_name}" ({key_columns})')
+            if table_name.endswith("_compare") and "_full_match" in column_names:
+                sqlite_con.execute(f'CREATE INDEX "{table_name}_full_match" ON "{table_name}" ("_full_match")')
+
+    def close(self):
+        self.sqlite_con.close()
+        return self.sqlite_db_path
+
+def export_to_sqlite(conn, sqlite_db_path: str, sample_threshold = 10000, table_filter = None, mismatches_only = True, batch_size = 100000):  
     """
     Export tables from DuckDB to SQLite database with optional sampling.
     This function exports selected tables from a DuckDB connection to a SQLite database. It supports filtering
@@ -11,16 +122,20 @@ def export_to_sqlite(conn, sqlite_db_path: str, sample_threshold = 10000, table_
     Args:
         conn: DuckDB connection object
         sqlite_db_path (str): Path to the SQLite database file to export to
-        sample_threshold (int, optional): Maximum number of rows to sample from large tables. 
-            If <= 0, no sampling is performed. Defaults to 10000.
+        sample_threshold (int, optional): Maximum number of rows sampled from compare tables, see
+            sampling.create_sample. If <= 0, no sampling is performed. Defaults to 10000.
         table_filter (callable, optional): Function to filter which tables to export.
             Takes table name as input and returns boolean. If None, exports tables ending with 
             '_compare_field_summary', 'entity_compare_results', or '_compare'. Defaults to None.
+        mismatches_only (bool, optional): Export only mismatched rows of the compare tables. Defaults to True.
+        batch_size (int, optional): Rows fetched from DuckDB and inserted into SQLite per batch. Defaults to 100000.
     Returns:
         str: Path to the created SQLite database file
     Notes:
         - Function will create tables in SQLite database matching the source tables in DuckDB
-        - For tables with more rows than sample_threshold, random sampling is used
+        - Compare tables with more rows than sample_threshold are sampled by primary key hash. An existing
+          '{table}_sample' table, e.g. created by sampling.create_samples, is exported instead
+        - See SqliteExporter for the bulk load settings and indexes
     """
     logger = logging.getLogger(__name__)
     # Check if SQLite file exists and raise error
@@ -29,67 +144,20 @@ def export_to_sqlite(conn, sqlite_db_path: str, sample_threshold = 10000, table_
 
     if table_filter is None:
         table_filter = lambda table: table.endswith("_compare_field_summary") or table.endswith("entity_compare_results") or  table.endswith("_compare")
-    
-    duck_con = conn
-    try:   
-            # Attach SQLite database
-        duck_con.execute(f"ATTACH '{sqlite_db_path}' AS sqlite_db (TYPE SQLITE);")
-        
-        # Get list of tables and their primary keys from DuckDB
-        tables_info = duck_con.execute("""
-            SELECT 
-                t.table_name,
-                ARRAY_AGG(c.column_name) FILTER (WHERE c.is_key = true) as primary_keys
-            FROM information_schema.tables t
-            LEFT JOIN (
-                SELECT tc.table_name, cc.column_name, 
-                        CASE WHEN tc.constraint_type = 'PRIMARY KEY' THEN true ELSE false END as is_key
-                FROM information_schema.table_constraints tc
-                JOIN information_schema.constraint_column_usage cc 
-                    ON tc.constraint_name = cc.constraint_name
-                    AND tc.table_name = cc.table_name
-            ) c ON t.table_name = c.table_name
-            WHERE t.table_schema = 'main'
-            AND t.table_type IN ('BASE TABLE', 'VIEW')
-            GROUP BY t.table_name
-        """).fetchall()
-        
-        tables = [(name, pks) for name, pks in tables_info if (table_filter is None or table_filter(name))]
-        logger.info(f"Found {len(tables)} tables to export")
-        
-        for table_name, primary_keys in tables:
-            
-                logger.info(f"Exporting table: {table_name}")
-                
-                # Get column definitions including types
-                columns = duck_con.execute(f"""
-                    SELECT column_name, data_type 
-                    FROM information_schema.columns 
-                    WHERE table_name = '{table_name}'
-                    ORDER BY ordinal_position
-                """).fetchall()
-                
-                plain_create_statement = f"CREATE TABLE sqlite_db.{table_name} AS SELECT * FROM main.{table_name}"
-
-                if sample_threshold <= 0:
-                    duck_con.execute(plain_create_statement)
-                else:
-                    row_count = duck_con.execute(f"SELECT COUNT(*) FROM main.{table_name}").fetchone()[0]
-                    if row_count > sample_threshold:
-                        logger.info(f"sampling {sample_threshold} rows from {table_name}")
-
-                        if table_name.endswith("_compare") and mismatches_only:
-                            duck_con.execute(f"CREATE TABLE sqlite_db.{table_name} AS SELECT * FROM main.{table_name} WHERE _full_match=0  USING SAMPLE {sample_threshold};")
-                        else:
-                            duck_con.execute(f"CREATE TABLE sqlite_db.{table_name} AS SELECT * FROM main.{table_name} USING SAMPLE {sample_threshold};")
-                    else:
-                        duck_con.execute(plain_create_statement)
-            
-            
-                row_count = duck_con.execute(f"SELECT COUNT(*) FROM sqlite_db.{table_name}").fetchone()[0]
-                logger.info(f"Exported {row_count} rows from {table_name}")
-    finally:      
-        duck_con.execute("DETACH sqlite_db")
+
+    tables = conn.execute("""
+        SELECT table_name
+        FROM information_schema.tables
+        WHERE table_catalog = current_database() AND table_schema = 'main'
+        AND table_type IN ('BASE TABLE', 'VIEW')
+    """).fetchall()
+    tables = [name[0] for name in tables if table_filter(name[0])]
+    logger.info(f"Found {len(tables)} tables to export")
+
+    exporter = SqliteExporter(sqlite_db_path, sample_threshold, mismatches_only, batch_size)
+    try:
+        exporter.export_tables(conn, tables)
+    finally:
+        exporter.close()
 
     return sqlite_db_path
-    
\ No newline at end of file
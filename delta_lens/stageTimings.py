@@ -0,0 +1,154 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+STAGE_TIMINGS_TABLE = "entity_stage_timings"
+
+def create_stage_timings_table(conn):
+    conn.execute(f"""CREATE TABLE {STAGE_TIMINGS_TABLE} (entity VARCHAR, stage VARCHAR, started_at TIMESTAMP,
+        elapsed_seconds DOUBLE, rows BIGINT, peak_memory_bytes BIGINT, profile_paths VARCHAR[])""")
+
+def record_stage_timings(conn, timings):
+    """Insert the stage records of a StageTimer into the entity_stage_timings table"""
+    if not timings:
+        return
+    conn.executemany(
+        f"INSERT INTO {STAGE_TIMINGS_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [[t['entity'], t['stage'], t['started_at'], t['elapsed_seconds'], t['rows'], t['peak_memory_bytes'], t['profile_paths'] or None]
+         for t in timings]
+    )
+
+def table_rows(conn, table_name):
+    """Row count of a table from the catalog without scanning it, None for views"""
+    rows = conn.execute("""
+        SELECT estimated_size FROM duckdb_tables()
+        WHERE database_name = current_database() AND schema_name = 'main' AND table_name = ?""", [table_name]).fetchone()
+    return rows[0] if rows else None
+
+def hot_spots(conn, limit = 10):
+    """
+    Slowest entity stages of a run, ranked by wall time.
+
+    Args:
+        conn: DuckDB connection holding the entity_stage_timings table
+        limit (int, optional): Number of stages returned. Defaults to 10.
+    Returns:
+        list: (entity, stage, elapsed_seconds, rows, peak_memory_bytes, share of the total stage time) tuples
+    """
+    return conn.execute(f"""
+        SELECT entity, stage, elapsed_seconds, rows, peak_memory_bytes,
+               elapsed_seconds / nullif(SUM(elapsed_seconds) OVER (), 0) AS share
+        FROM {STAGE_TIMINGS_TABLE}
+        ORDER BY elapsed_seconds DESC
+        LIMIT {limit}""").fetchall()
+
+def format_hot_spots(spots):
+    """Render hot_spots() as a text table"""
+    lines = [f"{'entity':<30} {'stage':<22} {'seconds':>9} {'share':>6} {'rows':>12} {'rows/s':>12} {'peak MB':>9}"]
+    for entity, stage, elapsed, rows, peak_memory, share in spots:
+        rate = f"{rows / elapsed:,.0f}" if rows is not None and elapsed else ""
+        lines.append(f"{entity:<30} {stage:<22} {elapsed:>9.3f} {(share or 0):>6.1%} "
+                     f"{'' if rows is None else f'{rows:,}':>12} {rate:>12} "
+                     f"{'' if peak_memory is None else f'{peak_memory / 1024**2:,.0f}':>9}")
+    return "\n".join(lines)
+
+class _PeakMemoryMonitor:
+    # polls the memory held by DuckDB on its own cursor while a stage runs
+    def __init__(self, conn, interval):
+        self.cursor = conn.cursor()
+        self.interval = interval
+        self.peak = self.__sample()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.__run, name="PeakMemoryMonitor", daemon=True)
+        self._thread.start()
+
+    def __sample(self):
+        return self.cursor.execute("SELECT SUM(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0] or 0
+
+    def __run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, self.__sample())
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.__sample())
+        self.cursor.close()
+        return self.peak
+
+class StageTimer:
+    """
+    Records wall time, rows and peak DuckDB memory of the stages of one entity, such as parsing,
+    primary key indexes, transforms, the join, the summary and the export.
+
+    Stages are timed with the stage() context manager, which yields the stage record so the caller
+    can set its row count. Statements run through execute() also save DuckDB's JSON query profile
+    to profile_dir when profiling is enabled.
+    Parameters
+    ----------
+    conn : duckdb.DuckDBPyConnection
+        Cursor the entity runs its statements on
+    entity_name : str
+        Entity the stages belong to
+    profile_dir : str, optional
+        Directory JSON query profiles are written to as '{entity}_{name}.json' (default is None, no profiling)
+    memory_poll_interval : float, optional
+        Seconds between samples of the DuckDB memory usage while a stage runs (default is 0.05)
+    Attributes
+    ----------
+    timings : list
+        Stage records (entity, stage, started_at, elapsed_seconds, rows, peak_memory_bytes, profile_paths),
+        see record_stage_timings
+    Notes
+    -----
+    - Memory is sampled from duckdb_memory(), which covers the whole database. With entities compared
+      concurrently, the peak of a stage includes the memory held by the other entities
+    """
+    def __init__(self, conn, entity_name: str, profile_dir: str = None, memory_poll_interval = 0.05):
+        self.logger = logging.getLogger(self.__class__.__name__ + "[" + entity_name + "]")
+        self.conn = conn
+        self.entity_name = entity_name
+        self.profile_dir = profile_dir
+        self.memory_poll_interval = memory_poll_interval
+        self.timings = []
+
+    @contextmanager
+    def stage(self, stage: str):
+        record = {'entity': self.entity_name, 'stage': stage, 'started_at': datetime.now(), 'elapsed_seconds': None,
+                  'rows': None, 'peak_memory_bytes': None, 'profile_paths': []}
+        monitor = _PeakMemoryMonitor(self.conn, self.memory_poll_interval)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['elapsed_seconds'] = time.perf_counter() - start
+            record['peak_memory_bytes'] = monitor.stop()
+            self.timings.append(record)
+            self.logger.info(f"stage {stage} took {record['elapsed_seconds']:.3f}s, rows={record['rows']}")
+
+    def execute(self, record, statement: str, profile_name: str = None):
+        """
+        Execute a statement of the stage, saving its JSON query profile when profiling is enabled.
+
+        Args:
+            record (dict): Stage record yielded by stage()
+            statement (str): SQL statement
+            profile_name (str, optional): Profile file name suffix. Defaults to the stage name.
+        Returns:
+            list: Result rows, for CREATE TABLE AS and INSERT the number of rows written
+        """
+        if self.profile_dir is None:
+            return self.conn.execute(statement).fetchall()
+        profile_path = os.path.join(self.profile_dir, f"{self.entity_name}_{profile_name or record['stage']}.json")
+        self.conn.execute("SET enable_profiling = 'json'")
+        self.conn.execute(f"SET profiling_output = '{profile_path}'")
+        try:
+            # the profile is written when the statement completes
+            result = self.conn.execute(statement).fetchall()
+        finally:
+            self.conn.execute("PRAGMA disable_profiling")
+        record['profile_paths'].append(profile_path)
+        return result
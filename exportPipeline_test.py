@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+import pytest
+from delta_lens.deltaLens import DeltaLens
+from delta_lens.config import Config, Entity, Side
+from delta_lens.exportPipeline import ExportPipeline
+from delta_lens.sqliteExport import SqliteExporter
+from delta_lens.parquetExport import ParquetExporter
+
+@pytest.fixture
+def three_entity_config(tmp_path):
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    left_file.write_text("trade_id,price\n1,1.0\n2,2.0\n3,3.0\n")
+    right_file.write_text("trade_id,price\n1,1.0\n2,2.5\n4,4.0\n")
+    return Config(
+        entities=[
+            Entity(
+                entityName=name,
+                leftSide=Side(title="s1", inputFile=str(left_file)),
+                rightSide=Side(title="s2", inputFile=str(right_file)),
+                primaryKeys=["trade_id"]
+            )
+            for name in ("trade_a", "trade_b", "trade_c")
+        ]
+    )
+
+class RecordingExporter:
+    """Records exported tables, optionally blocking until released or failing"""
+    def __init__(self, release = None, fail = False):
+        self.exported = []
+        self.closed = False
+        self.release = release
+        self.fail = fail
+
+    def export_tables(self, conn, tables):
+        if self.release is not None:
+            self.release.wait(timeout=10)
+        if self.fail:
+            raise RuntimeError("export failed")
+        self.exported += tables
+
+    def close(self):
+        self.closed = True
+
+def test_pipeline_exports_every_entity(three_entity_config, tmp_path):
+    sqlite_path = str(tmp_path / "run.sqlite")
+    parquet_dir = str(tmp_path / "parquet")
+    lens = DeltaLens("test_pipeline", three_entity_config, max_parallel_entities=2)
+    exporters = [SqliteExporter(sqlite_path, sample_threshold=0), ParquetExporter(parquet_dir)]
+
+    with ExportPipeline(lens.con, exporters, sample_threshold=10) as pipeline:
+        lens.execute(continue_on_error=False, on_entity_complete=pipeline.entity_completed)
+
+    con = sqlite3.connect(sqlite_path)
+    tables = {name for name, in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+    assert con.execute("SELECT COUNT(*) FROM entity_compare_results").fetchone()[0] == 3
+    con.close()
+    expected = {"entity_compare_results", "entity_stage_timings", "entity_type_widenings"} | {f"{name}_compare{suffix}" for name in ("trade_a", "trade_b", "trade_c") for suffix in ("", "_field_summary")}
+    assert tables == expected
+    assert set(os.listdir(parquet_dir)) == {f"{name}.parquet" for name in expected}
+    # samples were created once per entity by the pipeline
+    samples = lens.con.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_name LIKE '%_compare_sample'").fetchone()[0]
+    assert samples == 3
+    exports = lens.con.execute("SELECT entity, rows FROM entity_stage_timings WHERE stage = 'export' ORDER BY entity").fetchall()
+    assert exports == [("trade_a", 4), ("trade_b", 4), ("trade_c", 4)]
+
+def test_pipeline_without_exporters_skips_sampling(three_entity_config):
+    lens = DeltaLens("test_pipeline_no_exporters", three_entity_config)
+
+    with ExportPipeline(lens.con, [], sample_threshold=10) as pipeline:
+        lens.execute(continue_on_error=False, on_entity_complete=pipeline.entity_completed)
+
+    samples = lens.con.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_name LIKE '%_compare_sample'").fetchone()[0]
+    assert samples == 0
+
+def test_pipeline_applies_back_pressure(three_entity_config):
+    release = threading.Event()
+    exporter = RecordingExporter(release)
+    lens = DeltaLens("test_back_pressure", three_entity_config)
+    completed = []
+
+    def entity_completed(name):
+        completed.append(name)
+        pipeline.entity_completed(name)
+
+    with ExportPipeline(lens.con, [exporter], max_pending=1) as pipeline:
+        runner = threading.Thread(target=lens.execute, kwargs={'on_entity_complete': entity_completed})
+        runner.start()
+        runner.join(timeout=2)
+        # one entity is being exported, one waits in the queue, the third is held back
+        assert runner.is_alive()
+        assert len(completed) == 3
+        release.set()
+        runner.join()
+
+    assert exporter.exported[-3:] == ["entity_compare_results", "entity_stage_timings", "entity_type_widenings"]
+    assert exporter.closed
+
+def test_pipeline_raises_export_errors(three_entity_config):
+    exporter = RecordingExporter(fail=True)
+    lens = DeltaLens("test_export_error", three_entity_config)
+
+    with pytest.raises(RuntimeError, match="export failed"):
+        with ExportPipeline(lens.con, [exporter]) as pipeline:
+            lens.execute(on_entity_complete=pipeline.entity_completed)
+    assert exporter.closed
@@ -0,0 +1,155 @@
+import os
+import pytest
+import duckdb
+from delta_lens.ingestCache import IngestCache
+from delta_lens.deltaLens import DeltaLens
+from delta_lens.config import Config, Entity, Side, Transform, ReferenceDataset, CompareRule
+
+@pytest.fixture
+def input_files(tmp_path):
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    ref_file = tmp_path / "ref.csv"
+    left_file.write_text("trade_id,symbol,price\n1,AAPL,150.0\n2,GOOGL,2500.0\n")
+    right_file.write_text("trade_id,symbol,price\n1,AAPL,151.0\n2,GOOGL,2500.0\n")
+    ref_file.write_text("symbol,sector\nAAPL,Technology\n")
+    return {'left': str(left_file), 'right': str(right_file), 'ref': str(ref_file)}
+
+def cache_entries(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".parquet"))
+
+def test_file_key_modes(input_files, tmp_path):
+    content_cache = IngestCache(str(tmp_path / "content"))
+    stat_cache = IngestCache(str(tmp_path / "stat"), key_mode='stat')
+
+    assert content_cache.file_key(input_files['left']) != content_cache.file_key(input_files['right'])
+    assert content_cache.file_key(input_files['left']) != content_cache.file_key(input_files['left'], 'parquet')
+    assert stat_cache.file_key(input_files['left']) != content_cache.file_key(input_files['left'])
+
+def test_invalid_key_mode(tmp_path):
+    with pytest.raises(ValueError, match="Invalid cache key mode"):
+        IngestCache(str(tmp_path), key_mode='mtime')
+
+def test_cached_scan_reuses_parsed_copy(input_files, tmp_path):
+    cache = IngestCache(str(tmp_path / "cache"))
+    con = duckdb.connect()
+
+    first = cache.cached_scan(con, input_files['left'])
+    second = IngestCache(str(tmp_path / "cache")).cached_scan(con, input_files['left'])
+
+    assert first == second
+    assert len(cache_entries(cache.cache_dir)) == 1
+    assert con.execute(f"SELECT COUNT(*) FROM {second}").fetchone()[0] == 2
+
+def test_evicts_least_recently_used(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    con = duckdb.connect()
+    writer = IngestCache(cache_dir)
+    for key in ("a", "b", "c"):
+        writer.store(con, "SELECT range FROM range(1000)", key)
+    entry_size = os.path.getsize(os.path.join(cache_dir, "a.parquet"))
+    os.utime(os.path.join(cache_dir, "a.parquet"), (1, 1))
+
+    IngestCache(cache_dir, max_size_bytes=entry_size * 2).evict()
+
+    assert cache_entries(cache_dir) == ["b.parquet", "c.parquet"]
+
+def test_compare_with_cache(input_files, tmp_path, caplog):
+    cache_dir = str(tmp_path / "cache")
+
+    def run(name):
+        config = Config(
+            reference_datasets=[ReferenceDataset(datasetName="sectors", inputFile=input_files['ref'])],
+            entities=[
+                Entity(
+                    entityName="trade",
+                    leftSide=Side(
+                        title="system_1",
+                        inputFile=input_files['left'],
+                        transform=Transform(query="SELECT t.* FROM trade_system_1 t JOIN sectors USING (symbol)", cached=True)
+                    ),
+                    rightSide=Side(title="system_2", inputFile=input_files['right']),
+                    primaryKeys=["trade_id"]
+                )
+            ]
+        )
+        lens = DeltaLens(name, config, cache=IngestCache(cache_dir))
+        lens.execute(continue_on_error=False)
+        return lens.con.execute("SELECT * FROM trade_compare ORDER BY trade_id").fetchall()
+
+    first = run("test_cache_cold")
+    entries = cache_entries(cache_dir)
+    # left, right, reference dataset and the cached transform
+    assert len(entries) == 4
+
+    caplog.clear()
+    assert run("test_cache_warm") == first
+    assert cache_entries(cache_dir) == entries
+    assert "cache miss" not in caplog.text
+    assert "loading transform result from cache" in caplog.text
+
+def test_dependency_settings_invalidate_cached_transform(input_files, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+
+    def run(name, compare_rules):
+        config = Config(entities=[
+            Entity(
+                entityName="trade",
+                leftSide=Side(title="system_1", inputFile=input_files['left']),
+                rightSide=Side(title="system_2", inputFile=input_files['right']),
+                primaryKeys=["trade_id"],
+                compareRules=compare_rules
+            ),
+            Entity(
+                entityName="position",
+                leftSide=Side(
+                    title="system_1",
+                    inputFile=input_files['left'],
+                    # reads a table of the dependency, not just its input files
+                    transform=Transform(query="SELECT p.* FROM position_system_1 p JOIN trade_compare USING (trade_id) WHERE _full_match", cached=True)
+                ),
+                rightSide=Side(title="system_2", inputFile=input_files['left']),
+                primaryKeys=["trade_id"],
+                dependencies=["trade"]
+            )
+        ])
+        lens = DeltaLens(name, config, cache=IngestCache(cache_dir))
+        lens.execute(continue_on_error=False)
+        return lens.con.execute("SELECT rows_left FROM entity_compare_results WHERE entity = 'position'").fetchone()[0]
+
+    assert run("test_dependency_strict", None) == 1
+    assert run("test_dependency_tolerant", {"price": CompareRule(absoluteTolerance=5)}) == 2
+
+def test_only_referenced_datasets_are_keyed(input_files, tmp_path):
+    unused_file = tmp_path / "unused.csv"
+    unused_file.write_text("a,b\n1,2\n")
+    config = Config(
+        reference_datasets=[
+            ReferenceDataset(datasetName="sectors", inputFile=input_files['ref']),
+            ReferenceDataset(datasetName="unused", inputFile=str(unused_file)),
+        ],
+        entities=[
+            Entity(
+                entityName="trade",
+                leftSide=Side(
+                    title="system_1",
+                    inputFile=input_files['left'],
+                    transform=Transform(query="SELECT t.* FROM trade_system_1 t JOIN sectors USING (symbol)", cached=True)
+                ),
+                rightSide=Side(title="system_2", inputFile=input_files['right']),
+                primaryKeys=["trade_id"]
+            ),
+            Entity(
+                entityName="position",
+                leftSide=Side(title="system_1", inputFile=input_files['left']),
+                rightSide=Side(title="system_2", inputFile=input_files['right']),
+                primaryKeys=["trade_id"]
+            )
+        ]
+    )
+    cache = IngestCache(str(tmp_path / "cache"))
+    DeltaLens("test_referenced_keys", config, cache=cache).execute(continue_on_error=False)
+
+    keyed_files = {os.path.basename(path) for path, _ in cache._file_keys}
+    assert "ref.csv" in keyed_files
+    assert "unused.csv" not in keyed_files
@@ -0,0 +1,120 @@
+import os
+import pytest
+import duckdb
+from delta_lens.inputFormats import detect_format, scan_expression, expand_patterns
+from delta_lens.deltaLens import DeltaLens
+from delta_lens.ingestCache import IngestCache
+from delta_lens.config import Config, Defaults, Entity, Side
+
+@pytest.mark.parametrize("path,expected", [
+    ("trades.csv", "csv"),
+    ("trades.csv.gz", "csv"),
+    ("trades.CSV.ZST", "csv"),
+    ("trades.parquet", "parquet"),
+    ("trades.feather", "arrow"),
+    ("trades.arrow", "arrow"),
+    ("trades.jsonl", "ndjson"),
+    ("trades.json", "json"),
+    ("trades.unknown", "csv"),
+])
+def test_detect_format(path, expected):
+    assert detect_format(path) == expected
+
+def test_unsupported_format():
+    with pytest.raises(ValueError, match="Unsupported input format"):
+        scan_expression(duckdb.connect(), "trades.xlsx", "xlsx")
+
+@pytest.fixture
+def format_files(tmp_path):
+    """Write the same trades in every supported format"""
+    con = duckdb.connect()
+    con.execute("""
+        CREATE TABLE trades AS
+        SELECT range AS trade_id, 'SYM' || range AS symbol, (range * 1.5)::DOUBLE AS price
+        FROM range(10)
+    """)
+    files = {
+        'csv': tmp_path / "trades.csv",
+        'csv_gz': tmp_path / "trades.csv.gz",
+        'parquet': tmp_path / "trades.parquet",
+        'ndjson': tmp_path / "trades.jsonl",
+    }
+    con.execute(f"COPY trades TO '{files['csv']}' (HEADER)")
+    con.execute(f"COPY trades TO '{files['csv_gz']}' (HEADER, COMPRESSION GZIP)")
+    con.execute(f"COPY trades TO '{files['parquet']}' (FORMAT PARQUET)")
+    con.execute(f"COPY trades TO '{files['ndjson']}' (FORMAT JSON)")
+    return {name: str(path) for name, path in files.items()}
+
+@pytest.mark.parametrize("left_format", ['csv_gz', 'parquet', 'ndjson'])
+def test_compare_across_formats(format_files, trade_config, left_format):
+    config = trade_config({'left': format_files[left_format], 'right': format_files['csv']})
+    lens = DeltaLens(f"test_{left_format}", config)
+    lens.execute(continue_on_error=False)
+
+    assert lens.con.execute("SELECT rows_fully_matched FROM entity_compare_results").fetchone()[0] == 10
+
+def test_scan_arrow_file(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    feather = pytest.importorskip("pyarrow.feather")
+    path = str(tmp_path / "trades.feather")
+    feather.write_feather(pa.table({'trade_id': [1, 2], 'price': [1.5, 2.5]}), path)
+
+    con = duckdb.connect()
+    rows = con.execute(f"SELECT trade_id, price FROM {scan_expression(con, path)} ORDER BY trade_id").fetchall()
+    assert rows == [(1, 1.5), (2, 2.5)]
+
+def test_arrow_input_materialized_in_view_mode(tmp_path, trade_config):
+    pa = pytest.importorskip("pyarrow")
+    feather = pytest.importorskip("pyarrow.feather")
+    files = {}
+    for side, prices in (("left", [1.5, 2.5]), ("right", [1.5, 3.5])):
+        files[side] = str(tmp_path / f"{side}.feather")
+        feather.write_feather(pa.table({'trade_id': [1, 2], 'price': prices}), files[side])
+    config = trade_config(files, ingestion='view')
+    lens = DeltaLens("test_arrow_view", config)
+    lens.execute(continue_on_error=False)
+
+    # the inputs outlive the cursor the arrow datasets were registered on
+    assert lens.con.execute("SELECT COUNT(*) FROM trade_legacy").fetchone()[0] == 2
+    assert lens.con.execute("SELECT table_type FROM information_schema.tables WHERE table_name = 'trade_new'").fetchone()[0] == "BASE TABLE"
+    assert lens.con.execute("SELECT rows_mismatched FROM entity_compare_results").fetchone()[0] == 1
+
+def test_expand_patterns(tmp_path):
+    for name in ("trade_legacy_part-0002.csv", "trade_legacy_part-0001.csv", "trade_new_part-0001.csv", ".trade_legacy_part-0003.csv"):
+        (tmp_path / name).write_text("trade_id\n1\n")
+    (tmp_path / "trade_legacy_part-dir.csv").mkdir()
+    legacy, new, missing = (str(tmp_path / f"{name}_part-*.csv") for name in ("trade_legacy", "trade_new", "position_legacy"))
+
+    matches = expand_patterns([legacy, new, missing, str(tmp_path / "nowhere" / "*.csv")])
+    assert matches[legacy] == [str(tmp_path / "trade_legacy_part-0001.csv"), str(tmp_path / "trade_legacy_part-0002.csv")]
+    assert matches[new] == [str(tmp_path / "trade_new_part-0001.csv")]
+    assert matches[missing] == []
+    assert matches[str(tmp_path / "nowhere" / "*.csv")] == []
+
+def write_shards(tmp_path, title, prices):
+    for shard, shard_prices in enumerate(prices):
+        rows = "".join(f"{shard * 10 + i},{price}\n" for i, price in enumerate(shard_prices))
+        (tmp_path / f"trade_{title}_part-{shard:04d}.csv").write_text("trade_id,price\n" + rows)
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_compare_sharded_inputs(tmp_path, cached):
+    write_shards(tmp_path, "legacy", [[1.0, 2.0], [3.0, 4.0], [5.0]])
+    write_shards(tmp_path, "new", [[1.0, 2.0], [3.0, 4.5], [5.0]])
+    config = Config(
+        defaults=Defaults(filePattenGlobTemplate=str(tmp_path / "{entityName}_{title}_part-*.csv"), fileNameColumn="source_file"),
+        entities=[Entity(
+            entityName="trade",
+            leftSide=Side(title="legacy"),
+            rightSide=Side(title="new"),
+            primaryKeys=["trade_id"]
+        )])
+    cache = IngestCache(str(tmp_path / "cache")) if cached else None
+    lens = DeltaLens(f"test_sharded_{cached}", config, cache=cache)
+    lens.execute(continue_on_error=False)
+
+    assert len(config.entities[0].leftSide.inputFiles) == 3
+    assert lens.con.execute("SELECT rows_left, rows_right, rows_mismatched FROM entity_compare_results").fetchone() == (5, 5, 1)
+    # the source file is carried into the compare table without being compared
+    mismatched = lens.con.execute("SELECT source_file_left, source_file_right FROM trade_compare WHERE NOT _full_match").fetchone()
+    assert [os.path.basename(path) for path in mismatched] == ["trade_legacy_part-0001.csv", "trade_new_part-0001.csv"]
+    assert lens.con.execute("SELECT COUNT(*) FROM trade_compare_field_summary WHERE field = 'source_file'").fetchone()[0] == 0
@@ -0,0 +1,43 @@
+import os
+import pytest
+import duckdb
+from delta_lens.parquetExport import export_to_parquet
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect(':memory:')
+    conn.execute("CREATE TABLE trade_compare AS SELECT range AS trade_id, range % 4 = 0 AS _full_match FROM range(100)")
+    conn.execute("CREATE TABLE trade_compare_field_summary AS SELECT 'price' AS field, 100 AS total, 25 AS matches")
+    conn.execute("CREATE TABLE entity_compare_results AS SELECT 'trade' AS entity, 1 AS success")
+    conn.execute("CREATE TABLE trade_system_1 AS SELECT 1 AS trade_id")
+    yield conn
+    conn.close()
+
+def test_basic_export(conn, tmp_path):
+    output_dir = str(tmp_path / "parquet")
+    export_to_parquet(conn, output_dir)
+
+    assert sorted(os.listdir(output_dir)) == ['entity_compare_results.parquet', 'trade_compare.parquet', 'trade_compare_field_summary.parquet']
+    exported = conn.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE _full_match) FROM '{output_dir}/trade_compare.parquet'").fetchone()
+    assert exported == (75, 0)
+
+def test_export_all_records_with_sampling(conn, tmp_path):
+    output_dir = str(tmp_path / "parquet")
+    export_to_parquet(conn, output_dir, sample_threshold=10, mismatches_only=False)
+
+    assert conn.execute(f"SELECT COUNT(*) FROM '{output_dir}/trade_compare.parquet'").fetchone()[0] == 10
+    assert conn.execute(f"SELECT COUNT(*) FROM '{output_dir}/entity_compare_results.parquet'").fetchone()[0] == 1
+
+def test_partitioned_export(conn, tmp_path):
+    output_dir = str(tmp_path / "parquet")
+    export_to_parquet(conn, output_dir, mismatches_only=False, partition_by_match=True, row_group_size=16)
+
+    assert sorted(os.listdir(os.path.join(output_dir, "compare", "entity=trade"))) == ['_full_match=false', '_full_match=true']
+    counts = conn.execute(f"""
+        SELECT entity, _full_match, COUNT(*) FROM read_parquet('{output_dir}/compare/*/*/*.parquet', hive_partitioning = true)
+        GROUP BY ALL ORDER BY ALL""").fetchall()
+    assert counts == [('trade', 'false', 75), ('trade', 'true', 25)]
+
+def test_output_dir_exists_error(conn, tmp_path):
+    with pytest.raises(FileExistsError):
+        export_to_parquet(conn, str(tmp_path))
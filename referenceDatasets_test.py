@@ -0,0 +1,96 @@
+import threading
+import duckdb
+import pytest
+from delta_lens.referenceDatasets import ReferenceDatasets, referenced_tables
+from delta_lens.deltaLens import DeltaLens
+from delta_lens.config import Config, Entity, Side, Transform, ReferenceDataset
+
+@pytest.fixture
+def input_files(tmp_path):
+    left_file = tmp_path / "left.csv"
+    right_file = tmp_path / "right.csv"
+    sectors_file = tmp_path / "sectors.csv"
+    unused_file = tmp_path / "unused.csv"
+    left_file.write_text("trade_id,symbol,price\n1,AAPL,150.0\n2,GOOGL,2500.0\n")
+    right_file.write_text("trade_id,symbol,price\n1,AAPL,151.0\n2,GOOGL,2500.0\n")
+    sectors_file.write_text("symbol,sector\nAAPL,Technology\nGOOGL,Technology\n")
+    unused_file.write_text("a,b\n1,2\n")
+    return {'left': str(left_file), 'right': str(right_file), 'sectors': str(sectors_file), 'unused': str(unused_file)}
+
+def table_types(con):
+    return dict(con.execute("SELECT table_name, table_type FROM information_schema.tables").fetchall())
+
+def test_referenced_tables():
+    con = duckdb.connect()
+    query = """WITH s AS (SELECT * FROM Sectors)
+               SELECT t.* FROM trade_left t JOIN s USING (symbol) WHERE t.symbol IN (SELECT symbol FROM watch_list)"""
+    # CTE names are reported too, at worst a dataset shadowed by a CTE is loaded without being read
+    assert referenced_tables(con, query) - {"s"} == {"sectors", "trade_left", "watch_list"}
+    # queries DuckDB cannot parse fall back to every identifier
+    assert {"sectors", "trade_left"} <= referenced_tables(con, "ELECT * FROM trade_left JOIN sectors")
+
+def test_loads_on_first_reference(input_files):
+    con = duckdb.connect()
+    datasets = ReferenceDatasets(con, [
+        ReferenceDataset(datasetName="sectors", inputFile=input_files['sectors']),
+        ReferenceDataset(datasetName="sector_table", inputFile=input_files['sectors'], materialize=True),
+        ReferenceDataset(datasetName="unused", inputFile=input_files['unused']),
+    ])
+    queries = ["SELECT * FROM sectors JOIN sector_table USING (symbol)"]
+
+    assert datasets.load_referenced(con, queries) == ["sectors", "sector_table"]
+    assert datasets.load_referenced(con, queries) == []
+    assert table_types(con) == {"sectors": "VIEW", "sector_table": "BASE TABLE"}
+
+def test_concurrent_entities_load_once(input_files):
+    con = duckdb.connect()
+    datasets = ReferenceDatasets(con, [ReferenceDataset(datasetName="sectors", inputFile=input_files['sectors'], materialize=True)])
+    loaded = []
+
+    def load():
+        cursor = con.cursor()
+        loaded.extend(datasets.load_referenced(cursor, ["SELECT * FROM sectors"]))
+        cursor.close()
+
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loaded == ["sectors"]
+    assert con.execute("SELECT COUNT(*) FROM sectors").fetchone()[0] == 2
+
+def test_compare_loads_only_referenced_datasets(input_files):
+    transform = Transform(query="SELECT l.* FROM trade_legacy l JOIN sectors s USING (symbol) WHERE s.sector = 'Technology'")
+    config = Config(
+        reference_datasets=[
+            ReferenceDataset(datasetName="sectors", inputFile=input_files['sectors']),
+            ReferenceDataset(datasetName="unused", inputFile=input_files['unused']),
+        ],
+        entities=[Entity(
+            entityName="trade",
+            leftSide=Side(title="legacy", inputFile=input_files['left'], transform=transform),
+            rightSide=Side(title="new", inputFile=input_files['right']),
+            primaryKeys=["trade_id"]
+        )])
+    lens = DeltaLens("test_lazy_reference", config)
+    lens.execute()
+
+    tables = table_types(lens.con)
+    assert tables["sectors"] == "VIEW"
+    assert "unused" not in tables
+    stages = [row[0] for row in lens.con.execute("SELECT stage FROM entity_stage_timings WHERE entity = 'trade'").fetchall()]
+    assert "reference_datasets" in stages
+    assert lens.con.execute("SELECT rows_mismatched FROM entity_compare_results").fetchone()[0] == 1
+
+def test_missing_reference_file_fails_up_front(input_files):
+    config = Config(
+        reference_datasets=[ReferenceDataset(datasetName="missing", inputFile="does_not_exist.csv")],
+        entities=[Entity(
+            entityName="trade",
+            leftSide=Side(title="legacy", inputFile=input_files['left']),
+            rightSide=Side(title="new", inputFile=input_files['right']),
+            primaryKeys=["trade_id"]
+        )])
+    with pytest.raises(FileNotFoundError, match="file not found at: does_not_exist.csv"):
+        DeltaLens("test_missing_reference", config).execute()
@@ -0,0 +1,82 @@
+import psutil
+import pytest
+from delta_lens.config import Config, Entity, Side, Resources
+from delta_lens.deltaLens import DeltaLens
+from delta_lens.resourceGovernor import ResourceGovernor, cgroup_memory_limit, cgroup_cpu_limit
+
+GB = 1024**3
+
+@pytest.fixture
+def cgroup_v2(tmp_path):
+    (tmp_path / "memory.max").write_text(f"{2 * GB}\n")
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    return str(tmp_path)
+
+@pytest.fixture
+def cgroup_v1(tmp_path):
+    (tmp_path / "memory").mkdir()
+    (tmp_path / "memory" / "memory.limit_in_bytes").write_text(f"{GB}\n")
+    (tmp_path / "cpu,cpuacct").mkdir()
+    (tmp_path / "cpu,cpuacct" / "cpu.cfs_quota_us").write_text("100000\n")
+    (tmp_path / "cpu,cpuacct" / "cpu.cfs_period_us").write_text("100000\n")
+    return str(tmp_path)
+
+def test_cgroup_v2_limits(cgroup_v2):
+    assert cgroup_memory_limit(cgroup_v2) == 2 * GB
+    assert cgroup_cpu_limit(cgroup_v2) == 1.5
+
+def test_cgroup_v1_limits(cgroup_v1):
+    assert cgroup_memory_limit(cgroup_v1) == GB
+    assert cgroup_cpu_limit(cgroup_v1) == 1.0
+
+def test_unlimited_cgroup(tmp_path):
+    (tmp_path / "memory.max").write_text("max\n")
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert cgroup_memory_limit(str(tmp_path)) is None
+    assert cgroup_cpu_limit(str(tmp_path)) is None
+    # no cgroup filesystem at all
+    assert cgroup_memory_limit(str(tmp_path / "missing")) is None
+    assert cgroup_cpu_limit(str(tmp_path / "missing")) is None
+
+def test_governor_uses_cgroup_limits(cgroup_v2):
+    governor = ResourceGovernor(max_parallel_entities=4, cgroup_root=cgroup_v2)
+    expected_memory = int(min(psutil.virtual_memory().total, 2 * GB) * 0.7)
+    assert governor.memory_limit_bytes == expected_memory
+    assert governor.threads <= 2
+    assert governor.entity_memory_budget == expected_memory // 4
+    assert governor.duckdb_config() == {'memory_limit': f'{expected_memory // 1024**2}MB', 'threads': governor.threads}
+
+def test_governor_explicit_settings_win(cgroup_v2, tmp_path):
+    spill = str(tmp_path / "spill")
+    resources = Resources(memoryLimitGb=0.5, threads=3, tempDirectory=spill, maxTempDirectorySizeGb=1)
+    governor = ResourceGovernor(resources, max_parallel_entities=2, cgroup_root=cgroup_v2)
+    assert governor.duckdb_config() == {
+        'memory_limit': '512MB',
+        'threads': 3,
+        'temp_directory': spill,
+        'max_temp_directory_size': '1024MB'
+    }
+    assert governor.entity_memory_budget == GB // 4
+
+def test_deltalens_applies_resources(tmp_path):
+    left_file = tmp_path / "left.csv"
+    left_file.write_text("id,value\n1,a\n")
+    config = Config(
+        entities=[Entity(entityName="trade", leftSide=Side(title="s1", inputFile=str(left_file)),
+                         rightSide=Side(title="s2", inputFile=str(left_file)), primaryKeys=["id"])],
+        resources=Resources(memoryLimitGb=1, threads=2)
+    )
+    # explicit settings override the config field by field
+    lens = DeltaLens("test_resources", config, resources=Resources(threads=1, tempDirectory=str(tmp_path / "spill")))
+    settings = dict(lens.con.execute("""
+        SELECT name, value FROM duckdb_settings() WHERE name IN ('threads', 'temp_directory')
+    """).fetchall())
+    assert settings['threads'] == '1'
+    assert settings['temp_directory'] == str(tmp_path / "spill")
+    assert lens.memory_limit_bytes == GB
+
+def test_invalid_resources():
+    with pytest.raises(ValueError, match="memoryFraction"):
+        Config._validate_resources(Resources(memoryFraction=1.5))
+    with pytest.raises(ValueError, match="threads"):
+        Config._validate_resources(Resources(threads=0))
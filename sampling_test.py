@@ -0,0 +1,59 @@
+import sqlite3
+import pytest
+import duckdb
+from delta_lens.sampling import create_sample, create_samples, table_primary_keys
+from delta_lens.sqliteExport import export_to_sqlite
+from delta_lens.parquetExport import export_to_parquet
+
+def compare_connection():
+    conn = duckdb.connect(':memory:')
+    conn.execute("""
+        CREATE TABLE trade_compare AS
+        SELECT range AS trade_id,
+            range % 100 <> 7 AS price_match,
+            range % 3 <> 0 AS quantity_match,
+            range % 100 <> 7 AND range % 3 <> 0 AS _full_match
+        FROM range(1000)
+    """)
+    conn.execute("""CREATE TABLE entity_compare_results AS SELECT 'trade' AS entity, '["trade_id"]' AS primary_keys""")
+    return conn
+
+def sampled_keys(conn, table = "trade_compare_sample"):
+    return [key for key, in conn.execute(f"SELECT trade_id FROM {table} ORDER BY trade_id").fetchall()]
+
+def test_primary_keys_from_results():
+    assert table_primary_keys(compare_connection()) == {'trade_compare': ['trade_id']}
+
+def test_sample_is_deterministic():
+    first, second, reseeded = compare_connection(), compare_connection(), compare_connection()
+    create_sample(first, "trade_compare", 20)
+    create_sample(second, "trade_compare", 20)
+    create_sample(reseeded, "trade_compare", 20, seed=42)
+
+    assert len(sampled_keys(first)) == 20
+    assert sampled_keys(first) == sampled_keys(second)
+    assert sampled_keys(first) != sampled_keys(reseeded)
+    assert first.execute("SELECT COUNT(*) FROM trade_compare_sample WHERE _full_match").fetchone()[0] == 0
+
+def test_stratified_sample_covers_every_mismatching_field():
+    conn = compare_connection()
+    create_sample(conn, "trade_compare", 5, rows_per_field=2)
+
+    price_mismatches = conn.execute("SELECT COUNT(*) FROM trade_compare_sample WHERE NOT price_match").fetchone()[0]
+    assert price_mismatches >= 2
+    assert 5 <= len(sampled_keys(conn)) <= 9
+
+def test_exporters_share_sample(tmp_path):
+    conn = compare_connection()
+    assert create_samples(conn, 15, seed=3) == ["trade_compare_sample"]
+    expected = sampled_keys(conn)
+
+    sqlite_path = str(tmp_path / "sample.sqlite")
+    export_to_sqlite(conn, sqlite_path, sample_threshold=15)
+    parquet_dir = str(tmp_path / "parquet")
+    export_to_parquet(conn, parquet_dir, sample_threshold=15)
+
+    sqlite_con = sqlite3.connect(sqlite_path)
+    assert [key for key, in sqlite_con.execute("SELECT trade_id FROM trade_compare ORDER BY trade_id").fetchall()] == expected
+    sqlite_con.close()
+    assert sampled_keys(conn, f"'{parquet_dir}/trade_compare.parquet'") == expected
@@ -0,0 +1,94 @@
+import json
+import duckdb
+import pytest
+from delta_lens.schemaCache import SchemaCache, sniff_csv_schema, csv_read_options, schema_drift
+from delta_lens.inputFormats import scan_expression
+from delta_lens.deltaLens import DeltaLens
+
+@pytest.fixture
+def trade_data():
+    """Trades with a quoted symbol and one price mismatch"""
+    return {
+        'left': ("left.csv", 'trade_id,symbol,price\n1,AAPL,150.0\n2,"GOOGL, Inc",2500.0\n'),
+        'right': ("right.csv", 'trade_id,symbol,price\n1,AAPL,151.0\n2,"GOOGL, Inc",2500.0\n'),
+    }
+
+def test_read_with_known_schema(trade_files):
+    con = duckdb.connect()
+    schema = sniff_csv_schema(con, trade_files['left'])
+    assert schema['columns'] == {'trade_id': 'BIGINT', 'symbol': 'VARCHAR', 'price': 'DOUBLE'}
+
+    options = csv_read_options(schema, {'price': 'DECIMAL(12,2)', 'unknown': 'INTEGER'})
+    assert options['auto_detect'] is False
+    source = scan_expression(con, trade_files['left'], csv_options=options)
+    assert con.execute(f"SELECT typeof(price), symbol FROM {source} ORDER BY trade_id").fetchall() == \
+        [('DECIMAL(12,2)', 'AAPL'), ('DECIMAL(12,2)', 'GOOGL, Inc')]
+
+def test_schema_cache_reused_across_runs(trade_files, trade_config, tmp_path, caplog):
+    cache_path = str(tmp_path / "schemas.json")
+    for run in range(2):
+        lens = DeltaLens(f"test_schema_cache_{run}", trade_config(trade_files), schema_cache=SchemaCache(cache_path))
+        lens.execute(continue_on_error=False)
+        assert lens.con.execute("SELECT rows_mismatched FROM entity_compare_results").fetchone()[0] == 1
+
+    with open(cache_path) as f:
+        assert sorted(json.load(f)) == ["trade.legacy", "trade.new"]
+    assert "schema cache hit for [trade.legacy]" in caplog.text
+
+def test_changed_header_is_sniffed_again(trade_files, tmp_path, caplog):
+    cache = SchemaCache(str(tmp_path / "schemas.json"))
+    con = duckdb.connect()
+    cache.resolve(con, "trade.legacy", trade_files['left'])
+    with open(trade_files['left'], 'w') as f:
+        f.write("trade_id,symbol,price,venue\n1,AAPL,x,XNYS\n")
+
+    schema = cache.resolve(con, "trade.legacy", trade_files['left'])
+    assert schema['columns']['venue'] == 'VARCHAR'
+    assert "price DOUBLE -> VARCHAR; added venue VARCHAR" in caplog.text
+    assert SchemaCache(cache.path).lookup("trade.legacy") == schema
+    assert schema_drift(schema, schema) == []
+
+def test_type_drift_reported_before_loading(trade_files, trade_config, tmp_path):
+    with open(trade_files['right'], 'w') as f:
+        f.write("trade_id,symbol,price\n1,AAPL,n/a\n")
+    lens = DeltaLens("test_schema_drift", trade_config(trade_files), schema_cache=SchemaCache(str(tmp_path / "schemas.json")))
+    with pytest.raises(ValueError, match="Data type mismatch for column 'price'"):
+        lens.execute(continue_on_error=False)
+    stages = [row[0] for row in lens.con.execute("SELECT stage FROM entity_stage_timings").fetchall()]
+    assert stages == ["schema"]
+
+    # pinning the column type resolves the drift up front
+    lens = DeltaLens("test_schema_pinned", trade_config(trade_files, columnTypes={'price': 'VARCHAR'}))
+    lens.execute(continue_on_error=False)
+    stages = [row[0] for row in lens.con.execute("SELECT stage FROM entity_stage_timings").fetchall()]
+    assert stages[:3] == ["schema", "parse_left", "parse_right"]
+
+def test_headerless_file_checks_column_count(tmp_path, caplog):
+    path = tmp_path / "trades.csv"
+    path.write_text("1,AAPL,150.0\n2,GOOGL,2500.0\n")
+    cache = SchemaCache(str(tmp_path / "schemas.json"))
+    con = duckdb.connect()
+    cached = cache.resolve(con, "trade.legacy", str(path))
+    assert cached['options']['header'] is False
+    assert cache.resolve(con, "trade.legacy", str(path)) == cached
+    assert "schema cache hit" in caplog.text
+
+    path.write_text("1,AAPL,150.0,XNYS\n2,GOOGL,2500.0,XNAS\n")
+    assert len(cache.resolve(con, "trade.legacy", str(path))['columns']) == 4
+    assert "added column3 VARCHAR" in caplog.text
+
+def test_cached_types_sniffed_again_when_load_fails(trade_files, trade_config, tmp_path, caplog):
+    cache_path = str(tmp_path / "schemas.json")
+    DeltaLens("test_schema_retry_cold", trade_config(trade_files), schema_cache=SchemaCache(cache_path)).execute(continue_on_error=False)
+
+    # the text value lies beyond the rows DuckDB's sniffer samples
+    for title in ('left', 'right'):
+        rows = "".join(f"{i},AAPL,{i}.5\n" for i in range(3, 30000))
+        with open(trade_files[title], 'a') as f:
+            f.write(rows + "30000,AAPL,n/a\n")
+    lens = DeltaLens("test_schema_retry_warm", trade_config(trade_files), schema_cache=SchemaCache(cache_path))
+    lens.execute(continue_on_error=False)
+
+    assert lens.con.execute("SELECT rows_left, rows_mismatched FROM entity_compare_results").fetchone() == (30000, 1)
+    assert "sniffed again from the whole file: price DOUBLE -> VARCHAR" in caplog.text
+    assert SchemaCache(cache_path).lookup("trade.new")['columns']['price'] == 'VARCHAR'
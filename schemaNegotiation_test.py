@@ -0,0 +1,49 @@
+import duckdb
+import pytest
+from delta_lens.schemaNegotiation import common_supertype, is_lossy, negotiate_types
+from delta_lens.deltaLens import DeltaLens
+
+@pytest.mark.parametrize("left,right,expected,lossy", [
+    ("INTEGER", "BIGINT", "BIGINT", False),
+    ("DATE", "TIMESTAMP", "TIMESTAMP", False),
+    ("DECIMAL(12,2)", "DECIMAL(18,4)", "DECIMAL(18,4)", False),
+    ("BIGINT", "DOUBLE", "DOUBLE", True),
+    ("BIGINT", "VARCHAR", "VARCHAR", True),
+    ("DATE", "BIGINT", "VARCHAR", True),
+])
+def test_common_supertype(left, right, expected, lossy):
+    con = duckdb.connect()
+    assert common_supertype(con, left, right) == expected
+    assert (is_lossy(left, expected) or is_lossy(right, expected)) == lossy
+
+def test_negotiate_types():
+    con = duckdb.connect()
+    widenings = negotiate_types(con, {'id': 'BIGINT', 'qty': 'INTEGER', 'only_left': 'DATE'},
+                                {'qty': 'BIGINT', 'id': 'BIGINT', 'only_right': 'DATE'})
+    assert widenings == [{'column_name': 'qty', 'left_type': 'INTEGER', 'right_type': 'BIGINT', 'negotiated_type': 'BIGINT', 'lossy': False}]
+
+@pytest.fixture
+def trade_data():
+    """Trades whose quantity and account columns have different types on each side"""
+    return {
+        'left': ("left.parquet", "SELECT range AS trade_id, range::INTEGER AS quantity, 'T' || range AS account FROM range(5)"),
+        'right': ("right.csv", "trade_id,quantity,account\n0,0,0\n1,1,1\n2,20000000000,2\n3,3,3\n4,4,4\n"),
+    }
+
+def test_compare_with_negotiated_types(trade_files, trade_config):
+    with pytest.raises(ValueError, match="Data type mismatch"):
+        DeltaLens("test_without_negotiation", trade_config(trade_files)).execute(continue_on_error=False)
+
+    lens = DeltaLens("test_negotiation", trade_config(trade_files, negotiateTypes=True))
+    lens.execute(continue_on_error=False)
+
+    assert lens.con.execute("SELECT rows_mismatched FROM entity_compare_results").fetchone()[0] == 5
+    assert lens.con.execute("""SELECT column_name, left_type, right_type, negotiated_type, lossy
+                               FROM entity_type_widenings WHERE entity = 'trade' ORDER BY column_name""").fetchall() == [
+        ('account', 'VARCHAR', 'BIGINT', 'VARCHAR', True),
+        ('quantity', 'INTEGER', 'BIGINT', 'BIGINT', False),
+    ]
+    # both sides were loaded once with the negotiated types
+    types = dict(lens.con.execute("SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'trade_legacy'").fetchall())
+    assert types['quantity'] == 'BIGINT'
+    assert lens.con.execute("SELECT COUNT(*) FROM trade_compare WHERE account_match").fetchone()[0] == 0
@@ -45,6 +45,9 @@ setup(
         "numpy>=2.2.2",
         "jsonschema>=4.23.0"
     ],
+    extras_require={
+        "arrow": ["pyarrow>=15.0.0"],
+    },
     entry_points={
         'console_scripts': [
             'deltalens=delta_lens.cli:main',
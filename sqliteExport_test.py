@@ -137,6 +137,30 @@ def test_sample_threshold(sample_duckdb_connection, setup_logger, tmp_path):
     con.close()
 
 
+def test_indexes_and_types(sample_duckdb_connection, setup_logger, tmp_path):
+    """Test post-load indexes and column types of the exported tables"""
+    sample_duckdb_connection.execute("ALTER TABLE entity_compare_results ADD COLUMN primary_keys VARCHAR")
+    sample_duckdb_connection.execute("""UPDATE entity_compare_results SET primary_keys = '["trade_id", "timestamp"]'""")
+    sample_duckdb_connection.execute("CREATE TABLE order_compare AS SELECT 1 AS order_id, DATE '2024-01-01' AS order_date, 1.5::DECIMAL(10, 2) AS amount, false AS _full_match")
+    sample_duckdb_connection.execute("""INSERT INTO entity_compare_results (entity, success, primary_keys) VALUES ('order', 1, '["order_id"]')""")
+    sqlite_path = str(tmp_path / "test_indexes.sqlite")
+    export_to_sqlite(sample_duckdb_connection, sqlite_path, sample_threshold=0, mismatches_only=False)
+
+    con = sqlite3.connect(sqlite_path)
+    indexes = con.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' ORDER BY name").fetchall()
+    assert indexes == [
+        ('entity_compare_results_pk', 'entity_compare_results'),
+        ('order_compare_full_match', 'order_compare'),
+        ('order_compare_pk', 'order_compare'),
+        ('trade_compare_full_match', 'trade_compare'),
+        ('trade_compare_pk', 'trade_compare'),
+    ]
+    # key constraints take precedence over the keys recorded in the results table
+    assert con.execute("PRAGMA index_info('trade_compare_pk')").fetchall() == [(0, 0, 'trade_id')]
+    assert con.execute("SELECT COUNT(*) FROM trade_compare").fetchone()[0] == 2
+    assert con.execute("SELECT * FROM order_compare").fetchall() == [(1, '2024-01-01', 1.5, 0)]
+    con.close()
+
 def test_error_handling(setup_logger, tmp_path):
     """Test error handling"""
     sqlite_path = str(tmp_path / "test_error.sqlite")
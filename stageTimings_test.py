@@ -0,0 +1,59 @@
+import json
+import os
+import pytest
+from delta_lens.config import Config, Side, Transform
+from delta_lens.deltaLens import DeltaLens
+from delta_lens.stageTimings import format_hot_spots
+
+@pytest.fixture
+def trade_data():
+    """Trades with one price mismatch and one-sided rows on both sides"""
+    return {
+        'left': ("left.csv", "trade_id,price\n1,1.0\n2,2.0\n3,3.0\n"),
+        'right': ("right.csv", "trade_id,price\n1,1.0\n2,2.5\n4,4.0\n5,5.0\n"),
+    }
+
+def test_stage_timings_recorded(trade_files, trade_entity):
+    right_side = Side(title="new", inputFile=trade_files['right'], transform=Transform(query="SELECT * FROM trade_new", cached=True))
+    entity = trade_entity(trade_files, rightSide=right_side, primaryKeyIndex=True)
+    lens = DeltaLens("test_stage_timings", Config(entities=[entity]))
+    lens.execute()
+
+    stages = {stage: (rows, elapsed, peak_memory) for stage, rows, elapsed, peak_memory in lens.con.execute(
+        "SELECT stage, rows, elapsed_seconds, peak_memory_bytes FROM entity_stage_timings WHERE entity = 'trade'").fetchall()}
+    # indexes are built once the keys are validated, only on the tables that are compared
+    assert list(stages) == ["parse_left", "parse_right", "transform_right", "validate", "pk_index_left",
+                            "pk_index_right_transform", "join", "pk_index_compare", "summary"]
+    assert stages["parse_left"][0] == 3
+    assert stages["parse_right"][0] == 4
+    assert stages["transform_right"][0] == 4
+    assert stages["validate"][0] == 7
+    assert stages["join"][0] == 5
+    assert all(elapsed >= 0 and peak_memory >= 0 for _, elapsed, peak_memory in stages.values())
+
+    spots = lens.hot_spots(limit=3)
+    assert len(spots) == 3
+    assert [spot[2] for spot in spots] == sorted([spot[2] for spot in spots], reverse=True)
+    report = format_hot_spots(spots)
+    assert len(report.splitlines()) == 4
+
+def test_failed_entity_keeps_completed_stages(tmp_path, trade_files, trade_entity):
+    duplicate_file = tmp_path / "duplicates.csv"
+    duplicate_file.write_text("trade_id,price\n1,1.0\n1,2.0\n")
+    lens = DeltaLens("test_failed_stages", Config(entities=[trade_entity({**trade_files, 'right': str(duplicate_file)})]))
+    lens.execute()
+
+    stages = [stage for stage, in lens.con.execute("SELECT stage FROM entity_stage_timings").fetchall()]
+    assert stages == ["parse_left", "parse_right", "validate"]
+
+def test_query_profiles(tmp_path, trade_files, trade_entity):
+    profile_dir = str(tmp_path / "profiles")
+    lens = DeltaLens("test_profiles", Config(entities=[trade_entity(trade_files, buckets=2)]), profile_dir=profile_dir)
+    lens.execute()
+
+    assert sorted(os.listdir(profile_dir)) == ["trade_join_bucket1.json", "trade_join_bucket2.json",
+                                              "trade_parse_left.json", "trade_parse_right.json", "trade_summary.json"]
+    with open(os.path.join(profile_dir, "trade_summary.json")) as f:
+        assert json.load(f)["query_name"].startswith("CREATE TEMP TABLE trade_compare_counts")
+    join_profiles = lens.con.execute("SELECT profile_paths FROM entity_stage_timings WHERE stage = 'join'").fetchone()[0]
+    assert [os.path.basename(path) for path in join_profiles] == ["trade_join_bucket1.json", "trade_join_bucket2.json"]
@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock
 from pathlib import Path
 import logging
 from delta_lens.cli import main
+from delta_lens.config import Resources
 
 @pytest.fixture
 def mock_args():
@@ -12,10 +13,26 @@ def mock_args():
     args.output_dir = "test_output"
     args.persistent = False
     args.continue_on_error = True
+    args.max_parallel_entities = 4
+    args.cache_dir = None
+    args.no_cache = False
+    args.incremental_from = None
+    args.schema_cache = None
+    args.memory_limit_gb = None
+    args.threads = 2
+    args.temp_directory = None
+    args.max_temp_directory_size_gb = None
     args.export_sqlite = True
     args.export_csv = True
+    args.export_parquet = True
+    args.export_parquet_partitioned = False
+    args.export_parquet_row_group_size = 122880
     args.export_sampling_threshold = 1000
+    args.export_sampling_seed = 0
+    args.export_sampling_rows_per_field = 0
+    args.export_queue_size = 2
     args.export_mismatches_only = True
+    args.profile_queries = False
     args.log_level = "INFO"
     return args
 
@@ -35,8 +52,11 @@ def test_main_success(mock_args, mock_config, mock_lens):
          patch('delta_lens.cli.Path.mkdir') as mock_mkdir, \
          patch('delta_lens.cli.load_config', return_value=mock_config) as mock_load_config, \
          patch('delta_lens.cli.DeltaLens', return_value=mock_lens) as mock_delta_lens, \
-         patch('delta_lens.cli.export_to_sqlite') as mock_export_sqlite, \
-         patch('delta_lens.cli.export_to_csv_archive') as mock_export_csv:
+         patch('delta_lens.cli.SqliteExporter') as mock_export_sqlite, \
+         patch('delta_lens.cli.CsvArchiveExporter') as mock_export_csv, \
+         patch('delta_lens.cli.ParquetExporter') as mock_export_parquet, \
+         patch('delta_lens.cli.ExportPipeline') as mock_pipeline, \
+         patch('delta_lens.cli.format_hot_spots', return_value="") as mock_format_hot_spots:
 
         main()
 
@@ -47,11 +67,32 @@ def test_main_success(mock_args, mock_config, mock_lens):
             mock_args.run_name,
             mock_config,
             persistent=mock_args.persistent,
-            persist_path=str(Path(mock_args.output_dir))
+            persist_path=str(Path(mock_args.output_dir)),
+            max_parallel_entities=mock_args.max_parallel_entities,
+            cache=None,
+            previous_run=mock_args.incremental_from,
+            resources=Resources(threads=2),
+            profile_dir=None,
+            schema_cache=None
         )
-        mock_lens.execute.assert_called_once_with(continue_on_error=mock_args.continue_on_error)
         mock_export_sqlite.assert_called_once()
         mock_export_csv.assert_called_once()
+        mock_export_parquet.assert_called_once()
+        mock_pipeline.assert_called_once_with(
+            mock_lens.con,
+            [mock_export_sqlite.return_value, mock_export_csv.return_value, mock_export_parquet.return_value],
+            sample_threshold=mock_args.export_sampling_threshold,
+            sample_seed=mock_args.export_sampling_seed,
+            mismatches_only=mock_args.export_mismatches_only,
+            sample_rows_per_field=mock_args.export_sampling_rows_per_field,
+            max_pending=mock_args.export_queue_size
+        )
+        pipeline = mock_pipeline.return_value.__enter__.return_value
+        mock_lens.execute.assert_called_once_with(
+            continue_on_error=mock_args.continue_on_error,
+            on_entity_complete=pipeline.entity_completed
+        )
+        mock_format_hot_spots.assert_called_once_with(mock_lens.hot_spots.return_value)
 
 def test_main_error(mock_args):
     with patch('delta_lens.cli.parse_args', return_value=mock_args), \
@@ -68,16 +109,22 @@ def test_main_error(mock_args):
 def test_main_without_exports(mock_args, mock_config, mock_lens):
     mock_args.export_sqlite = False
     mock_args.export_csv = False
+    mock_args.export_parquet = False
     
     with patch('delta_lens.cli.parse_args', return_value=mock_args), \
          patch('delta_lens.cli.setup_logging'), \
          patch('delta_lens.cli.Path.mkdir'), \
          patch('delta_lens.cli.load_config', return_value=mock_config), \
          patch('delta_lens.cli.DeltaLens', return_value=mock_lens), \
-         patch('delta_lens.cli.export_to_sqlite') as mock_export_sqlite, \
-         patch('delta_lens.cli.export_to_csv_archive') as mock_export_csv:
+         patch('delta_lens.cli.SqliteExporter') as mock_export_sqlite, \
+         patch('delta_lens.cli.CsvArchiveExporter') as mock_export_csv, \
+         patch('delta_lens.cli.ParquetExporter') as mock_export_parquet, \
+         patch('delta_lens.cli.ExportPipeline') as mock_pipeline:
 
         main()
 
+        mock_pipeline.assert_not_called()
+        mock_lens.execute.assert_called_once_with(continue_on_error=mock_args.continue_on_error)
         mock_export_sqlite.assert_not_called()
-        mock_export_csv.assert_not_called()
\ No newline at end of file
+        mock_export_csv.assert_not_called()
+        mock_export_parquet.assert_not_called()
\ No newline at end of file